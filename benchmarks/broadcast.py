@@ -0,0 +1,84 @@
+"""
+Broadcast throughput benchmark.
+
+Seeds a throwaway SQLite database with users, sends one broadcast to all
+of them through the real engine (utils.broadcast) against the local fake
+Bot API and reports messages/sec, how long starting the broadcast blocks
+the caller and the SQL statements issued per recipient.
+
+Run with:
+    python -m benchmarks.broadcast --users 20000 --rate 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=1000, help="messages/sec limit")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "broadcast.db"
+    )
+    import telebot
+    from telebot import apihelper
+
+    from benchmarks.fake_bot_api import FakeBotApi
+    from repositories import broadcasts, models
+    from repositories.database import SessionLocal, engine
+    from repositories.query_counter import count_queries
+    from utils import broadcast
+    from utils.sender import sender
+
+    api = FakeBotApi().start()
+    apihelper.API_URL = api.api_url
+    bot = telebot.TeleBot("1:benchmark", threaded=False)
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(
+        models.User,
+        [
+            {"user_id": user_id, "name": "user", "surname": "x", "card_number": "0" * 16}
+            for user_id in range(1, args.users + 1)
+        ],
+    )
+    db.commit()
+
+    sender.limiter.rate = args.rate
+    sender.limiter.per_chat_interval = 0
+    sender.workers = args.workers
+    created = broadcasts.create(db, "benchmark", "all", 1, chat_id=1, message_id=1)
+    with count_queries() as counter:
+        started = time.perf_counter()
+        progress = broadcast.start(bot, created.id)
+        start_ms = (time.perf_counter() - started) * 1000
+        progress.wait()
+        wall = time.perf_counter() - started
+    db.expire_all()
+    finished = db.get(models.Broadcast, created.id)
+    result = {
+        "users": args.users,
+        "sent": finished.sent,
+        "failed": finished.failed,
+        "status": finished.status.name,
+        "seconds": round(wall, 2),
+        "messages_per_second": round(finished.sent / wall, 1),
+        "start_blocks_ms": round(start_ms, 1),
+        "queries_per_recipient": round(counter.count / max(args.users, 1), 3),
+        "send_message_calls": api.calls["sendMessage"],
+    }
+    print(json.dumps(result, indent=2))
+    return 0 if finished.sent == args.users else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Benchmark utils.callback against the previous json + zlib + base64
+encoding and check every route's payload against the callback_data limit.
+
+Run with:
+    python -m benchmarks.callback
+"""
+
+import base64
+import datetime
+import json
+import os
+import timeit
+import zlib
+
+os.environ.setdefault("CALLBACK_SECRET", "benchmark")
+
+from utils.callback import CALLBACK_DATA_LIMIT, ROUTES, callback_data  # noqa: E402
+
+# Largest values each field can carry; used to prove the 64 byte bound.
+_WORST_CASE = {
+    "session_id": 2**32 - 1,
+    "session_date": datetime.date(2099, 12, 31),
+    "page": 2**16 - 1,
+    "from_page": 2**16 - 1,
+    "user_id": 2**63 - 1,
+    "page_start": 2**63 - 1,
+    "direction": 3,
+    "start": datetime.date(2099, 12, 31),
+    "end": datetime.date(2099, 12, 31),
+    "payment_id": "ffffffff-ffff-ffff-ffff-ffffffffffff",
+}
+
+
+def legacy_encode_json(data):
+    compressed = zlib.compress(json.dumps(data).encode("utf-8"))
+    return base64.urlsafe_b64encode(compressed).decode("utf-8")
+
+
+def legacy_decode_json(encoded_str):
+    compressed = base64.urlsafe_b64decode(encoded_str.encode("utf-8"))
+    return json.loads(zlib.decompress(compressed).decode("utf-8"))
+
+
+def check_limits():
+    for prefix, schema in ROUTES.items():
+        values = {name: _WORST_CASE[name] for name, _ in schema.fields}
+        data = callback_data(prefix, schema, **values)
+        assert schema.decode(data[len(prefix):]) == values, prefix
+        print(f"{prefix:<32} {len(data):3d}/{CALLBACK_DATA_LIMIT} bytes")
+
+
+def main(number=100_000):
+    check_limits()
+
+    prefix = "ADMIN_VIEW_USER:"
+    schema = ROUTES[prefix]
+    values = {"page": 12, "page_start": 6_000_000_001, "user_id": 7_123_456_789}
+    legacy = legacy_encode_json(values)
+    token = schema.encode(**values)
+    print(f"\npayload size: legacy {len(legacy)} chars, compact {len(token)} chars")
+
+    for label, func in (
+        ("legacy encode", lambda: legacy_encode_json(values)),
+        ("compact encode", lambda: schema.encode(**values)),
+        ("legacy decode", lambda: legacy_decode_json(legacy)),
+        ("compact decode", lambda: schema.decode(token)),
+    ):
+        seconds = timeit.timeit(func, number=number)
+        print(f"{label:<20} {seconds / number * 1e6:8.3f} µs/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the digit converters in utility.py against the previous
+dict + str.replace implementation.
+
+Run with:
+    python -m benchmarks.digits
+"""
+
+import timeit
+
+from utility import (
+    convert_english_numbers,
+    convert_english_numbers_many,
+    convert_persian_numbers,
+    normalize_digits,
+)
+
+_LEGACY_PERSIAN_TO_ENGLISH = {
+    **{p: e for p, e in zip("۰۱۲۳۴۵۶۷۸۹", "0123456789")},
+    **{a: e for a, e in zip("٠١٢٣٤٥٦٧٨٩", "0123456789")},
+}
+_LEGACY_ENGLISH_TO_PERSIAN = {e: p for e, p in zip("0123456789", "۰۱۲۳۴۵۶۷۸۹")}
+
+
+def legacy_convert_persian_numbers(input_text):
+    cleaned = input_text
+    for persian, english in _LEGACY_PERSIAN_TO_ENGLISH.items():
+        cleaned = cleaned.replace(persian, english)
+    return cleaned
+
+
+def legacy_convert_english_numbers(input_text):
+    cleaned = str(input_text)
+    for english, persian in _LEGACY_ENGLISH_TO_PERSIAN.items():
+        cleaned = cleaned.replace(english, persian)
+    return cleaned
+
+
+def _run(label, func, number):
+    seconds = timeit.timeit(func, number=number)
+    print(f"{label:<40} {seconds / number * 1e6:8.3f} µs/op")
+    return seconds
+
+
+def main(number=200_000):
+    card = "۶۰۳۷-۹۹۷۵ ٩٩١٢ 3456"
+    amount = 125000
+
+    assert legacy_convert_persian_numbers(card) == convert_persian_numbers(card)
+    assert legacy_convert_english_numbers(amount) == convert_english_numbers(amount)
+
+    print("persian -> english")
+    old = _run("  legacy", lambda: legacy_convert_persian_numbers(card), number)
+    new = _run("  translate", lambda: convert_persian_numbers(card), number)
+    print(f"  speedup: {old / new:.1f}x")
+    _run("  normalize_digits", lambda: normalize_digits(card), number)
+
+    print("english -> persian")
+    old = _run("  legacy", lambda: legacy_convert_english_numbers(amount), number)
+    new = _run("  translate", lambda: convert_english_numbers(amount), number)
+    print(f"  speedup: {old / new:.1f}x")
+
+    column = list(range(100_000, 110_000))
+    rows = number // 100
+    print(f"report column ({len(column)} cells)")
+    old = _run(
+        "  legacy per cell",
+        lambda: [legacy_convert_english_numbers(v) for v in column],
+        rows // 100 or 1,
+    )
+    new = _run(
+        "  convert_english_numbers_many",
+        lambda: convert_english_numbers_many(column),
+        rows // 100 or 1,
+    )
+    print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark of FootballSessionBot.
+
+Boots the real bot against a local fake Bot API (benchmarks.fake_bot_api)
+and a throwaway SQLite database, then feeds it synthetic updates: users
+register, browse SHOW_SESSIONS, book and pay; admins page through users,
+generate reports and type a Jalali range of days to cancel. Reports
+p50/p95/p99 latency per scenario step, updates/sec and DB queries per
+update.
+
+Run with:
+    python -m benchmarks.e2e --users 2000
+    python -m benchmarks.e2e --save-baseline      # write benchmarks/baseline.json
+    python -m benchmarks.e2e --compare            # fail on regressions
+
+--compare runs with the baseline's user count and gates on the
+deterministic numbers (queries per update, Bot API calls, errors); latency
+is machine dependent and only produces warnings.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+BASELINE = pathlib.Path(__file__).with_name("baseline.json")
+ADMIN_ID = 900_000_000
+FIRST_USER_ID = 100_000_000
+# p95 slowdown against baseline reported as a warning (not a failure)
+LATENCY_WARNING_RATIO = 3.0
+# Sent from timers after the scenario moved on, so their count depends on timing
+DELAYED_METHODS = {"deleteMessage"}
+
+
+def _configure_environment(database_url):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["REPORT_CACHE_DIR"] = tempfile.mkdtemp()
+    os.environ.setdefault("BOT_TOKEN", "1:benchmark")
+    os.environ["METRICS_LOG_INTERVAL"] = "0"
+    os.environ.pop("METRICS_PORT", None)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Simulator:
+    def __init__(self, bot, api, engine):
+        from repositories.query_counter import count_queries
+
+        self.bot = bot
+        self.api = api
+        self.engine = engine
+        self.count_queries = count_queries
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.api_calls = defaultdict(Counter)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    # --- update builders -------------------------------------------------
+    @staticmethod
+    def _user(user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def _message(self, user_id, **content):
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            **content,
+        }
+
+    def send(self, step, user_id, **content):
+        self.dispatch(step, {"message": self._message(user_id, **content)})
+
+    def tap(self, step, user_id, data):
+        self.dispatch(
+            step,
+            {
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": self._user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": data,
+                    "message": self._message(user_id, text="-"),
+                }
+            },
+        )
+
+    def pre_checkout(self, user_id, payload):
+        self.dispatch(
+            "pre_checkout",
+            {
+                "pre_checkout_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": self._user(user_id),
+                    "currency": "IRR",
+                    "total_amount": 100000,
+                    "invoice_payload": payload,
+                }
+            },
+        )
+
+    def dispatch(self, step, update):
+        from telebot.types import Update
+
+        update["update_id"] = next(self._update_ids)
+        parsed = Update.de_json(update)
+        calls_before = Counter(self.api.calls)
+        with self.count_queries(self.engine) as counter:
+            started = time.perf_counter()
+            try:
+                self.bot.process_new_updates([parsed])
+            except Exception as e:
+                self.errors[step] += 1
+                if self.errors[step] == 1:
+                    print(f"[{step}] {type(e).__name__}: {e}", file=sys.stderr)
+            elapsed = time.perf_counter() - started
+        self.latencies[step].append(elapsed)
+        self.queries[step].append(counter.count)
+        self.api_calls[step].update(Counter(self.api.calls) - calls_before)
+
+    # --- scenarios -------------------------------------------------------
+    def register(self, user_id):
+        from constant import user as CUSER
+
+        self.send("start", user_id, text="/start")
+        self.tap("account_type", user_id, CUSER.Buttons.GENERAL["CALLBACK_DATA"])
+        self.send("name", user_id, text="کاربر")
+        self.send("surname", user_id, text="آزمایشی")
+        self.send("card_number", user_id, text="۶۰۳۷۹۹۷۵۹۹۱۲۳۴۵۶")
+        self.send(
+            "contact",
+            user_id,
+            contact={"phone_number": f"98{user_id}", "first_name": "u", "user_id": user_id},
+        )
+
+    def browse_and_book(self, user_id):
+        from constant import user as CUSER
+
+        self.send("show_sessions", user_id, text=CUSER.Buttons.SHOW_SESSIONS)
+        days = self.api.buttons(user_id, "SESSION_DATE:")
+        if not days:
+            return
+        self.tap("session_date", user_id, days[user_id % len(days)])
+        slots = self.api.buttons(user_id, "BOOK:")
+        if not slots:
+            return
+        self.tap("book", user_id, slots[user_id % len(slots)])
+        payment = self.api.buttons(user_id, "PAYMENT:")
+        if not payment:
+            return
+        self.api.invoices.pop(user_id, None)
+        self.tap("payment", user_id, payment[0])
+        invoice = self.api.last_invoice(user_id)
+        if not invoice:
+            return
+        self.pre_checkout(user_id, invoice)
+        self.send(
+            "successful_payment",
+            user_id,
+            successful_payment={
+                "currency": "IRR",
+                "total_amount": 100000,
+                "invoice_payload": invoice,
+                "telegram_payment_charge_id": f"t{user_id}",
+                "provider_payment_charge_id": f"p{user_id}",
+            },
+        )
+        self.send("payment_history", user_id, text=CUSER.Buttons.SHOW_PAYMENT_HISTORY)
+
+    def admin_session(self, pages=20):
+        self.tap("admin_view_users", ADMIN_ID, "ADMIN_VIEW_USERS_PAGE:1")
+        for _ in range(pages):
+            next_page = self.api.buttons(ADMIN_ID, "ADMIN_VIEW_USERS_PAGE:")
+            if not next_page:
+                break
+            self.tap("admin_view_users", ADMIN_ID, next_page[-1])
+        self.tap("admin_report_filters", ADMIN_ID, "ADMIN_GENERATE_REPORT")
+        self.tap("admin_report_filters", ADMIN_ID, "ADMIN_REPORT_FILTER:range:all")
+        self.tap("admin_generate_report", ADMIN_ID, "ADMIN_REPORT_RUN")
+        # Unchanged data: served from the report cache by file_id
+        self.tap("admin_report_cached", ADMIN_ID, "ADMIN_REPORT_RUN")
+        self.cancel_range()
+
+    def cancel_range(self):
+        """Type a Jalali range of the seeded days; stops at the confirmation."""
+        from utils.jalali import Gregorian
+
+        today = datetime.date.today()
+        start, end = (
+            Gregorian(day).persian_string("{}/{:02d}/{:02d}")
+            for day in (today, today + datetime.timedelta(days=2))
+        )
+        self.tap("admin_cancel_range", ADMIN_ID, "ADMIN_CANCEL_RANGE")
+        self.send("admin_cancel_range", ADMIN_ID, text=f"{start}-{end}")
+        if not self.api.buttons(ADMIN_ID, "ADMIN_CANCEL_CONFIRM:"):
+            print("[admin_cancel_range] no confirmation for the range", file=sys.stderr)
+            self.errors["admin_cancel_range"] += 1
+
+    def summary(self, wall_seconds):
+        steps = {}
+        for step, values in sorted(self.latencies.items()):
+            steps[step] = {
+                "count": len(values),
+                "errors": self.errors[step],
+                "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                "queries_per_update": round(
+                    sum(self.queries[step]) / len(self.queries[step]), 2
+                ),
+                "bot_api_calls": dict(self.api_calls[step]),
+            }
+        updates = sum(len(values) for values in self.latencies.values())
+        all_latencies = [v for values in self.latencies.values() for v in values]
+        return {
+            "updates": updates,
+            "updates_per_sec": round(updates / wall_seconds, 1),
+            "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(all_latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 3),
+            "queries_per_update": round(
+                sum(sum(q) for q in self.queries.values()) / max(updates, 1), 2
+            ),
+            "bot_api_calls": dict(self.api.calls),
+            "steps": steps,
+        }
+
+
+def seed_admin_and_sessions(days=3):
+    from repositories import models, schedule
+    from repositories.database import SessionLocal
+    from repositories.reference import reference
+
+    db = SessionLocal()
+    try:
+        # Sessions of the default venue created at startup (venues.ensure_default)
+        venue = reference.venues(db)[0]
+        db.add(
+            models.User(
+                user_id=ADMIN_ID,
+                name="admin",
+                surname="bench",
+                card_number="6037990000000000",
+                role=models.UserRole.ADMIN,
+                is_verified=models.VerificationStatus.VERIFIED,
+            )
+        )
+        today = datetime.date.today()
+        for offset in range(days):
+            for time_slot in venue.time_slots:
+                start_time, end_time = schedule.slot_times(time_slot)
+                db.add(
+                    models.Session(
+                        venue_id=venue.id,
+                        session_date=today + datetime.timedelta(days=offset),
+                        time_slot=time_slot,
+                        start_time=start_time,
+                        end_time=end_time,
+                        available=True,
+                        cost=12000,
+                    )
+                )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(users):
+    from telebot import apihelper
+
+    from benchmarks.fake_bot_api import FakeBotApi
+
+    api = FakeBotApi().start()
+    apihelper.API_URL = api.api_url
+
+    import mainv3
+    from repositories.database import engine
+
+    startup_started = time.perf_counter()
+    football_bot = mainv3.FootballSessionBot()
+    startup_seconds = time.perf_counter() - startup_started
+    football_bot.bot.threaded = False
+    seed_admin_and_sessions()
+
+    simulator = Simulator(football_bot.bot, api, engine)
+    started = time.perf_counter()
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        simulator.register(user_id)
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        simulator.browse_and_book(user_id)
+    simulator.admin_session()
+    result = simulator.summary(time.perf_counter() - started)
+    result["users"] = users
+    result["startup_ms"] = round(startup_seconds * 1000, 1)
+    # The fake API keeps serving (daemon thread) for delayed message deletes
+    return result
+
+
+def _deterministic_calls(calls):
+    return {
+        method: count
+        for method, count in calls.items()
+        if method not in DELAYED_METHODS
+    }
+
+
+def compare(result, baseline):
+    """
+    Returns ``(regressions, warnings)`` of ``result`` against ``baseline``.
+
+    Queries per update, Bot API calls and errors must not grow; p95
+    latency only warns when it is far above the baseline.
+    """
+    regressions, warnings = [], []
+    baseline_steps = baseline.get("steps", {})
+    for step, previous in baseline_steps.items():
+        current = result["steps"].get(step)
+        # A step that stopped running is a regression, not a skip
+        if not current or not current["count"]:
+            regressions.append(f"{step}: did not run")
+            continue
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(
+                f"{step}: errors {previous.get('errors', 0)} -> {current['errors']}"
+            )
+        if current["queries_per_update"] > previous["queries_per_update"]:
+            regressions.append(
+                f"{step}: queries/update {previous['queries_per_update']}"
+                f" -> {current['queries_per_update']}"
+            )
+        if _deterministic_calls(current["bot_api_calls"]) != _deterministic_calls(
+            previous["bot_api_calls"]
+        ):
+            regressions.append(
+                f"{step}: Bot API calls {previous['bot_api_calls']}"
+                f" -> {current['bot_api_calls']}"
+            )
+        if current["p95_ms"] > previous["p95_ms"] * LATENCY_WARNING_RATIO:
+            warnings.append(
+                f"{step}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms"
+            )
+    # New steps have no baseline yet; errors there still fail the run
+    for step, current in result["steps"].items():
+        if step not in baseline_steps and current["errors"]:
+            regressions.append(f"{step}: {current['errors']} errors")
+    return regressions, warnings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--users", type=int, help="default 1000, or the baseline's with --compare"
+    )
+    parser.add_argument("--database-url")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(BASELINE.read_text()) if args.compare else None
+    users = args.users or (baseline["users"] if baseline else 1000)
+    if baseline and users != baseline["users"]:
+        print(
+            f"Baseline was recorded with {baseline['users']} users, not {users};"
+            " drop --users or record a new baseline."
+        )
+        return 2
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "e2e.db"
+    )
+    _configure_environment(database_url)
+    result = run(users)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n")
+        print(f"Baseline written to {BASELINE}")
+    if baseline:
+        regressions, warnings = compare(result, baseline)
+        if warnings:
+            print("Slower than baseline (not gated):\n  " + "\n  ".join(warnings))
+        if regressions:
+            print("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
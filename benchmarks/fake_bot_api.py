@@ -0,0 +1,111 @@
+"""
+A local stand-in for the Telegram/Bale Bot API.
+
+Answers every method telebot calls with a minimal valid result, counts
+calls per method and remembers, per chat, the last inline keyboard and
+invoice payload so simulated users can "tap" buttons and pay invoices.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+TRUE_METHODS = {
+    "answerCallbackQuery",
+    "answerPreCheckoutQuery",
+    "deleteMessage",
+}
+
+
+class FakeBotApi:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.calls: Counter = Counter()
+        self.keyboards: Dict[int, List[str]] = {}
+        self.invoices: Dict[int, str] = {}
+        self._message_id = 1000
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api._handle(self)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)  # multipart uploads are discarded
+                api._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    @property
+    def api_url(self) -> str:
+        """Value for telebot.apihelper.API_URL."""
+        return self.url + "/bot{0}/{1}"
+
+    def start(self) -> "FakeBotApi":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def buttons(self, chat_id: int, prefix: str = "") -> List[str]:
+        return [
+            data for data in self.keyboards.get(chat_id, []) if data.startswith(prefix)
+        ]
+
+    def last_invoice(self, chat_id: int) -> Optional[str]:
+        return self.invoices.get(chat_id)
+
+    def _handle(self, request) -> None:
+        parsed = urlparse(request.path)
+        method = parsed.path.rsplit("/", 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        with self._lock:
+            self.calls[method] += 1
+        body = json.dumps({"ok": True, "result": self._result(method, params)})
+        payload = body.encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        if method in TRUE_METHODS:
+            return True
+        chat_id = int(params.get("chat_id", 0) or 0)
+        markup = params.get("reply_markup")
+        if markup and chat_id:
+            keyboard = json.loads(markup).get("inline_keyboard")
+            if keyboard is not None:
+                self.keyboards[chat_id] = [
+                    button.get("callback_data", "") for row in keyboard for button in row
+                ]
+        if method == "sendInvoice":
+            self.invoices[chat_id] = params.get("payload")
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        result = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+        if method == "sendDocument":
+            # Re-sent documents arrive as a file_id string instead of an upload
+            file_id = params.get("document") or f"document-{message_id}"
+            result["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        return result
@@ -0,0 +1,100 @@
+"""
+Compare OFFSET and keyset pagination of the admin user listing on a
+synthetic table of 500k users.
+
+Run with (defaults to a throwaway SQLite file):
+    python -m benchmarks.pagination
+    DATABASE_URL=mysql+pymysql://... python -m benchmarks.pagination
+"""
+
+import os
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "pagination.db"
+    )
+
+from repositories import models, pagination  # noqa: E402
+from repositories.database import SessionLocal, engine  # noqa: E402
+
+USERS = 500_000
+PAGE_SIZE = 10
+BATCH = 20_000
+
+
+def seed(db, users=USERS):
+    if db.query(models.User.user_id).first():
+        return
+    table = models.User.__table__
+    for start in range(1, users + 1, BATCH):
+        rows = [
+            {
+                "user_id": 10_000_000 + i * 7,
+                "name": f"user{i}",
+                "surname": "bench",
+                "card_number": "6037990000000000",
+                "account_type": models.UserType.GENERAL,
+                "is_verified": models.VerificationStatus.VERIFIED,
+                "role": models.UserRole.USER,
+            }
+            for i in range(start, min(start + BATCH, users + 1))
+        ]
+        db.execute(table.insert(), rows)
+    db.commit()
+
+
+def _timed(func, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed(db)
+        total_pages = USERS // PAGE_SIZE
+        print(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+        for page in (1, 100, 10_000, total_pages // 2, total_pages - 1):
+            offset = (page - 1) * PAGE_SIZE
+            query = db.query(models.User).order_by(models.User.user_id)
+            # Boundary key of the previous page, as carried by the button
+            cursor = (
+                db.query(models.User.user_id)
+                .order_by(models.User.user_id)
+                .offset(offset - 1)
+                .limit(1)
+                .scalar()
+                if page > 1
+                else 0
+            )
+            direction = pagination.NEXT if page > 1 else pagination.FIRST
+
+            offset_ms = _timed(
+                lambda: (
+                    db.query(models.User).count(),
+                    query.offset(offset).limit(PAGE_SIZE).all(),
+                )
+            )
+            keyset_ms = _timed(
+                lambda: pagination.keyset_page(
+                    db.query(models.User),
+                    (models.User.user_id,),
+                    (cursor,),
+                    direction,
+                    PAGE_SIZE,
+                )
+            )
+            print(f"{page:>8} {offset_ms:>10.3f} {keyset_ms:>10.3f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Query-count budgets for the admin and user screens.
+
+Seeds a throwaway database, renders each screen against a recording bot
+stub and fails if a screen issues more statements than its budget, which
+catches N+1 regressions such as per-row re-fetches.
+
+Run with:
+    python -m benchmarks.queries
+"""
+
+import datetime
+import os
+import tempfile
+from types import SimpleNamespace
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "queries.db"
+    )
+os.environ.setdefault("REPORT_CACHE_DIR", tempfile.mkdtemp())
+os.environ.setdefault("CALLBACK_SECRET", "benchmark")
+
+from repositories import ledger, models  # noqa: E402
+from repositories.database import SessionLocal, engine  # noqa: E402
+from repositories.query_counter import assert_max_queries  # noqa: E402
+from repositories.reference import reference  # noqa: E402
+
+
+class RecordingBot:
+    """Accepts any Bot API call and remembers the last keyboard sent."""
+
+    def __init__(self):
+        self.last_markup = None
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.last_markup = kwargs.get("reply_markup") or self.last_markup
+            return SimpleNamespace(
+                message_id=1,
+                chat=SimpleNamespace(id=1),
+                document=SimpleNamespace(file_id=f"file-{name}"),
+            )
+
+        return method
+
+    def buttons(self, prefix):
+        return [
+            button.callback_data
+            for row in self.last_markup.keyboard
+            for button in row
+            if (button.callback_data or "").startswith(prefix)
+        ]
+
+
+def _call(data, user_id=1):
+    return SimpleNamespace(
+        id="1",
+        data=data,
+        from_user=SimpleNamespace(id=user_id),
+        message=SimpleNamespace(chat=SimpleNamespace(id=user_id), message_id=1),
+    )
+
+
+def _message(text, user_id=1):
+    return SimpleNamespace(
+        text=text,
+        message_id=1,
+        from_user=SimpleNamespace(id=user_id),
+        chat=SimpleNamespace(id=user_id),
+    )
+
+
+def seed(db, users=50, bookings=40):
+    for i in range(1, users + 1):
+        db.add(
+            models.User(user_id=i, name=f"user{i}", surname="x", card_number="0" * 16)
+        )
+    day = datetime.date(2025, 1, 1)
+    for i in range(bookings):
+        session = models.Session(
+            session_date=day + datetime.timedelta(days=i),
+            time_slot="15:00-16:30",
+            cost=1000,
+            available=False,
+            booked_user_id=1,
+        )
+        db.add(session)
+        db.flush()
+        db.add(
+            models.Payment(
+                user_id=1,
+                session_id=session.id,
+                amount=1000,
+                payment_date=datetime.datetime(2025, 1, 1)
+                + datetime.timedelta(hours=i),
+                verified=models.VerificationStatus.VERIFIED,
+            )
+        )
+    db.commit()
+    ledger.rebuild(db)
+
+
+def main():
+    from user_flow import admin, user
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    seed(db)
+    bot = RecordingBot()
+    admin_flow = admin.UserFlow(bot)
+    user_flow = user.UserFlow(bot)
+
+    def check(label, budget, func):
+        db.expunge_all()
+        with assert_max_queries(budget) as counter:
+            func()
+        print(f"{label:<28} {counter.count:>2} queries (budget {budget})")
+
+    # Warm the cached totals and reference data (prices, venues) so each
+    # screen is measured on its own queries
+    reference.load(db)
+    admin_flow.view_users(_call("ADMIN_VIEW_USERS_PAGE:1"), db)
+    check("view_users", 1, lambda: admin_flow.view_users(_call("ADMIN_VIEW_USERS_PAGE:1"), db))
+    user_button = bot.buttons("ADMIN_VIEW_USER:")[0]
+    check("view_user_details", 1, lambda: admin_flow.view_user_details(_call(user_button), db))
+    bookings = bot.buttons("ADMIN_BOOKED:")[0]
+    payments = bot.buttons("ADMIN_VIEW_USER_PAYMENTS:")[0]
+    admin_flow.view_user_payments(_call(payments), db)
+    check("view_user_bookings", 2, lambda: admin_flow.view_user_bookings(_call(bookings), db))
+    check("view_user_payments", 2, lambda: admin_flow.view_user_payments(_call(payments), db))
+    next_payments = bot.buttons("ADMIN_PAID:")[-1]
+    # The boundary payment with its user replaces the user lookup
+    check("view_user_payments_next", 2, lambda: admin_flow.view_user_payments(_call(next_payments), db))
+    check("manage_session", 1, lambda: admin_flow.manage_session(_call("ADMIN_MANAGE_SESSION:1"), db))
+    admin_flow.report_filter(_call("ADMIN_REPORT_FILTER:range:all"), db)
+    # Watermark, report rows, file_id lookup and store; then the watermark only
+    check("run_report", 4, lambda: admin_flow.run_report(_call("ADMIN_REPORT_RUN"), db))
+    check("run_report_cached", 1, lambda: admin_flow.run_report(_call("ADMIN_REPORT_RUN"), db))
+    # Payment rows, file_id lookup and store; then the rows only
+    check("report_all_payment", 3, lambda: user_flow.report_all_payment(_call("REPORT_ALL_PAYMENTS"), db))
+    check("report_all_payment_cached", 1, lambda: user_flow.report_all_payment(_call("REPORT_ALL_PAYMENTS"), db))
+    # Registration check and one availability aggregate per calendar page
+    check("show_sessions", 2, lambda: user_flow.show_sessions(_message("sessions"), db))
+    check("sessions_month", 1, lambda: user_flow.sessions_page(_call("SESSIONS_PAGE:m1410-1"), db))
+    check("admin_view_sessions", 1, lambda: admin_flow.view_sessions(_call("ADMIN_VIEW_SESSIONS"), db))
+    check("show_profile", 1, lambda: user_flow.show_profile(_message("profile"), db))
+    check("payment_history", 1, lambda: user_flow.payment_history(_message("history"), db))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Startup budget for the bot process.
+
+Runs ``python -X importtime -c "import mainv3"`` in a fresh interpreter and
+fails if importing the bot exceeds IMPORT_BUDGET_MS or pulls in any of the
+report-only libraries (pandas, openpyxl) or tkinter. Also reports the time
+to construct FootballSessionBot and the process RSS before and after the
+first report loads utils.reporting.
+
+Run with:
+    python -m benchmarks.startup
+"""
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_MS = 1000
+FORBIDDEN_MODULES = ("pandas", "openpyxl", "tkinter")
+TOP_IMPORTS = 10
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import mainv3
+imported = time.perf_counter()
+mainv3.FootballSessionBot()
+constructed = time.perf_counter()
+rss_startup = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+leaked = [name for name in {forbidden!r} if name in sys.modules]
+import utils.reporting
+rss_reporting = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_ms": round((imported - started) * 1000, 1),
+    "startup_ms": round((constructed - started) * 1000, 1),
+    "rss_startup_mb": round(rss_startup / 1024, 1),
+    "rss_after_reporting_mb": round(rss_reporting / 1024, 1),
+    "leaked_modules": leaked,
+}}))
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault(
+        "DATABASE_URL",
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db"),
+    )
+    env.setdefault("BOT_TOKEN", "1:benchmark")
+    env["METRICS_LOG_INTERVAL"] = "0"
+    env.pop("METRICS_PORT", None)
+    return env
+
+
+def import_times(env):
+    """(module, self_us, cumulative_us) rows reported by -X importtime."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mainv3"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        # nested imports are indented by two spaces per level
+        rows.append((module[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def startup_probe(env):
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(forbidden=FORBIDDEN_MODULES)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    env = _environment()
+    rows = import_times(env)
+    total_ms = next(cumulative for module, _, cumulative in rows if module == "mainv3") / 1000
+    imported = {module.strip() for module, _, _ in rows}
+    leaked = sorted(module for module in FORBIDDEN_MODULES if module in imported)
+
+    print(f"import mainv3: {total_ms:.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    print("slowest top-level imports (cumulative):")
+    first_level = [row for row in rows if row[0].startswith("  ") and row[0][2] != " "]
+    for module, _, cumulative in sorted(first_level, key=lambda row: -row[2])[:TOP_IMPORTS]:
+        print(f"  {module.strip():<32} {cumulative / 1000:8.1f} ms")
+
+    probe = startup_probe(env)
+    print(json.dumps(probe, indent=2))
+
+    failures = []
+    if total_ms > IMPORT_BUDGET_MS:
+        failures.append(f"import mainv3 took {total_ms:.1f} ms")
+    if leaked or probe["leaked_modules"]:
+        failures.append(
+            "report-only modules imported at startup: "
+            + ", ".join(sorted(set(leaked) | set(probe["leaked_modules"])))
+        )
+    if failures:
+        print("FAIL\n  " + "\n  ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
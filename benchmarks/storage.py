@@ -0,0 +1,153 @@
+"""
+Compare payment insert throughput and on-disk size of the ``payments``
+table and its indexes across storage layouts (repositories.types):
+
+    uuid4     VARCHAR(36) random UUIDs, string enums (the previous layout)
+    uuid7     VARCHAR(36) time-ordered UUIDs, string enums (the default)
+    compact   BINARY(16) time-ordered UUIDs, small-int enums
+              (COMPACT_STORAGE=1)
+
+The layout is fixed when the models are imported, so each one is measured
+in a child process against its own throwaway SQLite file (or, with
+DATABASE_URL, a scratch MySQL database that is dropped and recreated).
+
+Run with:
+    python -m benchmarks.storage [--payments 1000000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+LAYOUTS = {
+    "uuid4": {"COMPACT_STORAGE": "0"},
+    "uuid7": {"COMPACT_STORAGE": "0"},
+    "compact": {"COMPACT_STORAGE": "1"},
+}
+PAYMENTS = 1_000_000
+BATCH = 10_000
+USERS = 10_000
+SESSIONS = 5_000
+
+
+def _sizes(engine):
+    """Bytes used by the payments table and by its indexes."""
+    from sqlalchemy import text
+
+    with engine.connect() as connection:
+        if engine.dialect.name == "mysql":
+            connection.execute(text("ANALYZE TABLE payments"))
+            data, index = connection.execute(
+                text(
+                    "SELECT data_length, index_length FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = 'payments'"
+                )
+            ).one()
+            return int(data), int(index)
+        # SQLite: the primary key of a VARCHAR/BLOB key is its own index
+        pages = dict(
+            connection.execute(
+                text(
+                    "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = 'payments') "
+                    "GROUP BY name"
+                )
+            ).all()
+        )
+    data = pages.pop("payments", 0)
+    return data, sum(pages.values())
+
+
+def measure(layout, payments):
+    import datetime
+    import uuid
+
+    from sqlalchemy import insert
+
+    from repositories import models
+    from repositories.database import engine
+    from repositories.types import new_id
+
+    ids = (lambda: str(uuid.uuid4())) if layout == "uuid4" else new_id
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    statuses = list(models.VerificationStatus)
+    start = datetime.datetime(2024, 1, 1)
+    elapsed = 0.0
+    with engine.connect() as connection:
+        for offset in range(0, payments, BATCH):
+            rows = [
+                {
+                    "id": ids(),
+                    "user_id": i % USERS + 1,
+                    "session_id": i % SESSIONS + 1,
+                    "payment_date": start + datetime.timedelta(minutes=i),
+                    "amount": 150_000,
+                    "verified": statuses[i % len(statuses)],
+                    "updated_at": start + datetime.timedelta(minutes=i),
+                }
+                for i in range(offset, min(offset + BATCH, payments))
+            ]
+            started = time.perf_counter()
+            connection.execute(insert(models.Payment), rows)
+            connection.commit()
+            elapsed += time.perf_counter() - started
+    data, index = _sizes(engine)
+    return {
+        "layout": layout,
+        "payments": payments,
+        "rows_per_s": round(payments / elapsed),
+        "table_mb": round(data / 2**20, 1),
+        "index_mb": round(index / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=PAYMENTS)
+    parser.add_argument("--layout", choices=LAYOUTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layout:
+        print(json.dumps(measure(args.layout, args.payments)))
+        return
+
+    scratch = tempfile.mkdtemp()
+    results = []
+    for layout, env in LAYOUTS.items():
+        child_env = dict(os.environ, **env)
+        if not os.getenv("DATABASE_URL"):
+            child_env["DATABASE_URL"] = "sqlite:///" + os.path.join(
+                scratch, f"{layout}.db"
+            )
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.storage",
+                "--layout",
+                layout,
+                "--payments",
+                str(args.payments),
+            ],
+            env=child_env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'layout':>8} {'rows/s':>10} {'table MB':>10} {'index MB':>10}")
+    for result in results:
+        print(
+            f"{result['layout']:>8} {result['rows_per_s']:>10} "
+            f"{result['table_mb']:>10} {result['index_mb']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
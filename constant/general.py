@@ -25,6 +25,20 @@ PERSIAN_DAY_NAMES = {
     "Saturday": "شنبه",
     "Sunday": "یکشنبه",
 }
+PERSIAN_MONTH_NAMES = [
+    "فروردین",
+    "اردیبهشت",
+    "خرداد",
+    "تیر",
+    "مرداد",
+    "شهریور",
+    "مهر",
+    "آبان",
+    "آذر",
+    "دی",
+    "بهمن",
+    "اسفند",
+]
 TIMESLOTS = [
     "15:00-16:30",
     "16:30-18:00",
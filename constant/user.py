@@ -22,6 +22,7 @@ class Buttons:
     SHOW_SESSIONS = "مشاهده سانس ها"
     SHOW_PAYMENT_HISTORY = "مشاهده تاریخچه پرداخت ها"
     SHOW_PROFILE = "مشاهده پروفایل"
+    SHOW_SUBSCRIPTIONS = "رزروهای هفتگی"
 
 
 @dataclass(
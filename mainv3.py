@@ -5,6 +5,8 @@ This module initializes and runs the Telegram bot for managing football sessions
 handling user registration, session booking, and administrative functions.
 """
 
+import datetime
+import logging
 import os
 import pathlib
 from typing import Callable, Dict, Optional
@@ -14,10 +16,17 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 
 from constant import user as CUSER
-from repositories import models
+from repositories import archive, ledger, models, rollups, schedule, venues
 from repositories.database import engine
+from repositories.migrations import ensure_columns, ensure_indexes
+from repositories.reference import reference
 from repositories.utils import get_db
-from user_flow import admin, user
+from user_flow import admin, keyboards, user
+from utility import warm_persian_dates
+from utils import broadcast, callback, metrics, recurring, reminders, waitlist_offers
+from utils.profiler import sampler
+from utils.sender import sender
+from utils.startup import startup, warm_pool
 from utils.dependency import Dependency, inject
 
 
@@ -34,14 +43,36 @@ class CallbackHandler:
         return {
             "ACCOUNT_TYPE:": lambda call, db: self.user_flow.acccount_register(call),
             "SESSION_DATE:": lambda call, db: self.user_flow.session_date(call, db),
+            "SESSIONS_PAGE:": lambda call, db: self.user_flow.sessions_page(call, db),
+            "ADMIN_SESSIONS_PAGE:": lambda call, db: self.admin_flow.sessions_page(
+                call, db
+            ),
+            "ADMIN_VENUES": lambda call, db: self.admin_flow.venues(call, db),
+            "ADMIN_VENUE_ADD": lambda call, db: self.admin_flow.add_venue(call, db),
+            "ADMIN_VENUE_TOGGLE:": lambda call, db: self.admin_flow.toggle_venue(call, db),
+            # Blank calendar cells
+            "CALENDAR_NOOP": lambda call, db: self.user_flow.bot.answer_callback_query(
+                call.id
+            ),
             "ADMIN_START": lambda call, db: self.admin_flow.start(call),
             "SHOW_SESSIONS": lambda call, db: self.user_flow.show_sessions(message=None,db=db,call=call),
             "ADMIN_CHANGE_BASED_COST": lambda call, db: self.admin_flow.change_based_cost(
                 call, db
             ),
+            "ADMIN_TOGGLE_PROFILER": lambda call, db: self.admin_flow.toggle_profiler(
+                call, db
+            ),
             "ADMIN_GENERATE_REPORT": lambda call, db: self.admin_flow.generate_report(
                 call, db
             ),
+            "ADMIN_REPORT_FILTER:": lambda call, db: self.admin_flow.report_filter(
+                call, db
+            ),
+            "ADMIN_REPORT_RUN": lambda call, db: self.admin_flow.run_report(call, db),
+            "ADMIN_ROLLUPS:": lambda call, db: self.admin_flow.rollup_report(call, db),
+            "ADMIN_ROLLUPS_EXPORT:": lambda call, db: self.admin_flow.export_rollups(
+                call, db
+            ),
             "ADMIN_SESSION_DATE:": lambda call, db: self.admin_flow.seesion_date(
                 call, db
             ),
@@ -51,6 +82,18 @@ class CallbackHandler:
             "ADMIN_SESSION_REFUND:": lambda call, db: self.admin_flow.session_refund(
                 call, db
             ),
+            "ADMIN_BROADCAST": lambda call, db: self.admin_flow.broadcast_menu(call, db),
+            "ADMIN_BROADCAST_AUDIENCE:": lambda call, db: self.admin_flow.broadcast_audience(
+                call, db
+            ),
+            "ADMIN_BROADCAST_SEND": lambda call, db: self.admin_flow.broadcast_send(
+                call, db
+            ),
+            "ADMIN_CANCEL_RANGE": lambda call, db: self.admin_flow.cancel_range(call, db),
+            "ADMIN_CANCEL_DAYS:": lambda call, db: self.admin_flow.cancel_days(call, db),
+            "ADMIN_CANCEL_CONFIRM:": lambda call, db: self.admin_flow.confirm_cancel_days(
+                call, db
+            ),
             "ADMIN_DEACTIVATE_SESSION:": lambda call, db: self.admin_flow.deactive_session(
                 call, db
             ),
@@ -62,6 +105,13 @@ class CallbackHandler:
                 None, db, call
             ),
             "PAYMENT:": lambda call, db: self.user_flow.start_payment(call, db),
+            "WAITLIST_JOIN:": lambda call, db: self.user_flow.join_waitlist(call, db),
+            "WAITLIST_CLAIM:": lambda call, db: self.user_flow.claim_waitlist(call, db),
+            "SUBSCRIBE:": lambda call, db: self.user_flow.subscribe(call, db),
+            "SUBSCRIPTIONS": lambda call, db: self.user_flow.subscriptions(None, db, call),
+            "SUBSCRIPTION_CANCEL:": lambda call, db: self.user_flow.cancel_subscription(
+                call, db
+            ),
             "REPORT_RECENT_PAYMENTS": lambda call, db: self.user_flow.resent_payments(
                 call, db
             ),
@@ -69,13 +119,16 @@ class CallbackHandler:
                 call, db
             ),
             # "CONFIRM_": lambda call, db: self.user_flow.confirm_session(call, db),
-            "ADMIN_VIEW_USER_BOOKINGS:": lambda call, db: self.admin_flow.view_user_bookings(
+            "ADMIN_BOOKED:": lambda call, db: self.admin_flow.view_user_bookings(
                 call, db
             ),
             "ADMIN_VIEW_USER_PAYMENTS:": lambda call, db: self.admin_flow.view_user_payments(
                 call, db
             ),
-            "ADMIN_VIEW_USER_VERIFICATION:": lambda call, db: self.admin_flow.user_verification(call, db),
+            "ADMIN_PAID:": lambda call, db: self.admin_flow.view_user_payments(
+                call, db
+            ),
+            "ADMIN_USER_VERIFY:": lambda call, db: self.admin_flow.user_verification(call, db),
             "ADMIN_VIEW_USER:": lambda call, db: self.admin_flow.view_user_details(
                 call, db
             ),
@@ -111,7 +164,9 @@ class CallbackHandler:
             if call.data == prefix or (
                 prefix.endswith(":") and call.data.startswith(prefix)
             ):
-                handler(call, db)
+                route = prefix.rstrip(":")
+                with metrics.track(route), sampler.sample(route):
+                    handler(call, db)
                 return True
         return False
 
@@ -125,6 +180,7 @@ class MessageHandler:
             CUSER.Buttons.SHOW_PROFILE: self.user_flow.show_profile,
             CUSER.Buttons.SHOW_SESSIONS: self.user_flow.show_sessions,
             CUSER.Buttons.SHOW_PAYMENT_HISTORY: self.user_flow.payment_history,
+            CUSER.Buttons.SHOW_SUBSCRIPTIONS: self.user_flow.subscriptions,
         }
 
     def handle(self, message: telebot.types.Message, db: Session) -> None:
@@ -137,33 +193,88 @@ class MessageHandler:
         """
         handler = self.handlers.get(message.text)
         if handler:
-            handler(message, db)
+            route = handler.__name__
+            with metrics.track(route), sampler.sample(route):
+                handler(message, db)
 
 
 class FootballSessionBot:
     """Main bot class that initializes and runs the Telegram bot."""
 
     def __init__(self):
-        self.setup_environment()
-        self.setup_database()
-        self.bot = self.create_bot()
-        self.user_flow = user.UserFlow(self.bot)
-        self.admin_flow = admin.UserFlow(self.bot)
-        self.callback_handler = CallbackHandler(self.user_flow, self.admin_flow)
-        self.message_handler = MessageHandler(self.user_flow)
-        self.register_handlers()
+        with startup.phase("environment"):
+            self.setup_environment()
+        with startup.phase("instrumentation"):
+            self.setup_instrumentation()
+        with startup.phase("database"):
+            self.setup_database()
+        with startup.phase("handlers"):
+            self.bot = self.create_bot()
+            self.user_flow = user.UserFlow(self.bot)
+            self.admin_flow = admin.UserFlow(self.bot)
+            self.callback_handler = CallbackHandler(self.user_flow, self.admin_flow)
+            self.message_handler = MessageHandler(self.user_flow)
+            self.register_handlers()
+        self.warm_up()
+        startup.mark_ready()
 
     @staticmethod
     def setup_environment() -> None:
-        """Load environment variables from .env file."""
+        """Load environment variables from .env file and check the callback secret."""
         base_dir = pathlib.Path(__file__).parent.absolute()
         load_dotenv(base_dir / ".env")
+        callback.signing_key()
+
+    @staticmethod
+    def setup_instrumentation() -> None:
+        """
+        Hook SQL and Bot API timing and start the exporters.
+
+        METRICS_PORT enables the local Prometheus endpoint and
+        METRICS_LOG_INTERVAL (seconds, 0 to disable) the periodic log line.
+        PROFILER_* settings configure the slow handler sampler.
+        """
+        metrics.instrument_engine(engine)
+        metrics.instrument_bot_api()
+        sampler.configure_from_env()
+        sampler.instrument_engine(engine)
+        port = os.getenv("METRICS_PORT")
+        if port:
+            metrics.start_http_server(int(port), is_ready=lambda: startup.ready)
+        interval = float(os.getenv("METRICS_LOG_INTERVAL", 60))
+        if interval > 0:
+            metrics.start_log_reporter(interval)
 
     @staticmethod
     def setup_database() -> None:
         """Initialize database and set up initial data if needed."""
         models.Base.metadata.create_all(bind=engine)
+        ensure_columns(engine)
+        ensure_indexes(engine)
         setup_payment_categories()
+        setup_venues()
+        backfill_session_times()
+        backfill_payment_summaries()
+
+    @staticmethod
+    def warm_up() -> None:
+        """
+        Fill caches before the first update arrives.
+
+        Opens the DB pool's connections and loads session prices, the admin
+        card number, Jalali dates around today and the static keyboards in
+        parallel. STARTUP_WARM_UP=0 skips it.
+        """
+        if os.getenv("STARTUP_WARM_UP", "1") == "0":
+            return
+        startup.warm_up(
+            {
+                "db_pool": lambda: warm_pool(engine),
+                "reference_data": load_reference_data,
+                "jalali": warm_persian_dates,
+                "keyboards": keyboards.warm_up,
+            }
+        )
 
     @staticmethod
     def create_bot() -> telebot.TeleBot:
@@ -181,7 +292,8 @@ class FootballSessionBot:
         def start_handler(
             message: telebot.types.Message, db: Session = Dependency(get_db)
         ):
-            self.user_flow.start(message, db, self.admin_flow.start)
+            with metrics.track("start"), sampler.sample("start"):
+                self.user_flow.start(message, db, self.admin_flow.start)
 
         @self.bot.callback_query_handler(func=lambda call: True)
         @inject
@@ -197,11 +309,78 @@ class FootballSessionBot:
         ):
             self.message_handler.handle(message, db)
 
+    def start_jobs(self) -> None:
+        """
+        Start periodic background jobs and resume interrupted broadcasts.
+
+        ROLLUP_INTERVAL (seconds, default 300, 0 to disable) sets how often
+        the daily revenue and occupancy rollups are refreshed.
+        REMINDER_INTERVAL (seconds, default 60, 0 to disable) and
+        REMINDER_LEAD_HOURS (default 3) control booking reminders.
+        WAITLIST_INTERVAL (seconds, default 30, 0 to disable) sets how often
+        unclaimed waitlist offers and unpaid holds expire. RECURRING_INTERVAL
+        (seconds, default 3600, 0 to disable) sets how often the session
+        window is extended and booked for weekly subscriptions.
+        ARCHIVE_INTERVAL (seconds, default 86400, 0 to disable) sets how
+        often sessions older than ARCHIVE_AFTER_DAYS (default 365) are moved,
+        with their payments, to the archive tables. SENDER_*
+        settings configure the rate-limited sender used by bulk operations.
+        """
+        sender.configure_from_env()
+        interval = float(os.getenv("ROLLUP_INTERVAL", 300))
+        if interval > 0:
+            rollups.start_refresher(interval)
+        interval = float(os.getenv("REMINDER_INTERVAL", 60))
+        if interval > 0:
+            lead = datetime.timedelta(hours=float(os.getenv("REMINDER_LEAD_HOURS", 3)))
+            reminders.start_scheduler(self.bot, interval, lead)
+        interval = float(os.getenv("WAITLIST_INTERVAL", 30))
+        if interval > 0:
+            waitlist_offers.start_scheduler(self.bot, interval)
+        interval = float(os.getenv("RECURRING_INTERVAL", 3600))
+        if interval > 0:
+            recurring.start_scheduler(self.bot, interval)
+        interval = float(os.getenv("ARCHIVE_INTERVAL", 86400))
+        if interval > 0:
+            archive.start_archiver(interval)
+        broadcast.resume_unfinished(self.bot)
+
     def run(self) -> None:
         """Start the bot and keep it running."""
+        self.start_jobs()
         self.bot.polling(none_stop=True, interval=0)
 
 
+@inject
+def load_reference_data(db: Session = Dependency(get_db)) -> None:
+    """Load session prices and the admin card number into the cache."""
+    reference.load(db)
+
+
+@inject
+def setup_venues(db: Session = Dependency(get_db)) -> None:
+    """Create the first venue and assign it the sessions created before venues."""
+    updated = venues.ensure_default(db)
+    if updated:
+        logging.getLogger("startup").info("assigned %d rows to the default venue", updated)
+
+
+@inject
+def backfill_session_times(db: Session = Dependency(get_db)) -> None:
+    """Fill start/end times of sessions created before the columns existed."""
+    updated = schedule.backfill_slot_times(db)
+    if updated:
+        logging.getLogger("startup").info("backfilled times of %d sessions", updated)
+
+
+@inject
+def backfill_payment_summaries(db: Session = Dependency(get_db)) -> None:
+    """Build the per-user payment ledger of users with payments but no summary."""
+    written = ledger.backfill_missing(db)
+    if written:
+        logging.getLogger("startup").info("backfilled %d payment summaries", written)
+
+
 @inject
 def setup_payment_categories(db: Session = Dependency(get_db)) -> None:
     """
@@ -228,5 +407,6 @@ def setup_payment_categories(db: Session = Dependency(get_db)) -> None:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     football_bot = FootballSessionBot()
     football_bot.run()
@@ -0,0 +1,117 @@
+"""
+Archival of past sessions and their payments.
+
+``sessions`` and ``payments`` only grow, but rows older than a year or so
+are only read by reports. ``archive`` moves the sessions played before a
+cutoff, together with their payments, into ``sessions_archive`` and
+``payments_archive``: batches of sessions are copied with INSERT ...
+SELECT and deleted, one transaction per batch. Their booking reminders
+and waitlist entries are dropped.
+
+The latest archived ``payment_date`` is kept in ``rollup_watermarks``
+(``reference.archived_until``); payment reports, rollup recomputes and
+ledger rebuilds also read the archive when their range reaches it.
+"""
+
+import datetime
+import os
+import threading
+from typing import Optional, Tuple
+
+from sqlalchemy import func, insert, select
+
+from . import models, rollups
+from .database import SessionLocal
+from .reference import ARCHIVE_WATERMARK, reference
+
+# Sessions moved per transaction
+BATCH = 1000
+
+
+def horizon(today: Optional[datetime.date] = None) -> datetime.date:
+    """Sessions before this day are archived (ARCHIVE_AFTER_DAYS, default 365)."""
+    days = float(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+    return (today or datetime.date.today()) - datetime.timedelta(days=days)
+
+
+def _copy(db, source, target, condition) -> None:
+    names = [column.name for column in source.columns]
+    db.execute(
+        insert(target).from_select(
+            names, select(*(source.c[name] for name in names)).where(condition)
+        )
+    )
+
+
+def _advance(db, archived_until: datetime.datetime) -> None:
+    watermark = db.get(models.RollupWatermark, ARCHIVE_WATERMARK)
+    if watermark is None:
+        db.add(models.RollupWatermark(name=ARCHIVE_WATERMARK, value=archived_until))
+    elif watermark.value is None or archived_until > watermark.value:
+        watermark.value = archived_until
+
+
+def archive(db, before: datetime.date, batch: int = BATCH) -> Tuple[int, int]:
+    """
+    Move the sessions dated before ``before`` and their payments to the
+    archive tables; returns how many sessions and payments were moved.
+    """
+    Session, Payment = models.Session, models.Payment
+    sessions, payments = Session.__table__, Payment.__table__
+    # Fold pending changes into the rollups while the rows are still live
+    rollups.refresh(db)
+    moved_sessions = moved_payments = 0
+    while True:
+        ids = [
+            session_id
+            for (session_id,) in db.query(Session.id)
+            .filter(Session.session_date < before)
+            .order_by(Session.id)
+            .limit(batch)
+        ]
+        if not ids:
+            break
+        last_payment = (
+            db.query(func.max(Payment.payment_date))
+            .filter(Payment.session_id.in_(ids))
+            .scalar()
+        )
+        _copy(db, sessions, models.SessionArchive.__table__, sessions.c.id.in_(ids))
+        _copy(db, payments, models.PaymentArchive.__table__, payments.c.session_id.in_(ids))
+        for model in (models.BookingReminder, models.WaitlistEntry):
+            db.query(model).filter(model.session_id.in_(ids)).delete(
+                synchronize_session=False
+            )
+        moved_payments += (
+            db.query(Payment)
+            .filter(Payment.session_id.in_(ids))
+            .delete(synchronize_session=False)
+        )
+        moved_sessions += (
+            db.query(Session).filter(Session.id.in_(ids)).delete(synchronize_session=False)
+        )
+        if last_payment is not None:
+            _advance(db, last_payment)
+        db.commit()
+    if moved_sessions:
+        reference.invalidate()
+    return moved_sessions, moved_payments
+
+
+def start_archiver(interval: float) -> threading.Event:
+    """Archive past the horizon every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            db = SessionLocal()
+            try:
+                archive(db, horizon())
+            except Exception as e:
+                db.rollback()
+                print(f"Error archiving sessions: {e}")
+            finally:
+                db.close()
+
+    threading.Thread(target=run, name="archive", daemon=True).start()
+    return stopped
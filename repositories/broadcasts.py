@@ -0,0 +1,162 @@
+"""
+Broadcast recipients and delivery status.
+
+Recipients are copied from the audience into ``broadcast_recipients`` a
+page at a time (keyset on ``user_id``, the cursor kept on the broadcast),
+and results are written back in batches. Everything needed to continue a
+broadcast lives in these two tables, so an interrupted one is resumed
+from its pending recipients and its cursor.
+"""
+
+import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+
+from . import models
+
+PAGE_SIZE = 500
+
+PENDING = models.DeliveryStatus.PENDING
+SENT = models.DeliveryStatus.SENT
+FAILED = models.DeliveryStatus.FAILED
+
+
+def audience_query(db, audience: str):
+    """Query of the audience's ``user_id`` column."""
+    User = models.User
+    kind, _, value = audience.partition(":")
+    if kind == "all":
+        return db.query(User.user_id).filter(User.role == models.UserRole.USER)
+    if kind == "type":
+        return db.query(User.user_id).filter(
+            User.role == models.UserRole.USER,
+            User.account_type == models.UserType[value],
+        )
+    if kind == "date":
+        return (
+            db.query(models.Session.booked_user_id.label("user_id"))
+            .filter(
+                models.Session.session_date == datetime.date.fromisoformat(value),
+                models.Session.booked_user_id.isnot(None),
+            )
+            .distinct()
+        )
+    raise ValueError(audience)
+
+
+def _audience_column(query):
+    return query.column_descriptions[0]["expr"]
+
+
+def audience_size(db, audience: str) -> int:
+    return audience_query(db, audience).count()
+
+
+def create(
+    db, text: str, audience: str, created_by: int, chat_id: int, message_id: int
+) -> models.Broadcast:
+    broadcast = models.Broadcast(
+        text=text,
+        audience=audience,
+        created_by=created_by,
+        progress_chat_id=chat_id,
+        progress_message_id=message_id,
+        total=audience_size(db, audience),
+    )
+    db.add(broadcast)
+    db.commit()
+    return broadcast
+
+
+def materialize_page(db, broadcast: models.Broadcast) -> int:
+    """Copy the next page of the audience into the recipients; returns its size."""
+    query = audience_query(db, broadcast.audience)
+    column = _audience_column(query)
+    user_ids = [
+        user_id
+        for (user_id,) in query.filter(column > broadcast.cursor)
+        .order_by(column)
+        .limit(PAGE_SIZE)
+    ]
+    if not user_ids:
+        return 0
+    db.execute(
+        insert(models.BroadcastRecipient),
+        [{"broadcast_id": broadcast.id, "user_id": user_id} for user_id in user_ids],
+    )
+    broadcast.cursor = user_ids[-1]
+    db.commit()
+    return len(user_ids)
+
+
+def pending_page(db, broadcast_id: int, after: int) -> List[int]:
+    return [
+        user_id
+        for (user_id,) in db.query(models.BroadcastRecipient.user_id)
+        .filter(
+            models.BroadcastRecipient.broadcast_id == broadcast_id,
+            models.BroadcastRecipient.status == PENDING,
+            models.BroadcastRecipient.user_id > after,
+        )
+        .order_by(models.BroadcastRecipient.user_id)
+        .limit(PAGE_SIZE)
+    ]
+
+
+def record_results(
+    db, broadcast_id: int, results: Iterable[Tuple[int, Optional[str]]]
+) -> None:
+    """Store ``(user_id, error)`` results (``error`` None when delivered)."""
+    results = list(results)
+    if not results:
+        return
+    now = datetime.datetime.now()
+    db.execute(
+        update(models.BroadcastRecipient),
+        [
+            {
+                "broadcast_id": broadcast_id,
+                "user_id": user_id,
+                "status": SENT if error is None else FAILED,
+                "error": None if error is None else error[:255],
+                "sent_at": now,
+            }
+            for user_id, error in results
+        ],
+    )
+    failed = sum(1 for _, error in results if error is not None)
+    db.query(models.Broadcast).filter(models.Broadcast.id == broadcast_id).update(
+        {
+            models.Broadcast.sent: models.Broadcast.sent + len(results) - failed,
+            models.Broadcast.failed: models.Broadcast.failed + failed,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def finish(db, broadcast_id: int) -> models.Broadcast:
+    broadcast = db.get(models.Broadcast, broadcast_id)
+    counts = dict(
+        db.query(models.BroadcastRecipient.status, func.count())
+        .filter(models.BroadcastRecipient.broadcast_id == broadcast_id)
+        .group_by(models.BroadcastRecipient.status)
+        .all()
+    )
+    broadcast.sent = counts.get(SENT, 0)
+    broadcast.failed = counts.get(FAILED, 0)
+    broadcast.total = sum(counts.values())
+    broadcast.status = models.BroadcastStatus.DONE
+    broadcast.finished_at = datetime.datetime.now()
+    db.commit()
+    return broadcast
+
+
+def unfinished(db) -> List[int]:
+    return [
+        broadcast_id
+        for (broadcast_id,) in db.query(models.Broadcast.id).filter(
+            models.Broadcast.status == models.BroadcastStatus.RUNNING
+        )
+    ]
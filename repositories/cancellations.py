@@ -0,0 +1,96 @@
+"""
+Bulk cancellation of whole days.
+
+When the pitch closes (rain, maintenance) every session of the affected
+days is deactivated with one UPDATE and a refund payment is created for
+each paid booking, in one transaction. The refunds are then settled one
+by one through the usual refund invoice (admin.verify_refund), which
+frees the session and marks the original payment as refunded.
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from . import models, queries, waitlist
+
+REFUND_COMMENT = "استرداد وجه"
+# Refund invoices carry this prefix so their successful payment reaches
+# admin.verify_refund instead of the user's verify_payment
+REFUND_PAYLOAD = "REFUND:"
+
+
+def is_refund_payment(message) -> bool:
+    return message.successful_payment.invoice_payload.startswith(REFUND_PAYLOAD)
+
+
+def payment_id_from_payload(payload: str) -> str:
+    return payload[len(REFUND_PAYLOAD):] if payload.startswith(REFUND_PAYLOAD) else payload
+
+
+@dataclass(frozen=True)
+class Refund:
+    """What the refund invoice and the user notification need, detached from the DB."""
+
+    refund_payment_id: str
+    user_id: int
+    name: str
+    surname: str
+    card_number: str
+    amount: int
+    shipping_option_id: str
+    session_date: datetime.date
+    time_slot: str
+
+
+def cancel_days(
+    db, start: datetime.date, end: datetime.date, admin_id: int
+) -> Tuple[int, List[Refund]]:
+    """
+    Close every session on ``start <= day <= end`` and start a refund for
+    each paid booking. Returns the number of sessions closed and the refunds.
+    """
+    bookings = queries.paid_bookings_between(db, start, end)
+    waitlist.cancel_for_days(db, start, end)
+    waitlist.release_holds_for_days(db, start, end)
+    now = datetime.datetime.now()
+    # closed_at keeps expiring holds and offers from reopening the sessions
+    closed = (
+        db.query(models.Session)
+        .filter(
+            models.Session.session_date >= start,
+            models.Session.session_date <= end,
+        )
+        .update(
+            {models.Session.available: False, models.Session.closed_at: now},
+            synchronize_session=False,
+        )
+    )
+    refund_payments = [
+        models.Payment(
+            user_id=admin_id,
+            session_id=booking.session.id,
+            amount=booking.amount,
+            payment_date=now,
+            comment=REFUND_COMMENT,
+        )
+        for booking in bookings
+    ]
+    db.add_all(refund_payments)
+    db.flush()
+    refunds = [
+        Refund(
+            refund_payment_id=refund_payment.id,
+            user_id=booking.user.user_id,
+            name=booking.user.name,
+            surname=booking.user.surname,
+            card_number=booking.user.card_number,
+            amount=booking.amount,
+            shipping_option_id=booking.shipping_option_id,
+            session_date=booking.session.session_date,
+            time_slot=booking.session.time_slot,
+        )
+        for refund_payment, booking in zip(refund_payments, bookings)
+    ]
+    db.commit()
+    return closed, refunds
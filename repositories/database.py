@@ -1,8 +1,10 @@
+import os
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-URL_DATABASE = "mysql+pymysql://{username}:{password}@{host}:{port}/{db_name}".format(
+URL_DATABASE = os.getenv("DATABASE_URL") or "mysql+pymysql://{username}:{password}@{host}:{port}/{db_name}".format(
     username='admin',
     password='admin',
     host='localhost',
@@ -0,0 +1,242 @@
+"""
+Per-user payment ledger.
+
+``user_payment_summaries`` keeps, per user, the total and number of
+verified payments, the number of pending and refunded payments and the
+latest verified payment. Handlers call ``record_status_change`` whenever
+they change ``Payment.verified``, before their commit, so the summary is
+updated in the same transaction as the payment itself. Refund invoices
+(paid by the admin, see repositories.cancellations) are not counted.
+"""
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, exists, func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from . import models
+from .cancellations import REFUND_COMMENT
+from .reference import reference
+
+PENDING = models.VerificationStatus.PENDING
+VERIFIED = models.VerificationStatus.VERIFIED
+REFUNDED = models.VerificationStatus.REFUNDED
+
+
+def _delta(old, new, status) -> int:
+    return (new == status) - (old == status)
+
+
+def get_summary(db, user_id: int) -> Optional[models.UserPaymentSummary]:
+    return db.get(models.UserPaymentSummary, user_id)
+
+
+def record_status_change(
+    db,
+    payment: models.Payment,
+    old_status: Optional[models.VerificationStatus],
+) -> None:
+    """Apply the move of ``payment`` from ``old_status`` to its current status."""
+    new_status = payment.verified
+    if old_status == new_status or payment.comment == REFUND_COMMENT:
+        return
+    paid = _delta(old_status, new_status, VERIFIED)
+    values = {
+        models.UserPaymentSummary.pending_count: models.UserPaymentSummary.pending_count
+        + _delta(old_status, new_status, PENDING),
+        models.UserPaymentSummary.refunded_count: models.UserPaymentSummary.refunded_count
+        + _delta(old_status, new_status, REFUNDED),
+        models.UserPaymentSummary.payment_count: models.UserPaymentSummary.payment_count
+        + paid,
+        models.UserPaymentSummary.total_paid: models.UserPaymentSummary.total_paid
+        + paid * payment.amount,
+    }
+
+    summary = get_summary(db, payment.user_id)
+    if summary is None:
+        # Upsert: a concurrent handler may be creating the same row
+        _insert_missing_summary(db, payment.user_id)
+        if paid:
+            summary = get_summary(db, payment.user_id)
+    if paid > 0 and (
+        summary.last_payment_date is None
+        or payment.payment_date >= summary.last_payment_date
+    ):
+        values[models.UserPaymentSummary.last_payment_date] = payment.payment_date
+        values[models.UserPaymentSummary.last_payment_id] = payment.id
+    elif paid < 0 and summary.last_payment_id == payment.id:
+        # The latest payment was refunded: fall back to the one before it
+        last = _latest_verified(db, payment.user_id, exclude=payment.id)
+        values[models.UserPaymentSummary.last_payment_date] = (
+            last.payment_date if last else None
+        )
+        values[models.UserPaymentSummary.last_payment_id] = last.id if last else None
+
+    # Relative UPDATE, so concurrent handlers for the same user don't lose counts
+    db.query(models.UserPaymentSummary).filter(
+        models.UserPaymentSummary.user_id == payment.user_id
+    ).update(values, synchronize_session=False)
+    if summary is not None:
+        db.expire(summary)
+
+
+def _insert_missing_summary(db, user_id: int) -> None:
+    """Create an empty summary for ``user_id`` in one race-free upsert."""
+    Summary = models.UserPaymentSummary
+    values = dict(
+        user_id=user_id,
+        total_paid=0,
+        payment_count=0,
+        pending_count=0,
+        refunded_count=0,
+    )
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(Summary).values(**values)
+        statement = statement.on_duplicate_key_update(user_id=statement.inserted.user_id)
+    else:
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = (
+            dialect.insert(Summary)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=[Summary.user_id])
+        )
+    db.execute(statement)
+
+
+def _counted(Payment):
+    return Payment.comment.is_(None) | (Payment.comment != REFUND_COMMENT)
+
+
+def _totals(db, Payment, user_ids: Optional[List[int]]):
+    query = db.query(
+        Payment.user_id,
+        func.sum(case((Payment.verified == VERIFIED, Payment.amount), else_=0)),
+        func.sum(case((Payment.verified == VERIFIED, 1), else_=0)),
+        func.sum(case((Payment.verified == PENDING, 1), else_=0)),
+        func.sum(case((Payment.verified == REFUNDED, 1), else_=0)),
+    ).filter(_counted(Payment)).group_by(Payment.user_id)
+    if user_ids is not None:
+        query = query.filter(Payment.user_id.in_(user_ids))
+    return query.all()
+
+
+def _latest_verified(db, user_id: int, exclude=None):
+    """The user's latest verified payment across the live and archived tables."""
+    candidates = []
+    for Payment in _sources(db):
+        query = db.query(Payment.id, Payment.payment_date).filter(
+            Payment.user_id == user_id,
+            Payment.verified == VERIFIED,
+            _counted(Payment),
+        )
+        if exclude is not None:
+            query = query.filter(Payment.id != exclude)
+        candidates.append(
+            query.order_by(Payment.payment_date.desc(), Payment.id.desc()).first()
+        )
+    return max(
+        filter(None, candidates),
+        key=lambda payment: (payment.payment_date, payment.id),
+        default=None,
+    )
+
+
+def _sources(db):
+    sources = [models.Payment]
+    if reference.archived_until(db) is not None:
+        sources.append(models.PaymentArchive)
+    return sources
+
+
+def rebuild(db, user_id: Optional[int] = None) -> int:
+    """
+    Recompute summaries from ``payments`` (all users, or one user).
+
+    Used by ``backfill_missing`` and to repair the table after manual
+    edits; archived payments (repositories.archive) are included. Returns
+    the number of summaries written.
+    """
+    return _rebuild(db, None if user_id is None else [user_id])
+
+
+def _rebuild(db, user_ids: Optional[List[int]]) -> int:
+    sources = _sources(db)
+    totals: Dict[int, List[int]] = {}
+    for Payment in sources:
+        for row_user_id, *values in _totals(db, Payment, user_ids):
+            current = totals.setdefault(row_user_id, [0, 0, 0, 0])
+            for index, value in enumerate(values):
+                current[index] += int(value or 0)
+    summaries = db.query(models.UserPaymentSummary)
+    if user_ids is not None:
+        summaries = summaries.filter(models.UserPaymentSummary.user_id.in_(user_ids))
+    summaries.delete(synchronize_session="fetch")
+
+    written = 0
+    for row_user_id, (total, count, pending, refunded) in totals.items():
+        last = _latest_verified(db, row_user_id)
+        db.add(
+            models.UserPaymentSummary(
+                user_id=row_user_id,
+                total_paid=total,
+                payment_count=count,
+                pending_count=pending,
+                refunded_count=refunded,
+                last_payment_date=last.payment_date if last else None,
+                last_payment_id=last.id if last else None,
+            )
+        )
+        written += 1
+    db.commit()
+    return written
+
+
+def backfill_missing(db) -> int:
+    """
+    Build the summaries of users that have payments but no summary yet.
+
+    Run at startup: on the first run this is every user with payments. Later
+    on a missing summary means the user has nothing counted (see
+    ``empty_summary``), so the request path never has to rebuild.
+    """
+    user_ids = set()
+    for Payment in _sources(db):
+        user_ids.update(
+            user_id
+            for (user_id,) in db.query(Payment.user_id)
+            .filter(
+                _counted(Payment),
+                ~exists().where(models.UserPaymentSummary.user_id == Payment.user_id),
+            )
+            .distinct()
+        )
+    if not user_ids:
+        return 0
+    return _rebuild(db, sorted(user_ids))
+
+
+def has_payments(db, user_id: int) -> bool:
+    """Whether ``user_id`` has any counted payment, whatever its status."""
+    return any(
+        db.query(
+            exists().where(Payment.user_id == user_id, _counted(Payment))
+        ).scalar()
+        for Payment in _sources(db)
+    )
+
+
+def empty_summary(user_id: int) -> models.UserPaymentSummary:
+    """
+    A zero summary, not added to the session.
+
+    Payments are created REJECTED and only get a summary once their status
+    changes, so a user with only unpaid invoices has none; their summary is
+    all zeros.
+    """
+    return models.UserPaymentSummary(
+        user_id=user_id,
+        total_paid=0,
+        payment_count=0,
+        pending_count=0,
+        refunded_count=0,
+    )
@@ -0,0 +1,91 @@
+from typing import Dict
+
+from sqlalchemy import MetaData, Table, inspect, select, text
+
+from .database import Base
+
+
+def ensure_indexes(engine) -> None:
+    """
+    Create indexes declared on the models that are missing from existing
+    tables. ``create_all`` only creates indexes together with new tables.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
+
+def ensure_columns(engine) -> None:
+    """
+    Add nullable columns declared on the models that are missing from
+    existing tables. Run before ``ensure_indexes`` so indexes over new
+    columns can be created.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                        f"{preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+
+
+def copy_database(source, target, batch: int = 10_000) -> Dict[str, int]:
+    """
+    Copy every table of ``source`` into ``target``, created with the
+    current models' layout; returns rows copied per table.
+
+    Column types cannot be changed in place on every backend, so moving a
+    database to the compact layout (repositories.types) is a copy into a
+    new database, run with ``COMPACT_STORAGE=1``. Rows are read through
+    reflected tables, as stored, and converted by the target's types.
+    """
+    Base.metadata.create_all(bind=target)
+    reflected = MetaData()
+    existing = set(inspect(source).get_table_names())
+    copied = {}
+    with source.connect() as reader, target.begin() as writer:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            old = Table(table.name, reflected, autoload_with=source)
+            columns = [old.c[column.name] for column in table.columns if column.name in old.c]
+            rows = reader.execution_options(yield_per=batch).execute(
+                select(*columns).order_by(*old.primary_key.columns)
+            )
+            copied[table.name] = 0
+            for chunk in rows.mappings().partitions():
+                writer.execute(table.insert(), [dict(row) for row in chunk])
+                copied[table.name] += len(chunk)
+    return copied
+
+
+if __name__ == "__main__":
+    # COMPACT_STORAGE=1 DATABASE_URL=<new database> \
+    #     python -m repositories.migrations <current database URL>
+    import sys
+
+    from sqlalchemy import create_engine
+
+    from . import models  # noqa: F401  (registers the tables)
+    from .database import engine
+
+    for name, count in copy_database(create_engine(sys.argv[1]), engine).items():
+        print(f"{name}: {count} rows")
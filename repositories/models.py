@@ -1,3 +1,4 @@
+import datetime
 import enum
 
 from sqlalchemy import (
@@ -6,16 +7,18 @@ from sqlalchemy import (
     Column,
     Date,
     DateTime,
-    Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Table,
+    Text,
+    Time,
 )
-import uuid
-
 from sqlalchemy.orm import relationship
 
 from .database import Base
+from .types import enum_type, new_id, uuid_type
 
 
 class UserType(enum.Enum):
@@ -40,12 +43,20 @@ class User(Base):
     name = Column(String(100), nullable=False)
     surname = Column(String(100), nullable=False)
     phone_number = Column(String(20))
-    account_type = Column(Enum(UserType), nullable=False, default=UserType.GENERAL)
+    account_type = Column(enum_type(UserType), nullable=False, default=UserType.GENERAL)
     card_number = Column(String(16), nullable=False)
     is_active = Column(Boolean, default=True)
-    is_verified = Column(Enum(VerificationStatus), nullable=False, default=VerificationStatus.REJECTED)
-    role = Column(Enum(UserRole), nullable=False, default=UserRole.USER)
+    is_verified = Column(enum_type(VerificationStatus), nullable=False, default=VerificationStatus.REJECTED)
+    role = Column(enum_type(UserRole), nullable=False, default=UserRole.USER)
     veryfication_token = Column(String(100), nullable=True)
+    # Change marker for cached payment reports, which show payer details
+    # (utils.report_cache)
+    updated_at = Column(
+        DateTime,
+        nullable=True,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+    )
     sessions = relationship(
         "Session", back_populates="user", foreign_keys="Session.booked_user_id"
     )
@@ -57,18 +68,55 @@ class User(Base):
 class PaymentCategory(Base):
     __tablename__ = "payment_categories"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    account_type = Column(Enum(UserType), nullable=False)
+    account_type = Column(enum_type(UserType), nullable=False)
+    session_cost = Column(Integer, nullable=False)
+
+
+class Venue(Base):
+    """A pitch with its own time slots and (optionally) its own prices."""
+
+    __tablename__ = "venues"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100), nullable=False)
+    # Comma separated "HH:MM-HH:MM" slots generated every day
+    time_slots = Column(String(255), nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+
+class VenuePrice(Base):
+    """Per-venue session cost; account types without one use PaymentCategory."""
+
+    __tablename__ = "venue_prices"
+    venue_id = Column(Integer, ForeignKey("venues.id"), primary_key=True)
+    account_type = Column(enum_type(UserType), primary_key=True)
     session_cost = Column(Integer, nullable=False)
 
 
 class Session(Base):
     __tablename__ = "sessions"
     id = Column(Integer, primary_key=True, autoincrement=True)
+    # NULL only for rows created before venues (see repositories.venues.ensure_default)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=True)
     session_date = Column(Date, nullable=False)
+    # Display label "HH:MM-HH:MM"; order and compare by start_time
     time_slot = Column(String(20), nullable=False)
+    # NULL only before repositories.schedule.backfill_slot_times
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
     available = Column(Boolean, default=True)
     booked_user_id = Column(Integer, ForeignKey("users.user_id"))
     cost = Column(Integer, nullable=False)
+    # Set while closed by the admin or a day cancellation; expiring holds
+    # and waitlist offers never reopen a closed session
+    closed_at = Column(DateTime, nullable=True)
+    # Watermark column for the incremental rollups (repositories.rollups)
+    updated_at = Column(
+        DateTime,
+        nullable=True,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+    )
     user = relationship(
         "User", back_populates="sessions", foreign_keys=[booked_user_id]
     )
@@ -76,18 +124,281 @@ class Session(Base):
         "Payment", back_populates="session", foreign_keys="Payment.session_id"
     )
 
+    __table_args__ = (
+        # Keyset pagination of a user's bookings, newest first
+        Index("ix_sessions_booked_user_date_id", "booked_user_id", "session_date", "id"),
+        Index("ix_sessions_updated_at", "updated_at"),
+        # Upcoming sessions in start order (booking reminders)
+        Index("ix_sessions_date_start", "session_date", "start_time"),
+        # A venue's days and slots (calendar, day screen, generator)
+        Index("ix_sessions_venue_date_start", "venue_id", "session_date", "start_time"),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(uuid_type(), primary_key=True, default=new_id)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
     payment_date = Column(DateTime, nullable=False)
     amount = Column(Integer, nullable=False)
     shipping_option_id = Column(String(255), nullable=True)
     comment = Column(String(255), nullable=True)
-    verified = Column(Enum(VerificationStatus), nullable=False, default=VerificationStatus.REJECTED)
+    verified = Column(enum_type(VerificationStatus), nullable=False, default=VerificationStatus.REJECTED)
+    # Weekly subscription that booked the session (repositories.subscriptions)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    # Watermark column for the incremental rollups (repositories.rollups)
+    updated_at = Column(
+        DateTime,
+        nullable=True,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+    )
     user = relationship("User", back_populates="payments", foreign_keys=[user_id])
     session = relationship(
         "Session", back_populates="payments", foreign_keys=[session_id]
     )
+
+    __table_args__ = (
+        # Keyset pagination of a user's payments, newest first
+        Index("ix_payments_user_date_id", "user_id", "payment_date", "id"),
+        Index("ix_payments_updated_at", "updated_at"),
+        # Date-range admin reports
+        Index("ix_payments_date", "payment_date"),
+    )
+
+
+def _archive_table(table: Table, name: str, *indexes: Index) -> Table:
+    """Same columns as ``table``, without foreign keys or defaults."""
+    return Table(
+        name,
+        Base.metadata,
+        *(
+            Column(
+                column.name,
+                column.type,
+                primary_key=column.primary_key,
+                nullable=column.nullable,
+                autoincrement=False,
+            )
+            for column in table.columns
+        ),
+        *indexes,
+    )
+
+
+class SessionArchive(Base):
+    """Past sessions moved out of ``sessions`` by repositories.archive."""
+
+    __table__ = _archive_table(
+        Session.__table__,
+        "sessions_archive",
+        Index("ix_sessions_archive_date", "session_date"),
+    )
+
+
+class PaymentArchive(Base):
+    """Payments of archived sessions; same attributes as Payment for reports."""
+
+    __table__ = _archive_table(
+        Payment.__table__,
+        "payments_archive",
+        Index("ix_payments_archive_user_date", "user_id", "payment_date"),
+        Index("ix_payments_archive_date", "payment_date"),
+    )
+    user = relationship(
+        "User",
+        primaryjoin="foreign(PaymentArchive.user_id) == User.user_id",
+        viewonly=True,
+    )
+    session = relationship(
+        "SessionArchive",
+        primaryjoin="foreign(PaymentArchive.session_id) == SessionArchive.id",
+        viewonly=True,
+    )
+
+
+class UserPaymentSummary(Base):
+    """Per-user payment aggregates, maintained by repositories.ledger."""
+
+    __tablename__ = "user_payment_summaries"
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    total_paid = Column(Integer, nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+    pending_count = Column(Integer, nullable=False, default=0)
+    refunded_count = Column(Integer, nullable=False, default=0)
+    last_payment_date = Column(DateTime, nullable=True)
+    last_payment_id = Column(uuid_type(), nullable=True)
+
+
+class DailyRevenue(Base):
+    """Verified revenue and refunds per day and account type."""
+
+    __tablename__ = "daily_revenue"
+    day = Column(Date, primary_key=True)
+    account_type = Column(enum_type(UserType), primary_key=True)
+    revenue = Column(Integer, nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+    refund_amount = Column(Integer, nullable=False, default=0)
+    refund_count = Column(Integer, nullable=False, default=0)
+
+
+class DailyOccupancy(Base):
+    """Booked, open and deactivated sessions per day and time slot."""
+
+    __tablename__ = "daily_occupancy"
+    day = Column(Date, primary_key=True)
+    time_slot = Column(String(20), primary_key=True)
+    booked = Column(Integer, nullable=False, default=0)
+    available = Column(Integer, nullable=False, default=0)
+    inactive = Column(Integer, nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    """
+    Latest ``updated_at`` already folded into a rollup; also the latest
+    archived ``payment_date`` (repositories.archive).
+    """
+
+    __tablename__ = "rollup_watermarks"
+    name = Column(String(50), primary_key=True)
+    value = Column(DateTime, nullable=True)
+
+
+class MediaFile(Base):
+    """Bot API ``file_id`` of an already uploaded file, by content hash."""
+
+    __tablename__ = "media_files"
+    content_hash = Column(String(64), primary_key=True)
+    file_id = Column(String(255), nullable=False)
+    file_name = Column(String(255), nullable=True)
+    size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+
+class BroadcastStatus(enum.Enum):
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+
+
+class DeliveryStatus(enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+
+class Broadcast(Base):
+    """An admin message to a user audience, sent by utils.broadcast."""
+
+    __tablename__ = "broadcasts"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(Text, nullable=False)
+    # "all", "type:<UserType>" or "date:<YYYY-MM-DD>" (users booked that day)
+    audience = Column(String(50), nullable=False)
+    status = Column(enum_type(BroadcastStatus), nullable=False, default=BroadcastStatus.RUNNING)
+    created_by = Column(Integer, nullable=False)
+    # Admin chat message showing the progress
+    progress_chat_id = Column(Integer, nullable=True)
+    progress_message_id = Column(Integer, nullable=True)
+    # Last audience user_id copied into broadcast_recipients (keyset cursor)
+    cursor = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_broadcasts_status", "status"),)
+
+
+class BroadcastRecipient(Base):
+    """Delivery status of one broadcast to one user."""
+
+    __tablename__ = "broadcast_recipients"
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    status = Column(enum_type(DeliveryStatus), nullable=False, default=DeliveryStatus.PENDING)
+    error = Column(String(255), nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Pending recipients of a broadcast, in user_id order (resume)
+        Index("ix_broadcast_recipients_status", "broadcast_id", "status", "user_id"),
+    )
+
+
+class BookingReminder(Base):
+    """Sent-marker of the reminder for one booking (repositories.reminders)."""
+
+    __tablename__ = "booking_reminders"
+    session_id = Column(Integer, ForeignKey("sessions.id"), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    sent_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+
+class WaitlistStatus(enum.Enum):
+    WAITING = "WAITING"
+    OFFERED = "OFFERED"
+    CLAIMED = "CLAIMED"
+    EXPIRED = "EXPIRED"
+    CANCELLED = "CANCELLED"
+
+
+class WaitlistEntry(Base):
+    """A user queued for a booked session (repositories.waitlist)."""
+
+    __tablename__ = "waitlist_entries"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    status = Column(enum_type(WaitlistStatus), nullable=False, default=WaitlistStatus.WAITING)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    offered_at = Column(DateTime, nullable=True)
+    offer_expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Queue order of a session's waitlist
+        Index("ix_waitlist_session_created", "session_id", "created_at"),
+        # Offers whose claim window has passed
+        Index("ix_waitlist_status_expires", "status", "offer_expires_at"),
+    )
+
+
+class SubscriptionStatus(enum.Enum):
+    ACTIVE = "ACTIVE"
+    CANCELLED = "CANCELLED"
+
+
+class Subscription(Base):
+    """A user's recurring weekly booking of one time slot."""
+
+    __tablename__ = "subscriptions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=True)
+    # date.weekday() of the booked sessions, Monday is 0
+    weekday = Column(Integer, nullable=False)
+    time_slot = Column(String(20), nullable=False)
+    status = Column(
+        enum_type(SubscriptionStatus), nullable=False, default=SubscriptionStatus.ACTIVE
+    )
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    # Sessions up to this day have been claimed or skipped
+    claimed_through = Column(Date, nullable=False)
+    booked = Column(Integer, nullable=False, default=0)
+    conflicts = Column(Integer, nullable=False, default=0)
+    last_booked_date = Column(Date, nullable=True)
+    last_conflict_date = Column(Date, nullable=True)
+
+    __table_args__ = (
+        # Active subscriptions per slot, oldest first (conflict order)
+        Index(
+            "ix_subscriptions_status_slot",
+            "status",
+            "venue_id",
+            "weekday",
+            "time_slot",
+            "created_at",
+        ),
+        Index("ix_subscriptions_user", "user_id"),
+    )
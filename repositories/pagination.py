@@ -0,0 +1,114 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are addressed by the key of a boundary row instead of an OFFSET, so
+fetching page N costs the same as fetching page 1 as long as the key
+columns are covered by an index. Totals come from ``CountCache`` which
+refreshes counts periodically instead of running ``COUNT(*)`` per page.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+# Cursor directions carried in callback payloads
+FIRST = 0  # no cursor, start of the listing
+NEXT = 1  # rows strictly after the cursor
+PREV = 2  # rows strictly before the cursor
+AT = 3  # rows from the cursor (inclusive) onwards
+
+
+def _compare(columns, values, greater: bool, inclusive: bool):
+    """Lexicographic (c1, c2, ...) > (v1, v2, ...) spelled out for indexes."""
+    terms = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        step = column > value if greater else column < value
+        terms.append(and_(*equal_prefix, step))
+    if inclusive:
+        terms.append(and_(*(c == v for c, v in zip(columns, values))))
+    return or_(*terms)
+
+
+def key_after(columns: Sequence, key: Sequence[Any]):
+    """Rows whose (columns) tuple sorts strictly after ``key``."""
+    return _compare(columns, key, greater=True, inclusive=False)
+
+
+def key_before_or_at(columns: Sequence, key: Sequence[Any]):
+    """Rows whose (columns) tuple sorts at or before ``key``."""
+    return _compare(columns, key, greater=False, inclusive=True)
+
+
+def keyset_page(
+    query,
+    key_columns: Sequence,
+    cursor: Sequence[Any],
+    direction: int,
+    limit: int,
+    descending: bool = False,
+) -> Tuple[List[Any], bool]:
+    """
+    Fetch one page of ``query`` ordered by ``key_columns``.
+
+    Args:
+        query: Base query, already filtered
+        key_columns: Columns forming a unique, stable sort key
+        cursor: Key values of the boundary row (ignored for FIRST)
+        direction: FIRST, NEXT, PREV or AT
+        limit: Page size
+        descending: Whether the listing is ordered newest/largest first
+
+    Returns:
+        tuple: (rows in display order, whether more rows exist in the
+        direction of travel)
+    """
+    backwards = direction == PREV
+    if direction != FIRST:
+        # "after" in display order means greater for ascending listings
+        greater = descending == backwards
+        query = query.filter(
+            _compare(key_columns, cursor, greater, inclusive=direction == AT)
+        )
+    ascending = descending == backwards
+    query = query.order_by(
+        *(column.asc() if ascending else column.desc() for column in key_columns)
+    )
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    return rows, has_more
+
+
+class CountCache:
+    """Caches expensive ``COUNT(*)`` results for ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._values: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        value = compute()
+        with self._lock:
+            self._values[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key: Hashable = None) -> None:
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+
+counts = CountCache()
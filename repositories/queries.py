@@ -0,0 +1,423 @@
+"""
+Screen-level queries.
+
+Each function loads everything one screen renders in a single round trip,
+with the columns it needs spelled out through ``load_only`` and related
+rows pulled in with ``joinedload``.
+"""
+
+import datetime
+import heapq
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, exists, func
+from sqlalchemy.orm import aliased, contains_eager, joinedload, load_only
+
+from . import models, pagination
+from .reference import reference
+
+
+def session_with_booker(db, session_id: int) -> Optional[models.Session]:
+    """Session with the booking user's name (admin manage_session)."""
+    return (
+        db.query(models.Session)
+        .options(
+            joinedload(models.Session.user).load_only(
+                models.User.user_id, models.User.name, models.User.surname
+            )
+        )
+        .filter(models.Session.id == session_id)
+        .first()
+    )
+
+
+def user_with_summary(
+    db, user_id: int
+) -> Tuple[Optional[models.User], Optional[models.UserPaymentSummary]]:
+    """A user and their payment ledger row (profile screens)."""
+    row = (
+        db.query(models.User, models.UserPaymentSummary)
+        .outerjoin(
+            models.UserPaymentSummary,
+            models.UserPaymentSummary.user_id == models.User.user_id,
+        )
+        .filter(models.User.user_id == user_id)
+        .first()
+    )
+    return (row[0], row[1]) if row else (None, None)
+
+
+def users_page(
+    db, cursor: Sequence[Any], direction: int, limit: int
+) -> Tuple[List[models.User], bool]:
+    """A keyset page of users ordered by user_id (admin view_users)."""
+    query = db.query(models.User).options(
+        load_only(models.User.user_id, models.User.name, models.User.surname)
+    )
+    return pagination.keyset_page(
+        query, (models.User.user_id,), cursor, direction, limit
+    )
+
+
+def user_bookings_page(
+    db, user_id: int, cursor: Sequence[Any], direction: int, limit: int
+) -> Tuple[List[models.Session], bool]:
+    """A keyset page of the sessions booked by a user, newest first."""
+    query = (
+        db.query(models.Session)
+        .options(
+            load_only(
+                models.Session.id,
+                models.Session.session_date,
+                models.Session.time_slot,
+            )
+        )
+        .filter(models.Session.booked_user_id == user_id)
+    )
+    return pagination.keyset_page(
+        query,
+        (models.Session.session_date, models.Session.id),
+        cursor,
+        direction,
+        limit,
+        descending=True,
+    )
+
+
+def user_payments_page(
+    db, user_id: int, cursor: Sequence[Any], direction: int, limit: int
+) -> Tuple[List[models.Payment], bool]:
+    """A keyset page of a user's payments, newest first."""
+    query = (
+        db.query(models.Payment)
+        .options(
+            load_only(
+                models.Payment.id,
+                models.Payment.payment_date,
+                models.Payment.amount,
+                models.Payment.shipping_option_id,
+                models.Payment.verified,
+            )
+        )
+        .filter(models.Payment.user_id == user_id)
+    )
+    return pagination.keyset_page(
+        query,
+        (models.Payment.payment_date, models.Payment.id),
+        cursor,
+        direction,
+        limit,
+        descending=True,
+    )
+
+
+def payment_boundary(
+    db, payment_id: str
+) -> Optional[Tuple[models.User, datetime.datetime]]:
+    """
+    The payer and date of a payments page boundary (admin view_user_payments).
+
+    Page buttons only carry the payment id; its date completes the
+    ``(payment_date, id)`` keyset cursor.
+    """
+    row = (
+        db.query(models.User, models.Payment.payment_date)
+        .join(models.Payment, models.Payment.user_id == models.User.user_id)
+        .filter(models.Payment.id == payment_id)
+        .first()
+    )
+    return (row[0], row[1]) if row else None
+
+
+def payment_with_session(db, payment_id: str) -> Optional[models.Payment]:
+    """Payment with its session (user payment_details)."""
+    return (
+        db.query(models.Payment)
+        .options(
+            joinedload(models.Payment.session).load_only(
+                models.Session.id,
+                models.Session.session_date,
+                models.Session.time_slot,
+            )
+        )
+        .filter(models.Payment.id == payment_id)
+        .first()
+    )
+
+
+@dataclass(frozen=True)
+class DayAvailability:
+    day: datetime.date
+    sessions: int
+    available: int
+    booked: int
+
+
+def day_availability(
+    db, start: datetime.date, end: datetime.date, venue_id: Optional[int] = None
+) -> Tuple[Dict[datetime.date, DayAvailability], bool]:
+    """
+    Per-day session counts on ``start <= day <= end`` of one venue (or
+    all) in one GROUP BY query (calendar pages), and whether later days
+    have sessions.
+    """
+    Session = models.Session
+    days = (end - start).days + 1
+    query = db.query(
+        Session.session_date,
+        func.count(Session.id),
+        func.sum(case((Session.available.is_(True), 1), else_=0)),
+        func.count(Session.booked_user_id),
+    ).filter(Session.session_date >= start)
+    if venue_id is not None:
+        # ix_sessions_venue_date_start
+        query = query.filter(Session.venue_id == venue_id)
+    rows = (
+        query.group_by(Session.session_date)
+        .order_by(Session.session_date)
+        # One row past the page is enough to tell if there is a next page
+        .limit(days + 1)
+        .all()
+    )
+    summary = {
+        day: DayAvailability(day, sessions, int(available or 0), booked)
+        for day, sessions, available, booked in rows
+        if day <= end
+    }
+    return summary, len(summary) < len(rows)
+
+
+def paid_bookings_between(
+    db, start: datetime.date, end: datetime.date
+) -> List[models.Payment]:
+    """
+    Verified payments of the sessions booked on ``start <= day <= end``
+    that have no refund started yet, with session and user (bulk cancel).
+    """
+    Payment, Session, User = models.Payment, models.Session, models.User
+    refund = aliased(Payment)
+    return (
+        db.query(Payment)
+        .join(Payment.session)
+        .join(Payment.user)
+        .options(
+            load_only(Payment.id, Payment.amount, Payment.shipping_option_id),
+            contains_eager(Payment.session).load_only(
+                Session.id, Session.session_date, Session.time_slot
+            ),
+            contains_eager(Payment.user).load_only(
+                User.user_id, User.name, User.surname, User.card_number
+            ),
+        )
+        .filter(
+            Session.session_date >= start,
+            Session.session_date <= end,
+            Session.booked_user_id == Payment.user_id,
+            Payment.verified == models.VerificationStatus.VERIFIED,
+            # Refund invoices are payments by someone else for the same session
+            ~exists().where(
+                refund.session_id == Session.id,
+                refund.user_id != Payment.user_id,
+                refund.payment_date > Payment.payment_date,
+            ),
+        )
+        .order_by(Session.session_date, Session.start_time)
+        .all()
+    )
+
+
+def _user_payment_rows(db, Payment, Session, user_id: int) -> list:
+    return (
+        db.query(Payment)
+        .options(
+            load_only(
+                Payment.id,
+                Payment.payment_date,
+                Payment.amount,
+                Payment.shipping_option_id,
+            ),
+            joinedload(Payment.session).load_only(
+                Session.id,
+                Session.session_date,
+                Session.time_slot,
+            ),
+        )
+        .filter(Payment.user_id == user_id)
+        .order_by(Payment.payment_date)
+        .all()
+    )
+
+
+def user_payment_report_rows(db, user_id: int) -> List[models.Payment]:
+    """A user's payments with their sessions, archived ones included (user payment report)."""
+    rows = _user_payment_rows(db, models.Payment, models.Session, user_id)
+    if reference.archived_until(db) is not None:
+        archived = _user_payment_rows(
+            db, models.PaymentArchive, models.SessionArchive, user_id
+        )
+        rows = sorted(archived + rows, key=lambda payment: payment.payment_date)
+    return rows
+
+
+@dataclass(frozen=True)
+class ReportFilters:
+    """Admin payment report filters; ``end`` is exclusive, empty tuples mean all."""
+
+    start: Optional[datetime.date] = None
+    end: Optional[datetime.date] = None
+    statuses: Tuple[models.VerificationStatus, ...] = ()
+    account_types: Tuple[models.UserType, ...] = ()
+
+
+def payment_report_query(
+    db,
+    filters: ReportFilters = ReportFilters(),
+    after: Optional[Tuple[datetime.datetime, str]] = None,
+    Payment=models.Payment,
+    Session=models.Session,
+):
+    """
+    Payments matching ``filters`` with their session and payer (admin report).
+
+    The date range is applied to ``payment_date`` (ix_payments_date) and
+    the account type through the join to the paying user. ``after`` limits
+    the rows to those sorting after a (payment_date, id) key. Pass
+    PaymentArchive/SessionArchive to query the archive instead.
+    """
+    query = (
+        db.query(Payment)
+        .join(Payment.user)
+        .options(
+            load_only(
+                Payment.id,
+                Payment.payment_date,
+                Payment.amount,
+                Payment.shipping_option_id,
+                Payment.verified,
+            ),
+            contains_eager(Payment.user).load_only(
+                models.User.user_id,
+                models.User.name,
+                models.User.surname,
+                models.User.phone_number,
+                models.User.card_number,
+                models.User.account_type,
+            ),
+            joinedload(Payment.session).load_only(
+                Session.id,
+                Session.session_date,
+                Session.time_slot,
+            ),
+        )
+    )
+    if after is not None:
+        query = query.filter(
+            pagination.key_after((Payment.payment_date, Payment.id), after)
+        )
+    return _filter_report(query, filters, Payment=Payment).order_by(
+        Payment.payment_date, Payment.id
+    )
+
+
+def _reaches_archive(db, filters: ReportFilters) -> bool:
+    archived_until = reference.archived_until(db)
+    return archived_until is not None and (
+        filters.start is None
+        or datetime.datetime.combine(filters.start, datetime.time.min) <= archived_until
+    )
+
+
+def _report_pages(db, filters, after, Payment, Session, size: int) -> Iterator:
+    # Buffered keyset pages: two streaming cursors cannot share a connection
+    while True:
+        page = payment_report_query(db, filters, after, Payment, Session).limit(size).all()
+        yield from page
+        if len(page) < size:
+            return
+        after = (page[-1].payment_date, page[-1].id)
+
+
+def payment_report_stream(
+    db,
+    filters: ReportFilters = ReportFilters(),
+    after: Optional[Tuple[datetime.datetime, str]] = None,
+    fetch_size: int = 2000,
+) -> Iterator:
+    """
+    The rows of ``payment_report_query`` in (payment_date, id) order,
+    merged with the archived payments when the date range reaches the
+    archive (repositories.archive).
+    """
+    if not _reaches_archive(db, filters):
+        return iter(payment_report_query(db, filters, after).yield_per(fetch_size))
+    return heapq.merge(
+        _report_pages(db, filters, after, models.Payment, models.Session, fetch_size),
+        _report_pages(
+            db, filters, after, models.PaymentArchive, models.SessionArchive, fetch_size
+        ),
+        key=lambda payment: (payment.payment_date, payment.id),
+    )
+
+
+def _filter_report(
+    query, filters: ReportFilters, statuses: bool = True, Payment=models.Payment
+):
+    """Apply ``filters`` to a query already joined to the paying user."""
+    if filters.start:
+        query = query.filter(
+            Payment.payment_date
+            >= datetime.datetime.combine(filters.start, datetime.time.min)
+        )
+    if filters.end:
+        query = query.filter(
+            Payment.payment_date
+            < datetime.datetime.combine(filters.end, datetime.time.min)
+        )
+    if statuses and filters.statuses:
+        query = query.filter(Payment.verified.in_(filters.statuses))
+    if filters.account_types:
+        query = query.filter(models.User.account_type.in_(filters.account_types))
+    return query
+
+
+def report_watermarks(
+    db,
+) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """
+    Latest ``Payment.updated_at`` and ``User.updated_at`` in one round
+    trip; they change whenever any payment or payer's details do.
+    """
+    return db.query(
+        func.max(models.Payment.updated_at),
+        db.query(func.max(models.User.updated_at)).scalar_subquery(),
+    ).one()
+
+
+def payment_report_changed_before(
+    db,
+    filters: ReportFilters,
+    since: datetime.datetime,
+    last_key: Tuple[datetime.datetime, str],
+) -> bool:
+    """
+    Whether a payment in the report's range and account types, at or
+    before ``last_key`` (payment_date, id), changed after ``since``. Status
+    is ignored on purpose: rows leaving the status filter count as changes.
+    """
+    query = (
+        db.query(models.Payment.id)
+        .join(models.Payment.user)
+        .filter(
+            models.Payment.updated_at > since,
+            pagination.key_before_or_at(
+                (models.Payment.payment_date, models.Payment.id), last_key
+            ),
+        )
+    )
+    return _filter_report(query, filters, statuses=False).first() is not None
+
+
+def payment_report_rows(db, filters: ReportFilters = ReportFilters()) -> List[models.Payment]:
+    """Every payment matching ``filters``, archived ones included (admin report)."""
+    return list(payment_report_stream(db, filters))
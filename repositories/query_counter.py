@@ -0,0 +1,50 @@
+"""
+Count the SQL statements issued inside a block, to keep screens from
+regressing into N+1 query patterns:
+
+    with assert_max_queries(2):
+        admin_flow.view_user_bookings(call, db)
+"""
+
+from contextlib import contextmanager
+from typing import List
+
+from sqlalchemy import event
+
+from .database import engine
+
+
+class QueryCount:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(bind=engine):
+    """Record every statement executed on ``bind`` while the block runs."""
+    counter = QueryCount()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        counter.statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit: int, bind=engine):
+    """Fail with the offending statements if the block runs more than ``limit``."""
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > limit:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(
+            f"Expected at most {limit} queries, got {counter.count}:\n{statements}"
+        )
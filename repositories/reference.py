@@ -0,0 +1,122 @@
+"""
+Process-wide cache of rarely changing reference rows.
+
+Session prices per account type (and per venue), the venues and the
+admin's card number are read on every booking and payment but only
+change from the admin panel, which calls ``invalidate`` after committing.
+The archive boundary (repositories.archive) tells reports whether they
+have to read the archive tables too.
+"""
+
+import datetime
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from . import models
+
+# rollup_watermarks row holding the latest archived payment_date
+ARCHIVE_WATERMARK = "archived_payments"
+
+
+@dataclass(frozen=True)
+class VenueInfo:
+    id: int
+    name: str
+    time_slots: Tuple[str, ...]
+    active: bool
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    costs: Dict[models.UserType, int]
+    venue_costs: Dict[Tuple[int, models.UserType], int]
+    venues: Dict[int, VenueInfo]
+    admin_card_number: Optional[str]
+    archived_until: Optional[datetime.datetime]
+
+
+class ReferenceData:
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def load(self, db) -> _Snapshot:
+        costs = {
+            category.account_type: int(category.session_cost)
+            for category in db.query(models.PaymentCategory).all()
+        }
+        venue_costs = {
+            (price.venue_id, price.account_type): int(price.session_cost)
+            for price in db.query(models.VenuePrice).all()
+        }
+        venues = {
+            venue.id: VenueInfo(
+                id=venue.id,
+                name=venue.name,
+                time_slots=tuple(
+                    slot.strip() for slot in venue.time_slots.split(",") if slot.strip()
+                ),
+                active=bool(venue.active),
+            )
+            for venue in db.query(models.Venue).order_by(models.Venue.id).all()
+        }
+        admin = (
+            db.query(models.User.card_number)
+            .filter_by(role=models.UserRole.ADMIN)
+            .first()
+        )
+        archived_until = (
+            db.query(models.RollupWatermark.value)
+            .filter_by(name=ARCHIVE_WATERMARK)
+            .scalar()
+        )
+        snapshot = _Snapshot(
+            costs=costs,
+            venue_costs=venue_costs,
+            venues=venues,
+            admin_card_number=admin.card_number if admin else None,
+            archived_until=archived_until,
+        )
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _current(self, db) -> _Snapshot:
+        # Read once: a concurrent invalidate() may clear the attribute
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None else self.load(db)
+
+    def session_cost(
+        self, db, account_type: models.UserType, venue_id: Optional[int] = None
+    ) -> Optional[int]:
+        snapshot = self._current(db)
+        cost = snapshot.venue_costs.get((venue_id, account_type))
+        return cost if cost is not None else snapshot.costs.get(account_type)
+
+    def venues(self, db, active_only: bool = True) -> List[VenueInfo]:
+        return [
+            venue
+            for venue in self._current(db).venues.values()
+            if venue.active or not active_only
+        ]
+
+    def venue(self, db, venue_id: Optional[int]) -> Optional[VenueInfo]:
+        return self._current(db).venues.get(venue_id)
+
+    def admin_card_number(self, db) -> Optional[str]:
+        snapshot = self._current(db)
+        if snapshot.admin_card_number is None:
+            snapshot = self.load(db)
+        return snapshot.admin_card_number
+
+    def archived_until(self, db) -> Optional[datetime.datetime]:
+        """Latest archived payment_date; None while the archive is empty."""
+        return self._current(db).archived_until
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+reference = ReferenceData()
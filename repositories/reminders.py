@@ -0,0 +1,109 @@
+"""
+Booking reminders.
+
+``due_bookings`` finds, in one query over ``ix_sessions_date_start``, the
+paid bookings that start within the lead time and have no entry in
+``booking_reminders`` yet; ``claim`` writes those entries (the sent-marker)
+before the reminders are queued, so each booking is reminded once even if
+several ticks or processes overlap.
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import List
+
+from sqlalchemy import and_, exists, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from . import models
+
+
+@dataclass(frozen=True)
+class DueBooking:
+    session_id: int
+    user_id: int
+    session_date: datetime.date
+    time_slot: str
+
+
+def _starting_between(start: datetime.datetime, end: datetime.datetime):
+    """Sessions whose start time is in ``[start, end]`` (ix_sessions_date_start)."""
+    Session = models.Session
+    days = []
+    day = start.date()
+    while day <= end.date():
+        conditions = [Session.session_date == day]
+        if day == start.date():
+            conditions.append(Session.start_time >= start.time())
+        if day == end.date():
+            conditions.append(Session.start_time <= end.time())
+        days.append(and_(*conditions))
+        day += datetime.timedelta(days=1)
+    return or_(*days)
+
+
+def due_bookings(
+    db, now: datetime.datetime, lead: datetime.timedelta
+) -> List[DueBooking]:
+    Session, Payment = models.Session, models.Payment
+    refund = aliased(Payment)
+    rows = (
+        db.query(Session.id, Session.booked_user_id, Session.session_date, Session.time_slot)
+        .join(
+            Payment,
+            and_(
+                Payment.session_id == Session.id,
+                Payment.user_id == Session.booked_user_id,
+                Payment.verified == models.VerificationStatus.VERIFIED,
+            ),
+        )
+        .filter(
+            _starting_between(now, now + lead),
+            # Cancelled bookings waiting for their refund
+            ~exists().where(
+                refund.session_id == Session.id,
+                refund.user_id != Session.booked_user_id,
+                refund.payment_date > Payment.payment_date,
+            ),
+            ~exists().where(
+                models.BookingReminder.session_id == Session.id,
+                models.BookingReminder.user_id == Session.booked_user_id,
+            ),
+        )
+        .order_by(Session.session_date, Session.start_time)
+        .all()
+    )
+    return [DueBooking(*row) for row in rows]
+
+
+def claim(db, bookings: List[DueBooking]) -> List[DueBooking]:
+    """Mark ``bookings`` as reminded; returns the ones this call marked."""
+    if not bookings:
+        return []
+    try:
+        db.execute(
+            insert(models.BookingReminder),
+            [
+                {"session_id": booking.session_id, "user_id": booking.user_id}
+                for booking in bookings
+            ],
+        )
+        db.commit()
+        return bookings
+    except IntegrityError:
+        # Another tick got some of them first; fall back to one by one
+        db.rollback()
+    claimed = []
+    for booking in bookings:
+        db.add(
+            models.BookingReminder(
+                session_id=booking.session_id, user_id=booking.user_id
+            )
+        )
+        try:
+            db.commit()
+            claimed.append(booking)
+        except IntegrityError:
+            db.rollback()
+    return claimed
@@ -0,0 +1,260 @@
+"""
+Incremental daily rollups for admin reporting.
+
+``daily_revenue`` holds verified revenue and refunds per day and account
+type, ``daily_occupancy`` booked/open/deactivated sessions per day and
+time slot. ``refresh`` finds the days touched by payments and sessions
+changed since the stored watermark (``updated_at``), recomputes just those
+days from the base tables and advances the watermark, so period views read
+a few hundred rollup rows instead of scanning every payment.
+"""
+
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import Date, and_, case, func
+
+from . import models
+from .database import SessionLocal
+from .reference import reference
+
+WATERMARK = "daily_rollups"
+# Re-scan a little behind the watermark so rows committed late by a
+# concurrent transaction with an older updated_at are not missed.
+OVERLAP = datetime.timedelta(minutes=5)
+# Days recomputed per statement
+BATCH_DAYS = 62
+
+VERIFIED = models.VerificationStatus.VERIFIED
+REFUNDED = models.VerificationStatus.REFUNDED
+
+_refresh_lock = threading.Lock()
+
+
+def _day(column):
+    return func.date(column, type_=Date)
+
+
+def _changed_days(db, column, day_column, since: Optional[datetime.datetime]) -> Set[datetime.date]:
+    query = db.query(day_column).distinct()
+    if since is not None:
+        query = query.filter(column > since)
+    return {day for (day,) in query if day is not None}
+
+
+def _batches(days: Iterable[datetime.date]) -> List[List[datetime.date]]:
+    ordered = sorted(days)
+    return [ordered[i : i + BATCH_DAYS] for i in range(0, len(ordered), BATCH_DAYS)]
+
+
+def _revenue_rows(db, Payment, start: datetime.datetime, end: datetime.datetime):
+    day = _day(Payment.payment_date)
+    return (
+        db.query(
+            day,
+            models.User.account_type,
+            func.sum(case((Payment.verified == VERIFIED, Payment.amount), else_=0)),
+            func.sum(case((Payment.verified == VERIFIED, 1), else_=0)),
+            func.sum(case((Payment.verified == REFUNDED, Payment.amount), else_=0)),
+            func.sum(case((Payment.verified == REFUNDED, 1), else_=0)),
+        )
+        .join(models.User, models.User.user_id == Payment.user_id)
+        # Refund invoices are paid by the admin; they are not revenue
+        .filter(
+            models.User.role != models.UserRole.ADMIN,
+            Payment.payment_date >= start,
+            Payment.payment_date < end,
+        )
+        .group_by(day, models.User.account_type)
+        .all()
+    )
+
+
+def _recompute_revenue(db, days: List[datetime.date]) -> None:
+    start = datetime.datetime.combine(days[0], datetime.time.min)
+    end = datetime.datetime.combine(days[-1] + datetime.timedelta(days=1), datetime.time.min)
+    rows = _revenue_rows(db, models.Payment, start, end)
+    # Days reaching into the archive (repositories.archive) add its payments
+    archived_until = reference.archived_until(db)
+    if archived_until is not None and start <= archived_until:
+        rows += _revenue_rows(db, models.PaymentArchive, start, end)
+    totals: Dict[tuple, List[int]] = {}
+    for row_day, account_type, *values in rows:
+        current = totals.setdefault((row_day, account_type), [0, 0, 0, 0])
+        for index, value in enumerate(values):
+            current[index] += int(value or 0)
+    db.query(models.DailyRevenue).filter(models.DailyRevenue.day.in_(days)).delete(
+        synchronize_session=False
+    )
+    wanted = set(days)
+    db.add_all(
+        models.DailyRevenue(
+            day=row_day,
+            account_type=account_type,
+            revenue=revenue,
+            payment_count=count,
+            refund_amount=refund_amount,
+            refund_count=refund_count,
+        )
+        for (row_day, account_type), (revenue, count, refund_amount, refund_count) in totals.items()
+        if row_day in wanted
+    )
+
+
+def _recompute_occupancy(db, days: List[datetime.date]) -> None:
+    Session = models.Session
+    booked = Session.booked_user_id.isnot(None)
+    rows = (
+        db.query(
+            Session.session_date,
+            Session.time_slot,
+            func.sum(case((booked, 1), else_=0)),
+            func.sum(case((and_(~booked, Session.available.is_(True)), 1), else_=0)),
+            func.sum(case((and_(~booked, Session.available.isnot(True)), 1), else_=0)),
+        )
+        .filter(Session.session_date.in_(days))
+        .group_by(Session.session_date, Session.time_slot)
+        .all()
+    )
+    db.query(models.DailyOccupancy).filter(
+        models.DailyOccupancy.day.in_(days)
+    ).delete(synchronize_session=False)
+    db.add_all(
+        models.DailyOccupancy(
+            day=row_day,
+            time_slot=time_slot,
+            booked=int(booked_count or 0),
+            available=int(available or 0),
+            inactive=int(inactive or 0),
+        )
+        for row_day, time_slot, booked_count, available, inactive in rows
+    )
+
+
+def refresh(db) -> int:
+    """Fold rows changed since the watermark into the rollups; returns days updated."""
+    with _refresh_lock:
+        watermark = db.get(models.RollupWatermark, WATERMARK)
+        since = watermark.value - OVERLAP if watermark and watermark.value else None
+        high = max(
+            (
+                value
+                for value in (
+                    db.query(func.max(models.Payment.updated_at)).scalar(),
+                    db.query(func.max(models.Session.updated_at)).scalar(),
+                )
+                if value is not None
+            ),
+            default=None,
+        )
+
+        revenue_days = _changed_days(
+            db, models.Payment.updated_at, _day(models.Payment.payment_date), since
+        )
+        occupancy_days = _changed_days(
+            db, models.Session.updated_at, models.Session.session_date, since
+        )
+        for batch in _batches(revenue_days):
+            _recompute_revenue(db, batch)
+        for batch in _batches(occupancy_days):
+            _recompute_occupancy(db, batch)
+
+        if watermark is None:
+            watermark = models.RollupWatermark(name=WATERMARK)
+            db.add(watermark)
+        if high is not None:
+            watermark.value = high
+        db.commit()
+        return len(revenue_days | occupancy_days)
+
+
+def period_summary(db, start: datetime.date, end: datetime.date) -> Dict[str, dict]:
+    """Totals for ``start <= day < end``, read from the rollups only."""
+    revenue = {
+        account_type: {
+            "revenue": int(total or 0),
+            "payments": int(count or 0),
+            "refunds": int(refunds or 0),
+            "refund_count": int(refund_count or 0),
+        }
+        for account_type, total, count, refunds, refund_count in db.query(
+            models.DailyRevenue.account_type,
+            func.sum(models.DailyRevenue.revenue),
+            func.sum(models.DailyRevenue.payment_count),
+            func.sum(models.DailyRevenue.refund_amount),
+            func.sum(models.DailyRevenue.refund_count),
+        )
+        .filter(models.DailyRevenue.day >= start, models.DailyRevenue.day < end)
+        .group_by(models.DailyRevenue.account_type)
+    }
+    occupancy = {
+        time_slot: {
+            "booked": int(booked or 0),
+            "available": int(available or 0),
+            "inactive": int(inactive or 0),
+        }
+        for time_slot, booked, available, inactive in db.query(
+            models.DailyOccupancy.time_slot,
+            func.sum(models.DailyOccupancy.booked),
+            func.sum(models.DailyOccupancy.available),
+            func.sum(models.DailyOccupancy.inactive),
+        )
+        .filter(models.DailyOccupancy.day >= start, models.DailyOccupancy.day < end)
+        .group_by(models.DailyOccupancy.time_slot)
+    }
+    return {"revenue": revenue, "occupancy": occupancy}
+
+
+def daily_rows(db, start: datetime.date, end: datetime.date) -> List[dict]:
+    """One row per day for ``start <= day < end`` (rollup export)."""
+    days: Dict[datetime.date, dict] = {}
+
+    def row(day):
+        return days.setdefault(
+            day,
+            {
+                "day": day,
+                "revenue": {},
+                "refunds": 0,
+                "booked": 0,
+                "available": 0,
+                "inactive": 0,
+            },
+        )
+
+    for item in (
+        db.query(models.DailyRevenue)
+        .filter(models.DailyRevenue.day >= start, models.DailyRevenue.day < end)
+    ):
+        current = row(item.day)
+        current["revenue"][item.account_type] = item.revenue
+        current["refunds"] += item.refund_amount
+    for item in (
+        db.query(models.DailyOccupancy)
+        .filter(models.DailyOccupancy.day >= start, models.DailyOccupancy.day < end)
+    ):
+        current = row(item.day)
+        current["booked"] += item.booked
+        current["available"] += item.available
+        current["inactive"] += item.inactive
+    return [days[day] for day in sorted(days)]
+
+
+def start_refresher(interval: float) -> threading.Event:
+    """Refresh the rollups every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            db = SessionLocal()
+            try:
+                refresh(db)
+            except Exception as e:
+                db.rollback()
+                print(f"Error refreshing rollups: {e}")
+            finally:
+                db.close()
+
+    threading.Thread(target=run, name="rollups", daemon=True).start()
+    return stopped
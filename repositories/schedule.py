@@ -0,0 +1,108 @@
+"""
+Session generator.
+
+Keeps a rolling window of bookable sessions: every day up to
+``HORIZON_DAYS`` ahead gets one session per time slot of each active
+venue, priced with the venue's GENERAL cost. Used by the admin's
+"generate sessions" button and by the daily job that also claims the new
+sessions for weekly subscriptions (utils.recurring).
+"""
+
+import datetime
+from typing import Optional, Tuple
+
+from . import models
+from .reference import reference
+
+HORIZON_DAYS = 30
+
+
+def horizon(today: Optional[datetime.date] = None) -> datetime.date:
+    return (today or datetime.date.today()) + datetime.timedelta(days=HORIZON_DAYS)
+
+
+def slot_times(time_slot: str) -> Tuple[datetime.time, datetime.time]:
+    """Start and end of a "HH:MM-HH:MM" slot label."""
+    start, end = time_slot.split("-")
+    return (
+        datetime.datetime.strptime(start.strip(), "%H:%M").time(),
+        datetime.datetime.strptime(end.strip(), "%H:%M").time(),
+    )
+
+
+def backfill_slot_times(db) -> int:
+    """
+    Fill start_time/end_time of sessions created before the columns
+    existed, one UPDATE per distinct slot label; returns rows updated.
+    """
+    Session = models.Session
+    labels = [
+        label
+        for (label,) in db.query(Session.time_slot)
+        .filter(Session.start_time.is_(None))
+        .distinct()
+    ]
+    updated = 0
+    for label in labels:
+        try:
+            start, end = slot_times(label)
+        except ValueError:
+            print(f"Skipping session time slot {label!r}: not HH:MM-HH:MM")
+            continue
+        updated += (
+            db.query(Session)
+            .filter(Session.time_slot == label, Session.start_time.is_(None))
+            .update(
+                {Session.start_time: start, Session.end_time: end},
+                synchronize_session=False,
+            )
+        )
+    db.commit()
+    return updated
+
+
+def generate_sessions(
+    db, start: datetime.date, end: datetime.date
+) -> Optional[int]:
+    """
+    Create the missing sessions on ``start <= day <= end``; returns how
+    many were created, or None without a base (GENERAL) session cost.
+    """
+    if reference.session_cost(db, models.UserType.GENERAL) is None:
+        return None
+    venues = reference.venues(db)
+    if not venues:
+        return 0
+    existing = set(
+        db.query(
+            models.Session.venue_id, models.Session.session_date, models.Session.start_time
+        ).filter(
+            models.Session.venue_id.in_([venue.id for venue in venues]),
+            models.Session.session_date >= start,
+            models.Session.session_date <= end,
+        )
+    )
+    sessions_to_add = []
+    for venue in venues:
+        base_cost = reference.session_cost(db, models.UserType.GENERAL, venue.id)
+        slots = [(time_slot, *slot_times(time_slot)) for time_slot in venue.time_slots]
+        day = start
+        while day <= end:
+            for time_slot, start_time, end_time in slots:
+                if (venue.id, day, start_time) not in existing:
+                    sessions_to_add.append(
+                        {
+                            "venue_id": venue.id,
+                            "session_date": day,
+                            "time_slot": time_slot,
+                            "start_time": start_time,
+                            "end_time": end_time,
+                            "available": True,
+                            "cost": base_cost,
+                        }
+                    )
+            day += datetime.timedelta(days=1)
+    if sessions_to_add:
+        db.bulk_insert_mappings(models.Session, sessions_to_add)
+        db.commit()
+    return len(sessions_to_add)
@@ -0,0 +1,287 @@
+"""
+Recurring weekly bookings.
+
+A subscription books one venue's weekday and time slot every week.
+``claim_sessions`` books, in bulk, the sessions each active subscription
+has not considered yet (``claimed_through`` is its watermark): sessions
+are matched to subscriptions in Python, booked with one conditional
+UPDATE statement and their payments inserted with one INSERT. When
+several subscriptions want the same session the oldest one gets it; the
+others, and subscriptions whose session was already booked or
+deactivated, record a conflict.
+"""
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, update
+
+from . import models
+from .reference import reference
+from .types import new_id
+
+ACTIVE = models.SubscriptionStatus.ACTIVE
+
+
+@dataclass(frozen=True)
+class Claim:
+    subscription_id: int
+    payment_id: str
+    user_id: int
+    session_id: int
+    session_date: datetime.date
+    time_slot: str
+    amount: int
+
+
+@dataclass(frozen=True)
+class Conflict:
+    subscription_id: int
+    user_id: int
+    session_date: datetime.date
+    time_slot: str
+
+
+@dataclass
+class ClaimResult:
+    claims: List[Claim] = field(default_factory=list)
+    conflicts: List[Conflict] = field(default_factory=list)
+
+
+def subscribe(
+    db,
+    user_id: int,
+    venue_id: int,
+    weekday: int,
+    time_slot: str,
+    first_day: datetime.date,
+) -> Tuple[models.Subscription, bool]:
+    """
+    Subscribe ``user_id`` to the slot from ``first_day`` on; returns the
+    subscription and whether it was created (False if already active).
+    """
+    subscription = (
+        db.query(models.Subscription)
+        .filter_by(
+            user_id=user_id,
+            venue_id=venue_id,
+            weekday=weekday,
+            time_slot=time_slot,
+            status=ACTIVE,
+        )
+        .first()
+    )
+    if subscription is not None:
+        return subscription, False
+    subscription = models.Subscription(
+        user_id=user_id,
+        venue_id=venue_id,
+        weekday=weekday,
+        time_slot=time_slot,
+        claimed_through=first_day - datetime.timedelta(days=1),
+    )
+    db.add(subscription)
+    db.commit()
+    return subscription, True
+
+
+def cancel(db, subscription_id: int, user_id: int) -> bool:
+    cancelled = (
+        db.query(models.Subscription)
+        .filter_by(id=subscription_id, user_id=user_id, status=ACTIVE)
+        .update(
+            {models.Subscription.status: models.SubscriptionStatus.CANCELLED},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return bool(cancelled)
+
+
+def for_user(db, user_id: int) -> List[models.Subscription]:
+    return (
+        db.query(models.Subscription)
+        .filter_by(user_id=user_id, status=ACTIVE)
+        .order_by(
+            models.Subscription.venue_id,
+            models.Subscription.weekday,
+            models.Subscription.time_slot,
+        )
+        .all()
+    )
+
+
+def _cost(db, account_type, is_verified, session) -> int:
+    # Same pricing as a one-off booking (UserFlow._reserve_and_invoice)
+    if is_verified == models.VerificationStatus.VERIFIED:
+        return reference.session_cost(db, account_type, session.venue_id)
+    return int(session.cost)
+
+
+def claim_sessions(
+    db,
+    through: datetime.date,
+    subscription_ids: Optional[Iterable[int]] = None,
+    today: Optional[datetime.date] = None,
+) -> ClaimResult:
+    """
+    Book the sessions up to ``through`` (at most the last generated day)
+    for the active subscriptions, or just ``subscription_ids``, and
+    advance their watermarks.
+    """
+    Session, Subscription = models.Session, models.Subscription
+    today = today or datetime.date.today()
+    # Days not generated yet are left for a later run
+    generated = db.query(func.max(Session.session_date)).scalar()
+    if generated is None:
+        return ClaimResult()
+    through = min(through, generated)
+    query = (
+        db.query(Subscription, models.User.account_type, models.User.is_verified)
+        .join(models.User, models.User.user_id == Subscription.user_id)
+        .filter(Subscription.status == ACTIVE, Subscription.claimed_through < through)
+    )
+    if subscription_ids is not None:
+        query = query.filter(Subscription.id.in_(list(subscription_ids)))
+    rows = query.order_by(Subscription.created_at, Subscription.id).all()
+    if not rows:
+        return ClaimResult()
+
+    wanted = defaultdict(list)
+    for subscription, account_type, is_verified in rows:
+        key = (subscription.venue_id, subscription.weekday, subscription.time_slot)
+        wanted[key].append(
+            (subscription, account_type, is_verified)
+        )
+    start = max(today, min(row[0].claimed_through for row in rows) + datetime.timedelta(days=1))
+    sessions = (
+        db.query(
+            Session.id,
+            Session.venue_id,
+            Session.session_date,
+            Session.time_slot,
+            Session.available,
+            Session.booked_user_id,
+            Session.cost,
+        )
+        .filter(
+            Session.session_date >= start,
+            Session.session_date <= through,
+            Session.venue_id.in_({venue_id for venue_id, _, _ in wanted}),
+            Session.time_slot.in_({slot for _, _, slot in wanted}),
+        )
+        .order_by(Session.session_date, Session.start_time)
+        .all()
+    )
+
+    result = ClaimResult()
+    winners = {}
+    for session in sessions:
+        candidates = [
+            candidate
+            for candidate in wanted.get(
+                (session.venue_id, session.session_date.weekday(), session.time_slot), ()
+            )
+            if candidate[0].claimed_through < session.session_date
+        ]
+        if not candidates:
+            continue
+        if session.available and session.booked_user_id is None:
+            winners[session.id] = (session, candidates[0])
+            candidates = candidates[1:]
+        for subscription, _, _ in candidates:
+            if subscription.user_id != session.booked_user_id:
+                result.conflicts.append(
+                    Conflict(
+                        subscription.id,
+                        subscription.user_id,
+                        session.session_date,
+                        session.time_slot,
+                    )
+                )
+
+    now = datetime.datetime.now()
+    if winners:
+        # Only sessions still free are taken; a concurrent booking wins
+        table = Session.__table__
+        db.execute(
+            update(table)
+            .where(
+                table.c.id == bindparam("b_id"),
+                table.c.available.is_(True),
+                table.c.booked_user_id.is_(None),
+            )
+            .values(available=False, booked_user_id=bindparam("b_user"), updated_at=now),
+            [
+                {"b_id": session_id, "b_user": candidate[0].user_id}
+                for session_id, (_, candidate) in winners.items()
+            ],
+        )
+        booked = dict(
+            db.query(Session.id, Session.booked_user_id).filter(
+                Session.id.in_(list(winners))
+            )
+        )
+        payments = []
+        for session_id, (session, (subscription, account_type, is_verified)) in winners.items():
+            if booked.get(session_id) != subscription.user_id:
+                result.conflicts.append(
+                    Conflict(
+                        subscription.id,
+                        subscription.user_id,
+                        session.session_date,
+                        session.time_slot,
+                    )
+                )
+                continue
+            claim = Claim(
+                subscription_id=subscription.id,
+                payment_id=new_id(),
+                user_id=subscription.user_id,
+                session_id=session_id,
+                session_date=session.session_date,
+                time_slot=session.time_slot,
+                amount=_cost(db, account_type, is_verified, session),
+            )
+            result.claims.append(claim)
+            payments.append(
+                {
+                    "id": claim.payment_id,
+                    "user_id": claim.user_id,
+                    "session_id": claim.session_id,
+                    "subscription_id": claim.subscription_id,
+                    "amount": claim.amount,
+                    "payment_date": now,
+                }
+            )
+        if payments:
+            db.execute(insert(models.Payment), payments)
+
+    changes = {
+        subscription.id: {
+            "id": subscription.id,
+            "claimed_through": max(subscription.claimed_through, through),
+            "booked": subscription.booked,
+            "conflicts": subscription.conflicts,
+            "last_booked_date": subscription.last_booked_date,
+            "last_conflict_date": subscription.last_conflict_date,
+        }
+        for subscription, _, _ in rows
+    }
+    for claim in result.claims:
+        change = changes[claim.subscription_id]
+        change["booked"] += 1
+        change["last_booked_date"] = max(
+            filter(None, (change["last_booked_date"], claim.session_date))
+        )
+    for conflict in result.conflicts:
+        change = changes[conflict.subscription_id]
+        change["conflicts"] += 1
+        change["last_conflict_date"] = max(
+            filter(None, (change["last_conflict_date"], conflict.session_date))
+        )
+    db.execute(update(Subscription), list(changes.values()))
+    db.commit()
+    return result
@@ -0,0 +1,64 @@
+"""
+Venues (pitches).
+
+Every session belongs to a venue. ``ensure_default`` migrates a
+single-pitch database: it creates the first venue from the global
+``TIMESLOTS`` and assigns it the sessions and subscriptions created
+before venues existed.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from constant.general import TIMESLOTS
+
+from . import models
+from .reference import reference
+
+# Translate: "Pitch 1"
+DEFAULT_NAME = "زمین ۱"
+
+
+def ensure_default(db) -> int:
+    """Create the first venue if needed and backfill venue_id; returns rows updated."""
+    venue_id = db.query(models.Venue.id).order_by(models.Venue.id).limit(1).scalar()
+    if venue_id is None:
+        venue = models.Venue(name=DEFAULT_NAME, time_slots=",".join(TIMESLOTS))
+        db.add(venue)
+        db.flush()
+        venue_id = venue.id
+    updated = 0
+    for model in (models.Session, models.Subscription):
+        updated += (
+            db.query(model)
+            .filter(model.venue_id.is_(None))
+            .update({model.venue_id: venue_id}, synchronize_session=False)
+        )
+    db.commit()
+    reference.invalidate()
+    return updated
+
+
+def create(
+    db,
+    name: str,
+    time_slots: Iterable[str],
+    prices: Optional[Dict[models.UserType, int]] = None,
+) -> models.Venue:
+    venue = models.Venue(name=name, time_slots=",".join(time_slots))
+    db.add(venue)
+    db.flush()
+    db.add_all(
+        models.VenuePrice(venue_id=venue.id, account_type=account_type, session_cost=cost)
+        for account_type, cost in (prices or {}).items()
+    )
+    db.commit()
+    reference.invalidate()
+    return venue
+
+
+def set_active(db, venue_id: int, active: bool) -> None:
+    db.query(models.Venue).filter_by(id=venue_id).update(
+        {models.Venue.active: active}, synchronize_session=False
+    )
+    db.commit()
+    reference.invalidate()
@@ -0,0 +1,299 @@
+"""
+Per-session waitlist.
+
+Users queue for a booked session. When the session is released (refund,
+admin re-activation, an unpaid hold or a claim window expiring) the
+first waiting user is offered it: the entry moves WAITING -> OFFERED with
+a conditional UPDATE and the session stays unavailable to everyone else
+until the offer is claimed or expires, when it passes to the next user.
+"""
+
+import datetime
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import case, exists, func
+
+from . import models
+
+WAITING = models.WaitlistStatus.WAITING
+OFFERED = models.WaitlistStatus.OFFERED
+ACTIVE = (WAITING, OFFERED)
+# Payment statuses that keep a booking (anything else is an unpaid hold)
+PAYING = (models.VerificationStatus.PENDING, models.VerificationStatus.VERIFIED)
+
+
+def claim_window() -> datetime.timedelta:
+    return datetime.timedelta(minutes=float(os.getenv("WAITLIST_CLAIM_MINUTES", 10)))
+
+
+def booking_hold() -> datetime.timedelta:
+    """How long an unpaid booking holds its session (0 keeps it forever)."""
+    return datetime.timedelta(minutes=float(os.getenv("BOOKING_HOLD_MINUTES", 15)))
+
+
+def subscription_hold() -> datetime.timedelta:
+    """How long a session booked by a weekly subscription waits for payment."""
+    return datetime.timedelta(hours=float(os.getenv("SUBSCRIPTION_HOLD_HOURS", 24)))
+
+
+@dataclass(frozen=True)
+class Offer:
+    entry_id: int
+    user_id: int
+    session_date: datetime.date
+    time_slot: str
+    expires_at: datetime.datetime
+
+
+def _entries(db, session_id: int):
+    return db.query(models.WaitlistEntry).filter(
+        models.WaitlistEntry.session_id == session_id
+    )
+
+
+def join(db, session_id: int, user_id: int) -> int:
+    """Queue ``user_id`` for the session (once); returns their position."""
+    entry = (
+        _entries(db, session_id)
+        .filter(
+            models.WaitlistEntry.user_id == user_id,
+            models.WaitlistEntry.status.in_(ACTIVE),
+        )
+        .first()
+    )
+    if entry is None:
+        entry = models.WaitlistEntry(session_id=session_id, user_id=user_id)
+        db.add(entry)
+        db.commit()
+    return (
+        _entries(db, session_id)
+        .filter(
+            models.WaitlistEntry.status.in_(ACTIVE),
+            models.WaitlistEntry.id <= entry.id,
+        )
+        .count()
+    )
+
+
+def release(db, session_id: int, open_if_empty: bool = True) -> Optional[Offer]:
+    """
+    Offer a freed session to the next waiting user.
+
+    The session must already have no booking. With nobody waiting it is
+    made available again, unless ``open_if_empty`` is False. A closed
+    session (``Session.closed_at``) is neither offered nor reopened.
+    """
+    Session = models.Session
+    now = datetime.datetime.now()
+    if db.query(Session.closed_at).filter(Session.id == session_id).scalar() is not None:
+        db.commit()
+        return None
+    expires_at = now + claim_window()
+    pending_offer = (
+        _entries(db, session_id)
+        .filter(
+            models.WaitlistEntry.status == OFFERED,
+            models.WaitlistEntry.offer_expires_at > now,
+        )
+        .first()
+    )
+    if pending_offer is not None:
+        # Still held for an earlier offer; expire() passes it on if unclaimed
+        db.commit()
+        return None
+    while True:
+        entry = (
+            _entries(db, session_id)
+            .filter(models.WaitlistEntry.status == WAITING)
+            .order_by(models.WaitlistEntry.created_at, models.WaitlistEntry.id)
+            .first()
+        )
+        if entry is None:
+            if open_if_empty:
+                db.query(Session).filter(
+                    Session.id == session_id,
+                    Session.booked_user_id.is_(None),
+                    Session.closed_at.is_(None),
+                ).update({Session.available: True}, synchronize_session=False)
+            db.commit()
+            return None
+        # Only one releaser can move a given entry out of WAITING
+        offered = (
+            db.query(models.WaitlistEntry)
+            .filter(
+                models.WaitlistEntry.id == entry.id,
+                models.WaitlistEntry.status == WAITING,
+            )
+            .update(
+                {
+                    models.WaitlistEntry.status: OFFERED,
+                    models.WaitlistEntry.offered_at: now,
+                    models.WaitlistEntry.offer_expires_at: expires_at,
+                },
+                synchronize_session=False,
+            )
+        )
+        if offered:
+            break
+        db.rollback()
+    # Held for the offer: unavailable to everyone else
+    db.query(Session).filter(
+        Session.id == session_id, Session.booked_user_id.is_(None)
+    ).update({Session.available: False}, synchronize_session=False)
+    session = db.get(Session, session_id)
+    offer = Offer(
+        entry_id=entry.id,
+        user_id=entry.user_id,
+        session_date=session.session_date,
+        time_slot=session.time_slot,
+        expires_at=expires_at,
+    )
+    db.commit()
+    return offer
+
+
+def claim(db, entry_id: int, user_id: int) -> Optional[models.Session]:
+    """Accept an offer still inside its claim window; returns the session."""
+    claimed = (
+        db.query(models.WaitlistEntry)
+        .filter(
+            models.WaitlistEntry.id == entry_id,
+            models.WaitlistEntry.user_id == user_id,
+            models.WaitlistEntry.status == OFFERED,
+            models.WaitlistEntry.offer_expires_at > datetime.datetime.now(),
+        )
+        .update(
+            {models.WaitlistEntry.status: models.WaitlistStatus.CLAIMED},
+            synchronize_session=False,
+        )
+    )
+    if not claimed:
+        db.rollback()
+        return None
+    entry = db.get(models.WaitlistEntry, entry_id)
+    session = db.get(models.Session, entry.session_id)
+    if session is None or session.booked_user_id is not None:
+        db.rollback()
+        return None
+    return session
+
+
+def _release_expired_holds(db, now: datetime.datetime) -> List[int]:
+    """Drop unpaid bookings older than the hold; returns their session ids."""
+    hold = booking_hold()
+    if not hold:
+        return []
+    Session, Payment = models.Session, models.Payment
+    paying = Payment.verified.in_(PAYING)
+    session_ids = [
+        session_id
+        for (session_id,) in db.query(Session.id)
+        .join(
+            Payment,
+            (Payment.session_id == Session.id)
+            & (Payment.user_id == Session.booked_user_id),
+        )
+        .filter(Session.session_date >= now.date())
+        .group_by(Session.id)
+        .having(
+            func.max(case((paying, 1), else_=0)) == 0,
+            func.max(Payment.payment_date) <= now - hold,
+            func.max(
+                case(
+                    (
+                        Payment.subscription_id.isnot(None)
+                        & (Payment.payment_date > now - subscription_hold()),
+                        1,
+                    ),
+                    else_=0,
+                )
+            )
+            == 0,
+        )
+    ]
+    if session_ids:
+        db.query(Session).filter(Session.id.in_(session_ids)).update(
+            {Session.booked_user_id: None}, synchronize_session=False
+        )
+        db.commit()
+    return session_ids
+
+
+def expire(db, now: Optional[datetime.datetime] = None) -> List[Offer]:
+    """
+    Expire unclaimed offers and unpaid holds and pass their sessions on;
+    returns the new offers.
+    """
+    now = now or datetime.datetime.now()
+    expired = (
+        db.query(models.WaitlistEntry.id, models.WaitlistEntry.session_id)
+        .filter(
+            models.WaitlistEntry.status == OFFERED,
+            models.WaitlistEntry.offer_expires_at <= now,
+        )
+        .all()
+    )
+    session_ids = []
+    for entry_id, session_id in expired:
+        moved = (
+            db.query(models.WaitlistEntry)
+            .filter(
+                models.WaitlistEntry.id == entry_id,
+                models.WaitlistEntry.status == OFFERED,
+            )
+            .update(
+                {models.WaitlistEntry.status: models.WaitlistStatus.EXPIRED},
+                synchronize_session=False,
+            )
+        )
+        if moved:
+            session_ids.append(session_id)
+    db.commit()
+    session_ids.extend(_release_expired_holds(db, now))
+
+    offers = []
+    for session_id in session_ids:
+        offer = release(db, session_id)
+        if offer is not None:
+            offers.append(offer)
+    return offers
+
+
+def cancel_for_days(db, start: datetime.date, end: datetime.date) -> int:
+    """Cancel the waitlists of sessions on ``start <= day <= end`` (no commit)."""
+    session_ids = db.query(models.Session.id).filter(
+        models.Session.session_date >= start, models.Session.session_date <= end
+    )
+    return (
+        db.query(models.WaitlistEntry)
+        .filter(
+            models.WaitlistEntry.session_id.in_(session_ids.scalar_subquery()),
+            models.WaitlistEntry.status.in_(ACTIVE),
+        )
+        .update(
+            {models.WaitlistEntry.status: models.WaitlistStatus.CANCELLED},
+            synchronize_session=False,
+        )
+    )
+
+
+def release_holds_for_days(db, start: datetime.date, end: datetime.date) -> int:
+    """Drop the unpaid bookings of sessions on ``start <= day <= end`` (no commit)."""
+    Session, Payment = models.Session, models.Payment
+    paid = exists().where(
+        Payment.session_id == Session.id,
+        Payment.user_id == Session.booked_user_id,
+        Payment.verified.in_(PAYING),
+    )
+    return (
+        db.query(Session)
+        .filter(
+            Session.session_date >= start,
+            Session.session_date <= end,
+            Session.booked_user_id.isnot(None),
+            ~paid,
+        )
+        .update({Session.booked_user_id: None}, synchronize_session=False)
+    )
@@ -1,24 +1,90 @@
 import datetime
+import re
 import threading
 import time
-from calendar import day_name
-from io import BytesIO
+from dataclasses import replace
 from math import ceil  # Add this import
 
-import pandas as pd
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, LabeledPrice
 
 from constant import admin
-from constant.general import ACCOUNT_TYPE, PERSIAN_DAY_NAMES, STATUS, TIMESLOTS
-from repositories import models
+from constant.general import ACCOUNT_TYPE, STATUS
+from repositories import (
+    broadcasts,
+    cancellations,
+    ledger,
+    models,
+    pagination,
+    queries,
+    rollups,
+    schedule,
+    venues,
+    waitlist,
+)
+from repositories.reference import reference
 from repositories.utils import get_db
-from utility import convert_english_numbers, decode_json, encode_json
+from user_flow import keyboards
+from user_flow.session_calendar import SessionCalendar
+from utility import convert_english_numbers, convert_persian_numbers, persian_date
+from utils import broadcast, media, recurring, waitlist_offers
+from utils.callback import (
+    ADMIN_USER,
+    ADMIN_USER_BOOKINGS,
+    ADMIN_USER_LIST,
+    ADMIN_USER_PAYMENTS,
+    ADMIN_USER_PAYMENTS_FIRST,
+    CANCEL_CONFIRM,
+    CANCEL_DAYS,
+    USERS_PAGE,
+    InvalidCallbackData,
+    callback_data,
+)
+from utils.callback_state import pack_callback, unpack_callback
 from utils.dependency import Dependency, inject
-from utils.jalali import Gregorian
+from utils.jalali import Gregorian, Persian
+from utils.profiler import sampler
+from utils.sender import sender
 
 # Define constants for pagination
 USERS_PER_PAGE = 10
+# Placeholder keyset cursor values for the first page of a listing
+NO_CURSOR_DATE = datetime.date(2000, 1, 1)
+
+# Payment report filters
+REPORT_STATUS = {
+    models.VerificationStatus.VERIFIED: "پرداخت شده",
+    models.VerificationStatus.PENDING: "در انتظار",
+    models.VerificationStatus.REFUNDED: "مسترد",
+    models.VerificationStatus.REJECTED: "ناموفق",
+}
+REPORT_RANGE = re.compile(
+    r"^(\d{4})\D(\d{1,2})\D(\d{1,2})\s*-\s*(\d{4})\D(\d{1,2})\D(\d{1,2})$"
+)
+JALALI_DATE = re.compile(r"^(\d{4})\D(\d{1,2})\D(\d{1,2})$")
+# "HH:MM-HH:MM" venue time slots
+TIME_SLOT = re.compile(r"^\d{2}:\d{2}-\d{2}:\d{2}$")
+
+
+def _jalali_range(text):
+    """``1403/01/01-1403/03/31`` as Gregorian ``[start, end)`` dates."""
+    match = REPORT_RANGE.match(convert_persian_numbers(text or "").strip())
+    if not match:
+        raise ValueError(text)
+    numbers = [int(part) for part in match.groups()]
+    start = Persian(*numbers[:3]).gregorian_datetime()
+    end = Persian(*numbers[3:]).gregorian_datetime() + datetime.timedelta(days=1)
+    if end <= start:
+        raise ValueError(text)
+    return start, end
+
+
+def _toggle(selected, item):
+    """Add ``item`` to the tuple ``selected`` or remove it if present."""
+    if item in selected:
+        return tuple(value for value in selected if value != item)
+    return selected + (item,)
 
 
 class UserFlow:
@@ -28,11 +94,30 @@ class UserFlow:
             func=lambda query: True,
             callback=lambda query: self.pre_checkout_query(query),
         )
+        self.bot.register_message_handler(
+            self.verify_refund,
+            content_types=["successful_payment"],
+            func=cancellations.is_refund_payment,
+        )
         self.user_boarding = {}
+        # chat id -> queries.ReportFilters chosen on the report screen
+        self.report_filters = {}
+        # admin user id -> (audience, text) of a broadcast awaiting confirmation
+        self.broadcast_drafts = {}
+        # Translate: "Pitch sessions"
+        self.calendar = SessionCalendar(
+            "نمایش سانس‌های زمین",
+            day_prefix="ADMIN_SESSION_DATE:",
+            page_prefix="ADMIN_SESSIONS_PAGE:",
+            admin=True,
+        )
 
-    def _get_session_or_warn(self, call, db, session_id):
+    def _get_session_or_warn(self, call, db, session_id, loader=None):
         """Fetches a session by ID or sends a warning if not found."""
-        session = db.query(models.Session).filter_by(id=session_id).first()
+        if loader:
+            session = loader(db, session_id)
+        else:
+            session = db.query(models.Session).filter_by(id=session_id).first()
         if not session:
             try:
                 # Translate: "This session is no longer available."
@@ -44,6 +129,40 @@ class UserFlow:
             return None
         return session
 
+    def _decode_or_warn(self, call, schema):
+        """Decodes the signed callback payload or warns on tampered data."""
+        try:
+            return unpack_callback(schema, call.data.split(":")[-1])
+        except InvalidCallbackData as e:
+            print(f"Rejected callback payload from {call.from_user.id}: {e}")
+            try:
+                # Translate: "Invalid request."
+                self.bot.answer_callback_query(
+                    call.id, "درخواست نامعتبر است.", show_alert=True
+                )
+            except Exception as e:
+                print(f"Error answering callback query: {e}")
+            return None
+
+    @staticmethod
+    def _is_admin(db, user_id):
+        role = db.query(models.User.role).filter_by(user_id=user_id).scalar()
+        return role == models.UserRole.ADMIN
+
+    def _is_admin_or_warn(self, call, db):
+        """Rejects callbacks that reach admin-only actions from other users."""
+        if self._is_admin(db, call.from_user.id):
+            return True
+        print(f"Rejected admin callback from {call.from_user.id}: {call.data}")
+        try:
+            # Translate: "You do not have access to this section."
+            self.bot.answer_callback_query(
+                call.id, "شما به این بخش دسترسی ندارید.", show_alert=True
+            )
+        except Exception as e:
+            print(f"Error answering callback query: {e}")
+        return False
+
     def _send_and_delete(self, chat_id, text, delay=5):
         sent_message = self.bot.send_message(chat_id, text)
 
@@ -59,28 +178,7 @@ class UserFlow:
     def start(self, call, message=None, first_time=False):
         from telebot.types import ReplyKeyboardRemove
 
-        markup = InlineKeyboardMarkup(row_width=1)  # Adjust row width if needed
-        markup.add(
-            # Translate: "View Users"
-            InlineKeyboardButton(
-                "مشاهده کاربران", callback_data="ADMIN_VIEW_USERS_PAGE:1"
-            ),  # Start on page 1
-            # Translate: "View Sessions"
-            InlineKeyboardButton("مشاهده سانس‌ها", callback_data="ADMIN_VIEW_SESSIONS"),
-            # Translate: "Generate Excel Report"
-            InlineKeyboardButton(
-                "دریافت گزارش اکسل", callback_data="ADMIN_GENERATE_REPORT"
-            ),
-            # Translate: "Generate Monthly Sessions"
-            InlineKeyboardButton(
-                "ایجاد سانس‌های ماهانه", callback_data="ADMIN_GENERATE_SESSIONS"
-            ),
-            # Translate: "Change Session Costs"
-            InlineKeyboardButton(
-                "تغییر هزینه سانس‌ها", callback_data="ADMIN_CHANGE_BASED_COST"
-            ),
-            # Translate: "User Verification"
-        )
+        markup = keyboards.admin_panel(sampler.enabled)
         # Translate: "Admin Panel:"
         text = "پنل مدیریت:"
         if first_time:
@@ -108,6 +206,120 @@ class UserFlow:
         else:
             self.bot.send_message(message.chat.id, text, reply_markup=markup)
 
+    def toggle_profiler(self, call, db):
+        """ADMIN_TOGGLE_PROFILER - switch slow handler sampling on or off."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        enabled = sampler.toggle()
+        try:
+            # Translate: "Profiler enabled/disabled (threshold ... ms)"
+            self.bot.answer_callback_query(
+                call.id,
+                f"پروفایلر {'فعال' if enabled else 'غیرفعال'} شد "
+                f"(آستانه {convert_english_numbers(int(sampler.threshold_ms))} میلی‌ثانیه)",
+            )
+        except Exception as e:
+            print(f"Error answering callback query: {e}")
+        self.start(call)
+
+    @staticmethod
+    def _jalali_period(period):
+        """Start, end (exclusive) and label of the current (or previous) Jalali month or year."""
+        year, month, _ = Gregorian(datetime.date.today()).persian_tuple()
+        if period == "year":
+            start = Persian(year, 1, 1).gregorian_datetime()
+            end = Persian(year + 1, 1, 1).gregorian_datetime()
+            return start, end, f"سال {convert_english_numbers(year)}"
+        if period == "prev":
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+        start = Persian(year, month, 1).gregorian_datetime()
+        end = Persian(next_year, next_month, 1).gregorian_datetime()
+        return start, end, f"ماه {convert_english_numbers(f'{year}/{month}')}"
+
+    def rollup_report(self, call, db):
+        """ADMIN_ROLLUPS:{month|year} - revenue and occupancy from the daily rollups."""
+        period = call.data.split(":")[-1]
+        rollups.refresh(db)
+        start, end, label = self._jalali_period(period)
+        summary = rollups.period_summary(db, start, end)
+
+        # Translate: "Revenue and occupancy report"
+        msg = f"*گزارش درآمد و اشغال {label}*\n\n*درآمد:*\n"
+        total = 0
+        refunds = 0
+        for account_type, label_fa in ACCOUNT_TYPE.items():
+            item = summary["revenue"].get(account_type, {})
+            total += item.get("revenue", 0)
+            refunds += item.get("refunds", 0)
+            msg += (
+                f"{label_fa}: {convert_english_numbers(item.get('revenue', 0))} تومان"
+                f" ({convert_english_numbers(item.get('payments', 0))} پرداخت)\n"
+            )
+        msg += f"💰 مجموع: {convert_english_numbers(total)} تومان\n"
+        msg += f"↩️ استرداد: {convert_english_numbers(refunds)} تومان\n\n*اشغال سانس‌ها:*\n"
+        for time_slot in sorted(summary["occupancy"]):
+            item = summary["occupancy"][time_slot]
+            sessions = item["booked"] + item["available"] + item["inactive"]
+            rate = round(100 * item["booked"] / sessions) if sessions else 0
+            msg += (
+                f"{time_slot}: {convert_english_numbers(item['booked'])} از "
+                f"{convert_english_numbers(sessions)} ({convert_english_numbers(rate)}٪)"
+                f" | غیرفعال: {convert_english_numbers(item['inactive'])}\n"
+            )
+
+        other = "year" if period != "year" else "month"
+        markup = InlineKeyboardMarkup(row_width=1)
+        markup.add(
+            # Translate: "Yearly view" / "Monthly view"
+            InlineKeyboardButton(
+                "نمایش سالانه" if other == "year" else "نمایش ماهانه",
+                callback_data=f"ADMIN_ROLLUPS:{other}",
+            ),
+            # Translate: "Export daily Excel"
+            InlineKeyboardButton(
+                "دریافت اکسل روزانه", callback_data=f"ADMIN_ROLLUPS_EXPORT:{period}"
+            ),
+            InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START"),
+        )
+        try:
+            self.bot.edit_message_text(
+                msg,
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=markup,
+                parse_mode="Markdown",
+            )
+        except Exception as e:
+            if "message is not modified" not in str(e):
+                print(f"Error editing message for rollup_report: {e}")
+
+    def export_rollups(self, call, db):
+        """ADMIN_ROLLUPS_EXPORT:{month|year} - daily rollup rows as Excel."""
+        period = call.data.split(":")[-1]
+        rollups.refresh(db)
+        start, end, label = self._jalali_period(period)
+        rows = rollups.daily_rows(db, start, end)
+        if not rows:
+            # Translate: "No data for this period."
+            self.bot.answer_callback_query(call.id, "داده‌ای برای این بازه وجود ندارد.")
+            return
+        def build_report():
+            # pandas is only loaded once a report actually has to be built
+            from utils import reporting
+
+            return reporting.rollup_report(rows)
+
+        media.send_document(
+            self.bot,
+            db,
+            call.message.chat.id,
+            build_report,
+            key=repr(rows),
+            visible_file_name=f"گزارش روزانه {label}.xlsx",
+            caption=f"گزارش درآمد و اشغال {label}",
+        )
+
     def seesion_date(self, call, db):
         try:
             date_str = call.data.split(":")[-1]
@@ -122,12 +334,14 @@ class UserFlow:
         sessions = (
             db.query(models.Session)
             .filter(models.Session.session_date == date)
-            .order_by(models.Session.time_slot)
-            .all()  # Order sessions by time
+            .order_by(models.Session.venue_id, models.Session.start_time)
+            .all()  # Order sessions by venue and time
         )
-        jalali_date = Gregorian(date).persian_string()
+        jalali_date = persian_date(date)
         msg = f"*سانس‌های زمین برای {jalali_date}*\n"  # Already Persian
         keyboard = InlineKeyboardMarkup()
+        # Name the venue on each button when there are several
+        show_venue = len(reference.venues(db, active_only=False)) > 1
 
         for s in sessions:
             if s.booked_user_id:
@@ -139,12 +353,25 @@ class UserFlow:
             else:
                 # Translate: "(Inactive)"
                 btn_text = f"🟡 {s.time_slot} (غیرفعال)"
+            venue = reference.venue(db, s.venue_id) if show_venue else None
+            if venue:
+                btn_text += f" - {venue.name}"
 
             keyboard.add(
                 InlineKeyboardButton(
                     btn_text, callback_data=f"ADMIN_MANAGE_SESSION:{s.id}"
                 )
             )
+        if sessions:
+            keyboard.add(
+                # Translate: "Cancel the whole day and refund"
+                InlineKeyboardButton(
+                    "⛔️ لغو کل روز و استرداد وجه",
+                    callback_data=callback_data(
+                        "ADMIN_CANCEL_DAYS:", CANCEL_DAYS, start=date, end=date
+                    ),
+                )
+            )
         keyboard.add(
             InlineKeyboardButton(
                 "بازگشت", callback_data="ADMIN_VIEW_SESSIONS"
@@ -171,17 +398,17 @@ class UserFlow:
             )
             return
 
-        session = self._get_session_or_warn(call, db, session_id)
+        session = self._get_session_or_warn(
+            call, db, session_id, loader=queries.session_with_booker
+        )
         if not session:
             return  # Warning already sent by helper
 
         markup = InlineKeyboardMarkup()
-        session_info = f"سانس: {Gregorian(session.session_date).persian_string()} {session.time_slot}"  # Already Persian
+        session_info = f"سانس: {persian_date(session.session_date)} {session.time_slot}"  # Already Persian
 
         if session.booked_user_id:
-            booked_user = (
-                db.query(models.User).filter_by(user_id=session.booked_user_id).first()
-            )
+            booked_user = session.user
             user_info = (
                 f"توسط {booked_user.name} {booked_user.surname} رزرو شده است."
                 if booked_user
@@ -222,6 +449,8 @@ class UserFlow:
             print(f"Error editing message: {e}")
 
     def session_refund(self, call, db):
+        if not self._is_admin_or_warn(call, db):
+            return
         try:
             session_id = int(call.data.split(":")[-1])
         except (IndexError, ValueError):
@@ -245,13 +474,17 @@ class UserFlow:
         # --- Logic for refund (e.g., update session, notify user) ---
         booked_user_id = session.booked_user_id
         session_details = (
-            f"{Gregorian(session.session_date).persian_string()} {session.time_slot}"
+            f"{persian_date(session.session_date)} {session.time_slot}"
         )
 
         # Update session state (make it available again, remove user booking)
         # session.booked_user_id = None
         # session.available = False # Or True depending on desired state after refund
-        user_payment = db.query(models.Payment).filter_by(session_id=session_id).first()
+        user_payment = (
+            db.query(models.Payment)
+            .filter_by(session_id=session_id, user_id=booked_user_id)
+            .first()
+        )
         # payment.verified = models.VerificationStatus.REFUNDED # Update payment status to refunded
         # db.commit()
         # db.refresh(session)
@@ -262,21 +495,29 @@ class UserFlow:
             session_id=session_id,
             amount=user_payment.amount,
             payment_date=datetime.datetime.now(),
-            comment="استرداد وجه",
+            comment=cancellations.REFUND_COMMENT,
         )
         db.add(payment)
+        # The refund invoice payload carries the payment id, so it must exist
+        # before the invoice is sent (as in cancellations.cancel_days)
+        db.flush()
+        description = f"سانس: {session_details}\nدر  وجه\n{user.name} {user.surname}"
+        card_number = user.card_number
+        amount = user_payment.amount
+        payload = f"{cancellations.REFUND_PAYLOAD}{payment.id}"
+        db.commit()
         self.bot.send_invoice(
             call.from_user.id,
             title="استرداد وجه",
-            description=f"سانس: {Gregorian(session.session_date).persian_string()} {session.time_slot}\nدر  وجه\n{user.name} {user.surname}",
-            provider_token=user.card_number,  # Use user's card number for payment
+            description=description,
+            provider_token=card_number,  # Use user's card number for payment
             prices=[
                 LabeledPrice(
-                    label="استرداد هزینه سانس", amount=user_payment.amount * 10
+                    label="استرداد هزینه سانس", amount=amount * 10
                 )  # Amount in IRR
             ],
             currency="IRR",
-            invoice_payload=str(payment.id),
+            invoice_payload=payload,
         )
         # Notify user
         # try:
@@ -301,18 +542,166 @@ class UserFlow:
         # # Go back to the session management view for this session
         # self.manage_session(call, db) # Refresh the view
 
+    def cancel_range(self, call, db):
+        """ADMIN_CANCEL_RANGE - ask for the Jalali range of days to cancel."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        # Translate: "Enter the days to cancel as 1403/01/01-1403/01/03"
+        msg = self.bot.send_message(
+            call.message.chat.id,
+            "روزهای لغو را به صورت ۱۴۰۳/۰۱/۰۱-۱۴۰۳/۰۱/۰۳ وارد کنید.",
+        )
+        self.bot.register_next_step_handler(msg, self.handle_cancel_range)
+
+    @inject
+    def handle_cancel_range(self, message, db: Session = Dependency(get_db)):
+        try:
+            start, end = _jalali_range(message.text)
+        except Exception:
+            # Translate: "Invalid range."
+            msg = self.bot.reply_to(
+                message, "بازه نامعتبر است. مثال: ۱۴۰۳/۰۱/۰۱-۱۴۰۳/۰۱/۰۳"
+            )
+            self.bot.register_next_step_handler(msg, self.handle_cancel_range)
+            return
+        last_day = end - datetime.timedelta(days=1)
+        msg, markup = self._cancel_confirmation(db, start, last_day)
+        self.bot.send_message(
+            message.chat.id, msg, reply_markup=markup, parse_mode="Markdown"
+        )
+
+    def cancel_days(self, call, db):
+        """ADMIN_CANCEL_DAYS:{signed start/end} - confirm cancelling whole days."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        data = self._decode_or_warn(call, CANCEL_DAYS)
+        if data is None:
+            return
+        msg, markup = self._cancel_confirmation(db, data["start"], data["end"])
+        try:
+            self.bot.edit_message_text(
+                msg,
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=markup,
+                parse_mode="Markdown",
+            )
+        except Exception as e:
+            print(f"Error editing message for cancel_days: {e}")
+
+    def _cancel_confirmation(self, db, start, end):
+        bookings = queries.paid_bookings_between(db, start, end)
+        total = sum(booking.amount for booking in bookings)
+        period = (
+            persian_date(start)
+            if start == end
+            else f"{persian_date(start)} تا {persian_date(end)}"
+        )
+        # Translate: "Cancel all sessions of {period}? Paid bookings: n, refund total: x"
+        msg = (
+            f"*لغو همه سانس‌های {period}*\n\n"
+            f"رزروهای پرداخت شده: {convert_english_numbers(len(bookings))}\n"
+            f"مبلغ قابل استرداد: {convert_english_numbers(total)} تومان\n\n"
+            "همه سانس‌های این بازه غیرفعال و برای هر رزرو فاکتور استرداد ارسال می‌شود."
+        )
+        markup = InlineKeyboardMarkup(row_width=1)
+        markup.add(
+            # Translate: "Confirm cancellation"
+            InlineKeyboardButton(
+                "✅ تایید لغو",
+                callback_data=callback_data(
+                    "ADMIN_CANCEL_CONFIRM:", CANCEL_CONFIRM, start=start, end=end
+                ),
+            ),
+            InlineKeyboardButton("بازگشت", callback_data="ADMIN_VIEW_SESSIONS"),
+        )
+        return msg, markup
+
+    def confirm_cancel_days(self, call, db):
+        """ADMIN_CANCEL_CONFIRM:{signed start/end} - close the days and send the refunds."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        data = self._decode_or_warn(call, CANCEL_CONFIRM)
+        if data is None:
+            return
+        admin_id = call.from_user.id
+        closed, refunds = cancellations.cancel_days(
+            db, data["start"], data["end"], admin_id
+        )
+        chat_id = call.message.chat.id
+        # Translate: "Sessions closed: n. Sending refund invoices..."
+        status_msg = self.bot.edit_message_text(
+            f"⛔️ {convert_english_numbers(closed)} سانس غیرفعال شد.\n"
+            f"⏳ ارسال {convert_english_numbers(len(refunds))} فاکتور استرداد...",
+            chat_id=chat_id,
+            message_id=call.message.message_id,
+        )
+        if not refunds:
+            return
+
+        def jobs():
+            for refund in refunds:
+                yield refund.user_id, lambda refund=refund: self._notify_cancelled(refund)
+                yield admin_id, lambda refund=refund: self._send_refund_invoice(
+                    admin_id, refund
+                )
+
+        def on_progress(progress):
+            # Translate: "Refunds: processed/total, failed: n"
+            text = (
+                f"⛔️ {convert_english_numbers(closed)} سانس غیرفعال شد.\n"
+                f"{'✅' if progress.done else '⏳'} استرداد: "
+                f"{convert_english_numbers(progress.processed)}/"
+                f"{convert_english_numbers(progress.total)}"
+                f" | خطا: {convert_english_numbers(progress.failed)}"
+            )
+            self.bot.edit_message_text(
+                text, chat_id=chat_id, message_id=status_msg.message_id
+            )
+
+        sender.send_all(jobs(), total=len(refunds) * 2, on_progress=on_progress)
+
+    def _notify_cancelled(self, refund):
+        # Translate: "Your session was cancelled by the management; the refund is on its way"
+        return self.bot.send_message(
+            refund.user_id,
+            "سانس انتخابی شما توسط مدیریت لغو شد و وجه پرداختی شما استرداد داده می‌شود."
+            f"\n*اطلاعات سانس*\n{persian_date(refund.session_date)} {refund.time_slot}"
+            f"\nشماره پیگیری:{refund.shipping_option_id}\n",
+            parse_mode="Markdown",
+        )
+
+    def _send_refund_invoice(self, admin_id, refund):
+        return self.bot.send_invoice(
+            admin_id,
+            title="استرداد وجه",
+            description=f"سانس: {persian_date(refund.session_date)} {refund.time_slot}\nدر  وجه\n{refund.name} {refund.surname}",
+            provider_token=refund.card_number,  # Use user's card number for payment
+            prices=[
+                LabeledPrice(
+                    label="استرداد هزینه سانس", amount=refund.amount * 10
+                )  # Amount in IRR
+            ],
+            currency="IRR",
+            invoice_payload=f"{cancellations.REFUND_PAYLOAD}{refund.refund_payment_id}",
+        )
+
     @inject
     def pre_checkout_query(self, pre_checkout_query, db: Session = Dependency(get_db)):
         # Always accept pre-checkout queries for now
         # You can add validation logic here if needed
         try:
             # Get payment details from payload
-            payment_id = pre_checkout_query.invoice_payload
+            payment_id = cancellations.payment_id_from_payload(
+                pre_checkout_query.invoice_payload
+            )
             payment = db.query(models.Payment).filter_by(id=payment_id).first()
 
             if payment:
                 # Accept the pre-checkout query
+                old_status = payment.verified
                 payment.verified = models.VerificationStatus.PENDING
+                ledger.record_status_change(db, payment, old_status)
                 db.commit()
                 db.refresh(payment)
                 self.bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
@@ -335,25 +724,39 @@ class UserFlow:
     @inject
     def verify_refund(self, message, db: Session = Dependency(get_db)):
         # Get payment details from payload
-        payment_id = message.successful_payment.invoice_payload
+        payment_id = cancellations.payment_id_from_payload(
+            message.successful_payment.invoice_payload
+        )
         payment = db.query(models.Payment).filter_by(id=payment_id).first()
         if payment:
             # Update payment status
+            old_status = payment.verified
             payment.verified = models.VerificationStatus.VERIFIED
             payment.shipping_option_id = message.successful_payment.shipping_option_id
+            ledger.record_status_change(db, payment, old_status)
             session = db.query(models.Session).filter_by(id=payment.session_id).first()
-            session_details = f"{Gregorian(session.session_date).persian_string()} {session.time_slot}"
+            session_details = f"{persian_date(session.session_date)} {session.time_slot}"
 
             # Update session state (make it available again, remove user booking)
+            booked_user_id = session.booked_user_id
             session.booked_user_id = None
             session.available = False  # Or True depending on desired state after refund
+            # The booker's payment, not this refund (same session, paid by the admin)
             user_payment = (
-                db.query(models.Payment).filter_by(session_id=session.id).first()
+                db.query(models.Payment)
+                .filter_by(session_id=session.id, user_id=booked_user_id)
+                .first()
             )
+            refunded_from = user_payment.verified
             user_payment.verified = (
                 models.VerificationStatus.REFUNDED
             )  # Update payment status to refunded
+            ledger.record_status_change(db, user_payment, refunded_from)
             db.commit()
+            # Offer the freed session to its waitlist, if anyone is waiting
+            offer = waitlist.release(db, session.id, open_if_empty=False)
+            if offer is not None:
+                waitlist_offers.notify(self.bot, [offer])
             db.refresh(session)
 
             db.commit()
@@ -361,7 +764,7 @@ class UserFlow:
             try:
                 # Translate user notification message
                 self.bot.send_message(
-                    session.booked_user_id,
+                    booked_user_id,
                     f"سانس انتخابی شما توسط مدیریت لغو شد."
                     f"مبلغ پرداختی شما استرداد داده شد"
                     f"\n*اطلاعات سانس*\n{session_details}\nشماره پیگیری:{payment.shipping_option_id}\n",
@@ -375,7 +778,7 @@ class UserFlow:
                 # db.commit()
             except Exception as e:
                 print(
-                    f"Error sending refund notification to user {session.booked_user_id}: {e}"
+                    f"Error sending refund notification to user {booked_user_id}: {e}"
                 )
 
             # Update the admin message
@@ -406,8 +809,17 @@ class UserFlow:
             )
             return
 
-        session.available = available_status
-        db.commit()
+        if available_status:
+            session.closed_at = None
+            db.flush()
+            # Waiting users get the session first; otherwise it opens to all
+            offer = waitlist.release(db, session.id)
+            if offer is not None:
+                waitlist_offers.notify(self.bot, [offer])
+        else:
+            session.available = available_status
+            session.closed_at = datetime.datetime.now()
+            db.commit()
         db.refresh(session)
 
         status_text = "فعال" if available_status else "غیرفعال"
@@ -435,58 +847,60 @@ class UserFlow:
         self._toggle_session_availability(call, db, available_status=True)
 
     def view_sessions(self, call, db):
-        # No need to check user registration here if this is admin-only flow
-        today = datetime.date.today()
-        # Show sessions for the next 7 days, for example
-        num_days_to_show = 7
-        dates = [today + datetime.timedelta(days=i) for i in range(num_days_to_show)]
+        self._sessions_page(call, db, "w0")
 
-        # Fetch sessions efficiently
-        sessions = (
-            db.query(models.Session)
-            .filter(models.Session.session_date.in_(dates))
-            .order_by(models.Session.session_date)  # Order by date
-            .all()
+    def sessions_page(self, call, db):
+        """ADMIN_SESSIONS_PAGE:{w<n>|m<year>-<month>} - browse the session calendar."""
+        self._sessions_page(call, db, call.data.split(":", 1)[1])
+
+    def _sessions_page(self, call, db, payload):
+        msg, keyboard = self.calendar.page(db, payload)
+        keyboard.row(
+            # Translate: "Cancel a range of days and refund"
+            InlineKeyboardButton(
+                "⛔️ لغو سانس‌های یک بازه", callback_data="ADMIN_CANCEL_RANGE"
+            )
         )
+        keyboard.row(
+            # Translate: "بازگشت به منو اصلی"
+            InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START")
+        )
+        try:
+            self.bot.edit_message_text(
+                msg,
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=keyboard,
+                parse_mode="Markdown",
+            )
+        except Exception as e:
+            print(f"Error editing message: {e}")
 
-        sessions_by_date = {}
-        for s in sessions:
-            date_key = s.session_date
-            if date_key not in sessions_by_date:
-                sessions_by_date[date_key] = []
-            sessions_by_date[date_key].append(
-                s
-            )  # Sessions are already ordered by time if fetched that way
-
-        # Translate: "*نمایش سانس های زمین*"
-        msg = "*نمایش سانس‌های زمین*\n"
+    def venues(self, call, db):
+        """ADMIN_VENUES - list the venues with their slots and status."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        # Translate: "*Pitches*"
+        msg = "*زمین‌ها*\n"
         keyboard = InlineKeyboardMarkup()
-
-        if not sessions_by_date:
-            # Translate: "No sessions found for the next ... days."
-            msg += f"\nسانسی برای {num_days_to_show} روز آینده یافت نشد."
-        else:
-            # Iterate through the desired dates to maintain order
-            for date in dates:
-                if (
-                    date in sessions_by_date
-                ):  # Check if there are sessions for this date
-                    day_name_en = day_name[date.weekday()]
-                    day_name_fa = PERSIAN_DAY_NAMES.get(day_name_en, day_name_en)
-                    jalali_date_str = Gregorian(
-                        date
-                    ).persian_string()  # Add Jalali date string
-
-                    # Add day header button
-                    keyboard.add(  # Use add() instead of row() for single button rows
-                        InlineKeyboardButton(
-                            f"{day_name_fa} - {jalali_date_str}",
-                            callback_data=f"ADMIN_SESSION_DATE:{date}",
-                        )
-                    )
-
+        for venue in reference.venues(db, active_only=False):
+            general = reference.session_cost(db, models.UserType.GENERAL, venue.id)
+            # Translate: "{name}: n slots, general cost x"
+            msg += (
+                f"\n{'🟢' if venue.active else '🔴'} {venue.name}: "
+                f"{convert_english_numbers(len(venue.time_slots))} سانس در روز، "
+                f"هزینه عمومی {convert_english_numbers(general or 0)} تومان"
+            )
+            # Translate: "Deactivate/Activate {name}"
+            keyboard.add(
+                InlineKeyboardButton(
+                    f"{'غیرفعال‌سازی' if venue.active else 'فعال‌سازی'} {venue.name}",
+                    callback_data=f"ADMIN_VENUE_TOGGLE:{venue.id}",
+                )
+            )
+        # Translate: "Add a pitch"
+        keyboard.add(InlineKeyboardButton("➕ افزودن زمین", callback_data="ADMIN_VENUE_ADD"))
         keyboard.add(
-            # Translate: "بازگشت به منو اصلی"
             InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START")
         )
         try:
@@ -498,20 +912,100 @@ class UserFlow:
                 parse_mode="Markdown",
             )
         except Exception as e:
-            print(f"Error editing message: {e}")
+            print(f"Error editing message for venues: {e}")
 
-    def view_users(self, call, db):
+    def toggle_venue(self, call, db):
+        """ADMIN_VENUE_TOGGLE:{venue_id} - stop or resume generating its sessions."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        venue = reference.venue(db, int(call.data.split(":")[-1]))
+        if venue:
+            venues.set_active(db, venue.id, not venue.active)
+        self.venues(call, db)
+
+    def add_venue(self, call, db):
+        """ADMIN_VENUE_ADD - ask for the new venue's name, slots and prices."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        # Translate: "Send three lines: name, slots (comma separated) and
+        # costs for general, student, employee (optional)"
+        msg = self.bot.send_message(
+            call.message.chat.id,
+            "مشخصات زمین را در سه خط بفرستید:\n"
+            "نام زمین\n"
+            "سانس‌ها با کاما، مثال: 15:00-16:30, 16:30-18:00\n"
+            "هزینه عمومی، دانشجویی، کارمندی (اختیاری)، مثال: 120000, 80000, 100000",
+        )
+        self.bot.register_next_step_handler(msg, self.handle_venue_form)
+
+    @inject
+    def handle_venue_form(self, message, db: Session = Dependency(get_db)):
+        if not self._is_admin(db, message.from_user.id):
+            print(f"Rejected venue form from {message.from_user.id}")
+            return
+        lines = [line.strip() for line in (message.text or "").splitlines() if line.strip()]
         try:
-            page = int(call.data.split(":")[-1])
-        except (ValueError, IndexError):
-            page = 1
+            name = lines[0][:100]
+            time_slots = [
+                slot.strip()
+                for slot in re.split("[,،]", convert_persian_numbers(lines[1]))
+                if slot.strip()
+            ]
+            if (
+                not time_slots
+                or not all(TIME_SLOT.match(slot) for slot in time_slots)
+                or len(",".join(time_slots)) > 255
+            ):
+                raise ValueError(lines[1])
+            prices = {}
+            if len(lines) > 2:
+                costs = [
+                    int(cost) for cost in re.split("[,،]", convert_persian_numbers(lines[2]))
+                ]
+                account_types = (
+                    models.UserType.GENERAL,
+                    models.UserType.STUDENT,
+                    models.UserType.EMPLOYEE,
+                )
+                prices = dict(zip(account_types, costs))
+        except (IndexError, ValueError):
+            # Translate: "Invalid input, please try again."
+            msg = self.bot.reply_to(message, "ورودی نامعتبر است. دوباره تلاش کنید.")
+            self.bot.register_next_step_handler(msg, self.handle_venue_form)
+            return
+        venue = venues.create(db, name, time_slots, prices)
+        # Translate: "Pitch {name} added; its sessions are created with the next generation."
+        self.bot.send_message(
+            message.chat.id,
+            f"✅ زمین {venue.name} اضافه شد. سانس‌های آن با ایجاد سانس‌های بعدی ساخته می‌شوند.",
+        )
 
-        offset = (page - 1) * USERS_PER_PAGE
-        users_query = db.query(models.User)
-        total_users = users_query.count()
+    def view_users(self, call, db):
+        payload = call.data.split(":")[-1]
+        if payload.isdigit():
+            # Entry point from the admin panel
+            cursor = {"page": 1, "user_id": 0, "direction": pagination.FIRST}
+        else:
+            cursor = self._decode_or_warn(call, USERS_PAGE)
+            if not cursor:
+                return
+
+        users_page, has_more = queries.users_page(
+            db, (cursor["user_id"],), cursor["direction"], USERS_PER_PAGE
+        )
+        if cursor["direction"] == pagination.PREV:
+            # Rows may have been added since; snap to page 1 at the start
+            page = cursor["page"] if has_more else 1
+            has_next = True
+        else:
+            page = cursor["page"]
+            has_next = has_more
+        total_users = pagination.counts.get(
+            "users", lambda: db.query(func.count(models.User.user_id)).scalar()
+        )
         # Use math.ceil for calculating total_pages
-        total_pages = ceil(total_users / USERS_PER_PAGE) if total_users > 0 else 1
-        users_page = users_query.offset(offset).limit(USERS_PER_PAGE).all()
+        total_pages = max(ceil(total_users / USERS_PER_PAGE), page)
+        page_start = users_page[0].user_id if users_page else 0
 
         # Translate: "*کاربران (صفحه .../...):*"
         markup = InlineKeyboardMarkup()
@@ -521,27 +1015,46 @@ class UserFlow:
             msg += "کاربری یافت نشد."
         else:
             for u in users_page:
-                data = encode_json({"page": page, "user_id": u.user_id})
                 markup.row(
                     InlineKeyboardButton(
                         f"{u.name or ''} {u.surname or ''}",
-                        callback_data=f"ADMIN_VIEW_USER:{data}",
+                        callback_data=pack_callback(
+                            "ADMIN_VIEW_USER:",
+                            ADMIN_USER,
+                            page=page,
+                            page_start=page_start,
+                            user_id=u.user_id,
+                        ),
                     )
                 )
 
         nav_buttons = []
-        if page > 1:
+        if page > 1 and users_page:
             nav_buttons.append(
                 # Translate: "⬅️ قبلی"
                 InlineKeyboardButton(
-                    "⬅️ قبلی", callback_data=f"ADMIN_VIEW_USERS_PAGE_{page-1}"
+                    "⬅️ قبلی",
+                    callback_data=pack_callback(
+                        "ADMIN_VIEW_USERS_PAGE:",
+                        USERS_PAGE,
+                        page=page - 1,
+                        user_id=users_page[0].user_id,
+                        direction=pagination.PREV,
+                    ),
                 )
             )
-        if page < total_pages:
+        if has_next and users_page:
             nav_buttons.append(
                 # Translate: "بعدی ➡️"
                 InlineKeyboardButton(
-                    "بعدی ➡️", callback_data=f"ADMIN_VIEW_USERS_PAGE_{page+1}"
+                    "بعدی ➡️",
+                    callback_data=pack_callback(
+                        "ADMIN_VIEW_USERS_PAGE:",
+                        USERS_PAGE,
+                        page=page + 1,
+                        user_id=users_page[-1].user_id,
+                        direction=pagination.NEXT,
+                    ),
                 )
             )
 
@@ -569,12 +1082,33 @@ class UserFlow:
                 print(f"Error editing message for view_users: {e}")
             # Optionally, answer callback query to acknowledge button press even if message doesn't change
 
+    @staticmethod
+    def _user_context(data, page=1, direction=pagination.FIRST):
+        """Navigation context shared by the user detail sub-screens."""
+        return {
+            "from_page": data.get("from_page", data.get("page")),
+            "page_start": data.get("page_start"),
+            "user_id": data.get("user_id"),
+            "page": page,
+            "direction": direction,
+        }
+
+    def _back_to_user_button(self, data):
+        back_data = pack_callback(
+            "ADMIN_VIEW_USER:",
+            ADMIN_USER,
+            page=data.get("from_page"),
+            page_start=data.get("page_start"),
+            user_id=data.get("user_id"),
+        )
+        return InlineKeyboardButton("بازگشت به مشخصات کاربر", callback_data=back_data)
+
     def view_user_details(self, call, db):
-        data = decode_json(call.data.split(":")[-1])
+        data = self._decode_or_warn(call, ADMIN_USER)
+        if not data:
+            return
 
-        user_db = (
-            db.query(models.User).filter_by(user_id=int(data.get("user_id"))).first()
-        )
+        user_db, summary = queries.user_with_summary(db, int(data.get("user_id")))
 
         markup = InlineKeyboardMarkup()
         msg = f"*مشخصات کابر:*\n"
@@ -585,29 +1119,52 @@ class UserFlow:
             f"🏷️ نوع حساب: {ACCOUNT_TYPE[user_db.account_type]}\n"
             f"✅ وضعیت تایید: {STATUS[user_db.is_verified]}\n"
         )
-
-        reply_data = encode_json(
-            {
-                "from_page": data.get("page"),
-                "user_id": user_db.user_id,
-                "page": 1,
-            }
+        if summary:
+            # Translate: "Payments: count, total paid, pending, refunded, last payment"
+            msg += (
+                f"💳 پرداخت‌های موفق: {convert_english_numbers(summary.payment_count)}"
+                f" ({convert_english_numbers(summary.total_paid)} تومان)\n"
+                f"⏳ در انتظار: {convert_english_numbers(summary.pending_count)}"
+                f" | ↩️ استرداد: {convert_english_numbers(summary.refunded_count)}\n"
+            )
+            if summary.last_payment_date:
+                msg += f"🕒 آخرین پرداخت: {persian_date(summary.last_payment_date.date())}\n"
+
+        context = self._user_context(data)
+        list_context = {k: v for k, v in context.items() if k != "direction"}
+        back_to_list = pack_callback(
+            "ADMIN_VIEW_USERS_PAGE:",
+            USERS_PAGE,
+            page=data.get("page", 1),
+            user_id=data.get("page_start"),
+            direction=pagination.AT if data.get("page_start") else pagination.FIRST,
         )
         markup.add(
             InlineKeyboardButton(
-                "مشاهده رزروها", callback_data=f"ADMIN_VIEW_USER_BOOKINGS:{reply_data}"
+                "مشاهده رزروها",
+                callback_data=pack_callback(
+                    "ADMIN_BOOKED:",
+                    ADMIN_USER_BOOKINGS,
+                    session_date=NO_CURSOR_DATE,
+                    session_id=0,
+                    **context,
+                ),
             ),
             InlineKeyboardButton(
                 "مشاهده پرداخت‌ها",
-                callback_data=f"ADMIN_VIEW_USER_PAYMENTS:{reply_data}",
+                callback_data=pack_callback(
+                    "ADMIN_VIEW_USER_PAYMENTS:", ADMIN_USER_PAYMENTS_FIRST, **context
+                ),
             ),
             InlineKeyboardButton(
                 "بررسی و تغییر وضعیت کابر",
-                callback_data=f"ADMIN_VIEW_USER_VERIFICATION:{reply_data}",
+                callback_data=pack_callback(
+                    "ADMIN_USER_VERIFY:", ADMIN_USER_LIST, **list_context
+                ),
             ),
             InlineKeyboardButton(
                 "بازگشت به لیست کاربران",
-                callback_data=f"ADMIN_VIEW_USERS_PAGE:{data.get('page',1)}",
+                callback_data=back_to_list,
             ),
             row_width=1,
         )
@@ -632,37 +1189,62 @@ class UserFlow:
                 pass  # Ignore errors here
 
     def view_user_payments(self, call, db):
-        """ADMIN_VIEW_USER_PAYMENTS:
-        data:
+        """ADMIN_VIEW_USER_PAYMENTS: first page, ADMIN_PAID: later pages
+        data (ADMIN_USER_PAYMENTS_FIRST):
                 from_page: int
+                page_start: int
                 user_id: int
+        data (ADMIN_USER_PAYMENTS):
+                from_page: int
+                page_start: int
                 page: int
-        back_data:
+                direction: int
+                payment_id: keyset cursor, completed by its payment_date
+        back_data (ADMIN_USER):
                 page: int
+                page_start: int
                 user_id: int
         """
-        data = decode_json(call.data.split(":")[-1])
-        user_db = db.query(models.User).filter_by(user_id=data.get("user_id")).first()
-        try:
-            page = int(data.get("page"))
-        except (ValueError, IndexError):
-            page = 1  # Default to page 1 on error
+        if call.data.startswith("ADMIN_PAID:"):
+            data = self._decode_or_warn(call, ADMIN_USER_PAYMENTS)
+            if not data:
+                return
+            boundary = queries.payment_boundary(db, data["payment_id"])
+            if boundary is None:
+                # Translate: "This payment is no longer available."
+                self.bot.answer_callback_query(
+                    call.id, "این پرداخت دیگر در دسترس نیست.", show_alert=True
+                )
+                return
+            user_db, payment_date = boundary
+            data["user_id"] = user_db.user_id
+            cursor = (payment_date, data["payment_id"])
+        else:
+            data = self._decode_or_warn(call, ADMIN_USER_PAYMENTS_FIRST)
+            if not data:
+                return
+            data.update(page=1, direction=pagination.FIRST)
+            user_db = db.query(models.User).filter_by(user_id=data["user_id"]).first()
+            cursor = (None, None)
+        user_id = data.get("user_id")
+        page = max(int(data.get("page") or 1), 1)
 
         DATA_SHOW_LIMIT = 3
-        offset = (page - 1) * DATA_SHOW_LIMIT
-        user_total_payment = (
-            db.query(models.Payment).filter_by(user_id=data.get("user_id")).count()
-        )
-        user_payments = (
-            db.query(models.Payment)
-            .filter_by(user_id=data.get("user_id"))
-            .offset(offset)
-            .limit(DATA_SHOW_LIMIT)
-            .all()
+        user_payments, has_more = queries.user_payments_page(
+            db,
+            user_id,
+            cursor,
+            data.get("direction"),
+            DATA_SHOW_LIMIT,
         )
-        total_pages = (
-            ceil(user_total_payment / DATA_SHOW_LIMIT) if user_total_payment > 0 else 1
+        has_next = has_more or data.get("direction") == pagination.PREV
+        user_total_payment = pagination.counts.get(
+            ("payments", user_id),
+            lambda: db.query(func.count(models.Payment.id))
+            .filter(models.Payment.user_id == user_id)
+            .scalar(),
         )
+        total_pages = max(ceil(user_total_payment / DATA_SHOW_LIMIT), page)
         markup = InlineKeyboardMarkup()
         if not user_payments:
             # Translate: "No bookings found."
@@ -678,52 +1260,42 @@ class UserFlow:
             for payment in user_payments:
                 msg += f"*شماره پیگیری :{payment.shipping_option_id}*\n"
                 msg += f"مبلغ: {payment.amount} تومان\n"
-                msg += f"تاریخ: {Gregorian(payment.payment_date.date()).persian_string()} {payment.payment_date.strftime('%H:%M')}\n"
+                msg += f"تاریخ: {persian_date(payment.payment_date.date())} {payment.payment_date.strftime('%H:%M')}\n"
                 msg += f"وضعیت: {payment.verified.value}\n"
                 msg += "-" * 25 + "\n"
 
             nav_buttons = []
             if page > 1:
-                prev_data = encode_json(
-                    {
-                        "from_page": data.get("from_page"),
-                        "user_id": data.get("user_id"),
-                        "page": page - 1,
-                    }
+                first = user_payments[0]
+                prev_data = pack_callback(
+                    "ADMIN_PAID:",
+                    ADMIN_USER_PAYMENTS,
+                    payment_id=first.id,
+                    **self._user_context(data, page - 1, pagination.PREV),
                 )
                 nav_buttons.append(
                     InlineKeyboardButton(
-                        "<<", callback_data=f"ADMIN_VIEW_USER_PAYMENTS:{prev_data}"
+                        "<<", callback_data=prev_data
                     )
                 )
-            if page < total_pages:
-                next_data = encode_json(
-                    {
-                        "from_page": data.get("from_page"),
-                        "user_id": data.get("user_id"),
-                        "page": page + 1,
-                    }
+            if has_next:
+                last = user_payments[-1]
+                next_data = pack_callback(
+                    "ADMIN_PAID:",
+                    ADMIN_USER_PAYMENTS,
+                    payment_id=last.id,
+                    **self._user_context(data, page + 1, pagination.NEXT),
                 )
                 nav_buttons.append(
                     InlineKeyboardButton(
-                        ">>", callback_data=f"ADMIN_VIEW_USER_PAYMENTS:{next_data}"
+                        ">>", callback_data=next_data
                     )
                 )
 
             if nav_buttons:
                 markup.row(*nav_buttons)  # Add navigation buttons in one row
 
-        back_data = encode_json(
-            {
-                "page": data.get("from_page"),
-                "user_id": data.get("user_id"),
-            }
-        )
-        markup.add(
-            InlineKeyboardButton(
-                "بازگشت به مشخصات کاربر", callback_data=f"ADMIN_VIEW_USER:{back_data}"
-            )
-        )
+        markup.add(self._back_to_user_button(data))
         markup.add(
             InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START")
         )
@@ -748,39 +1320,34 @@ class UserFlow:
                 pass  # Ignore errors here
 
     def view_user_bookings(self, call, db):
-        """ADMIN_VIEW_USER_BOOKINGS:
-        data:
+        """ADMIN_BOOKED:
+        data (ADMIN_USER_BOOKINGS):
                 from_page: int
+                page_start: int
                 user_id: int
                 page: int
-        back_data:
+                direction: int
+                session_date, session_id: keyset cursor
+        back_data (ADMIN_USER):
                 page: int
+                page_start: int
                 user_id: int
         """
-        data = decode_json(call.data.split(":")[-1])
-        user_db = db.query(models.User).filter_by(user_id=data.get("user_id")).first()
-        try:
-            page = int(data.get("page"))
-        except (ValueError, IndexError):
-            page = 1  # Default to page 1 on error
-
-        offset = (page - 1) * USERS_PER_PAGE
-        user_total_booking = (
-            db.query(models.Session)
-            .filter_by(booked_user_id=data.get("user_id"))
-            .count()
-        )
-        # Use math.ceil for calculating total_pages
-        total_pages = (
-            ceil(user_total_booking / USERS_PER_PAGE) if user_total_booking > 0 else 1
-        )
-        users_page = (
-            db.query(models.Session)
-            .filter_by(booked_user_id=data.get("user_id"))
-            .offset(offset)
-            .limit(USERS_PER_PAGE)
-            .all()
+        data = self._decode_or_warn(call, ADMIN_USER_BOOKINGS)
+        if not data:
+            return
+        user_id = data.get("user_id")
+        user_db = db.query(models.User).filter_by(user_id=user_id).first()
+        page = max(int(data.get("page") or 1), 1)
+
+        users_page, has_more = queries.user_bookings_page(
+            db,
+            user_id,
+            (data.get("session_date"), data.get("session_id")),
+            data.get("direction"),
+            USERS_PER_PAGE,
         )
+        has_next = has_more or data.get("direction") == pagination.PREV
 
         # Added default values for potentially missing attributes
         markup = InlineKeyboardMarkup()
@@ -792,39 +1359,37 @@ class UserFlow:
             msg += "رزروی  یافت نشد."
         else:
             for booking in users_page:
-                session = db.query(models.Session).filter_by(id=booking.id).first()
-                if session:
-                    jalali_date = Gregorian(session.session_date).persian_string()
-                    msg += f"📅 تاریخ: {jalali_date} - {session.time_slot}\n"
-                else:
-                    msg += "سانس نامعتبر است.\n"
+                jalali_date = persian_date(booking.session_date)
+                msg += f"📅 تاریخ: {jalali_date} - {booking.time_slot}\n"
         nav_buttons = []
-        if page > 1:
-            prev_page = encode_json(
-                {
-                    "from_page": data.get("from_page"),
-                    "user_id": data.get("user_id"),
-                    "page": page - 1,
-                }
+        if page > 1 and users_page:
+            first = users_page[0]
+            prev_page = pack_callback(
+                "ADMIN_BOOKED:",
+                ADMIN_USER_BOOKINGS,
+                session_date=first.session_date,
+                session_id=first.id,
+                **self._user_context(data, page - 1, pagination.PREV),
             )
             nav_buttons.append(
                 # Translate: "⬅️ قبلی"
                 InlineKeyboardButton(
-                    "⬅️ قبلی", callback_data=f"ADMIN_VIEW_USER_BOOKINGS:{prev_page}"
+                    "⬅️ قبلی", callback_data=prev_page
                 )
             )
-        if page < total_pages:
-            next_page = encode_json(
-                {
-                    "from_page": data.get("from_page"),
-                    "user_id": data.get("user_id"),
-                    "page": page + 1,
-                }
+        if has_next and users_page:
+            last = users_page[-1]
+            next_page = pack_callback(
+                "ADMIN_BOOKED:",
+                ADMIN_USER_BOOKINGS,
+                session_date=last.session_date,
+                session_id=last.id,
+                **self._user_context(data, page + 1, pagination.NEXT),
             )
             nav_buttons.append(
                 # Translate: "بعدی ➡️"
                 InlineKeyboardButton(
-                    "بعدی ➡️", callback_data=f"ADMIN_VIEW_USER_BOOKINGS:{next_page}"
+                    "بعدی ➡️", callback_data=next_page
                 )
             )
 
@@ -832,17 +1397,7 @@ class UserFlow:
             markup.row(*nav_buttons)  # Add navigation buttons in one row
 
         # Translate: "بازگشت به منو اصلی"
-        back_data = encode_json(
-            {
-                "page": data.get("from_page"),
-                "user_id": data.get("user_id"),
-            }
-        )
-        markup.add(
-            InlineKeyboardButton(
-                "بازگشت به مشخصات کاربر", callback_data=f"ADMIN_VIEW_USER:{back_data}"
-            )
-        )
+        markup.add(self._back_to_user_button(data))
         markup.add(
             InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START")
         )
@@ -929,6 +1484,7 @@ class UserFlow:
             new_cost = int(message.text)
             based_cost.session_cost = new_cost
             db.commit()
+            reference.invalidate()
             self._send_and_delete(
                 message.chat.id, "✅هزینه سانس با موفقیت تغییر یافت.", 5
             )
@@ -945,15 +1501,15 @@ class UserFlow:
     def user_verification(self, call, db):
         # TODO: add verification logic
         """
-         resived_data = encode_json(
-            {
-                "from_page": data.get("page"),
-                "user_id": user_db.user_id,
-                "page": 1,
-            }
+         resived_data = ADMIN_USER_LIST:
+                from_page: int
+                user_id: int
+                page: int
         """
         # ADMIN_VIEW_USER_VERIFICATION_FROM_{page}_{id}
-        resived_data = decode_json(call.data.split(":")[-1])
+        resived_data = self._decode_or_warn(call, ADMIN_USER_LIST)
+        if not resived_data:
+            return
         user_db = db.query(models.User).filter_by(user_id=resived_data.get("user_id"))
 
 
@@ -978,15 +1534,10 @@ class UserFlow:
             # --- Session Generation Logic ---
             today = datetime.date.today()
             start_date = today + datetime.timedelta(days=1)  # Start from tomorrow
-            end_date = today + datetime.timedelta(days=30)  # Up to 30 days from today
-
-            # Fetch base cost once
-            general_category = (
-                db.query(models.PaymentCategory)
-                .filter_by(account_type=models.UserType.GENERAL)
-                .first()
+            sessions_created = schedule.generate_sessions(
+                db, start_date, schedule.horizon(today)
             )
-            if not general_category:
+            if sessions_created is None:
                 # Handle error: Base cost category not found
                 # Translate: "❌ خطا: دسته بندی هزینه پایه یافت نشد."
                 self.bot.edit_message_text(
@@ -995,43 +1546,8 @@ class UserFlow:
                     generating_msg.message_id,
                 )
                 return
-
-            base_cost = general_category.session_cost
-
-            # Fetch existing sessions in the date range efficiently
-            existing_sessions = (
-                db.query(
-                    models.Session.session_date, models.Session.time_slot
-                )  # Select only needed columns
-                .filter(
-                    models.Session.session_date >= start_date,
-                    models.Session.session_date <= end_date,
-                )
-                .all()
-            )
-            existing_session_keys = set(
-                existing_sessions
-            )  # Set of (date, time_slot) tuples
-
-            sessions_to_add = []
-            current_date = start_date
-            while current_date <= end_date:
-                for time_slot in TIMESLOTS:
-                    if (current_date, time_slot) not in existing_session_keys:
-                        sessions_to_add.append(
-                            models.Session(
-                                session_date=current_date,
-                                time_slot=time_slot,
-                                available=True,
-                                cost=base_cost,
-                            )
-                        )
-                current_date += datetime.timedelta(days=1)
-
-            if sessions_to_add:
-                db.add_all(sessions_to_add)
-                db.commit()
-                sessions_created = len(sessions_to_add)
+            # Book the new sessions for weekly subscribers
+            recurring.claim_and_invoice(self.bot, db)
 
             # --- Success Message ---
             # Translate: "✅ با موفقیت ... سانس جدید برای ۳۰ روز آینده ایجاد شد."
@@ -1075,7 +1591,138 @@ class UserFlow:
             timer = threading.Timer(7.0, delete_message)  # Increased delay slightly
             timer.start()
 
+    def _report_filters(self, chat_id):
+        filters = self.report_filters.get(chat_id)
+        if filters is None:
+            start, end, _ = self._jalali_period("month")
+            filters = self.report_filters[chat_id] = queries.ReportFilters(
+                start=start,
+                end=end,
+                statuses=(models.VerificationStatus.VERIFIED,),
+            )
+        return filters
+
     def generate_report(self, call, db):
+        """ADMIN_GENERATE_REPORT - choose the report filters."""
+        filters = self._report_filters(call.message.chat.id)
+
+        def describe(selected, labels):
+            return "، ".join(labels[item] for item in selected) if selected else "همه"
+
+        if filters.start or filters.end:
+            last_day = filters.end - datetime.timedelta(days=1) if filters.end else None
+            period = (
+                f"{persian_date(filters.start) if filters.start else '...'}"
+                f" تا {persian_date(last_day) if last_day else '...'}"
+            )
+        else:
+            period = "همه"
+        # Translate: "Payment report - range / status / account type"
+        msg = (
+            "*گزارش پرداخت‌ها*\n"
+            f"📅 بازه: {convert_english_numbers(period)}\n"
+            f"✅ وضعیت: {describe(filters.statuses, REPORT_STATUS)}\n"
+            f"🏷️ نوع حساب: {describe(filters.account_types, ACCOUNT_TYPE)}\n"
+        )
+
+        markup = InlineKeyboardMarkup()
+        # Translate: "This month", "Last month", "This year", "All", "Custom range"
+        markup.row(
+            InlineKeyboardButton("این ماه", callback_data="ADMIN_REPORT_FILTER:range:month"),
+            InlineKeyboardButton("ماه قبل", callback_data="ADMIN_REPORT_FILTER:range:prev"),
+            InlineKeyboardButton("امسال", callback_data="ADMIN_REPORT_FILTER:range:year"),
+        )
+        markup.row(
+            InlineKeyboardButton("همه", callback_data="ADMIN_REPORT_FILTER:range:all"),
+            InlineKeyboardButton(
+                "بازه دلخواه", callback_data="ADMIN_REPORT_FILTER:range:custom"
+            ),
+        )
+        markup.row(
+            *(
+                InlineKeyboardButton(
+                    f"{'☑️' if status in filters.statuses else '▫️'} {label}",
+                    callback_data=f"ADMIN_REPORT_FILTER:status:{status.name}",
+                )
+                for status, label in REPORT_STATUS.items()
+            )
+        )
+        markup.row(
+            *(
+                InlineKeyboardButton(
+                    f"{'☑️' if account_type in filters.account_types else '▫️'} {label}",
+                    callback_data=f"ADMIN_REPORT_FILTER:type:{account_type.name}",
+                )
+                for account_type, label in ACCOUNT_TYPE.items()
+            )
+        )
+        markup.row(InlineKeyboardButton("📥 دریافت گزارش", callback_data="ADMIN_REPORT_RUN"))
+        markup.row(InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START"))
+        try:
+            self.bot.edit_message_text(
+                msg,
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=markup,
+                parse_mode="Markdown",
+            )
+        except Exception as e:
+            if "message is not modified" not in str(e):
+                print(f"Error editing message for generate_report: {e}")
+
+    def report_filter(self, call, db):
+        """ADMIN_REPORT_FILTER:{range|status|type}:{value}"""
+        _, field, value = call.data.split(":", 2)
+        chat_id = call.message.chat.id
+        filters = self._report_filters(chat_id)
+        if field == "range":
+            if value == "custom":
+                # Translate: "Enter the range as 1403/01/01-1403/03/31"
+                msg = self.bot.send_message(
+                    chat_id,
+                    "بازه را به صورت ۱۴۰۳/۰۱/۰۱-۱۴۰۳/۰۳/۳۱ وارد کنید.",
+                )
+                self.bot.register_next_step_handler(
+                    msg, self.handle_report_range, call
+                )
+                return
+            if value == "all":
+                filters = replace(filters, start=None, end=None)
+            else:
+                start, end, _ = self._jalali_period(value)
+                filters = replace(filters, start=start, end=end)
+        elif field == "status":
+            filters = replace(
+                filters,
+                statuses=_toggle(filters.statuses, models.VerificationStatus[value]),
+            )
+        elif field == "type":
+            filters = replace(
+                filters,
+                account_types=_toggle(filters.account_types, models.UserType[value]),
+            )
+        self.report_filters[chat_id] = filters
+        self.generate_report(call, db)
+
+    def handle_report_range(self, message, call):
+        try:
+            start, end = _jalali_range(message.text)
+        except Exception:
+            # Translate: "Invalid range."
+            msg = self.bot.reply_to(
+                message, "بازه نامعتبر است. مثال: ۱۴۰۳/۰۱/۰۱-۱۴۰۳/۰۳/۳۱"
+            )
+            self.bot.register_next_step_handler(msg, self.handle_report_range, call)
+            return
+        chat_id = message.chat.id
+        self.report_filters[chat_id] = replace(
+            self._report_filters(chat_id), start=start, end=end
+        )
+        self.generate_report(call, None)
+
+    def run_report(self, call, db):
+        """ADMIN_REPORT_RUN - send the (cached) Excel files for the chosen filters."""
+        filters = self._report_filters(call.message.chat.id)
         try:
             generating_msg = self.bot.send_message(
                 call.message.chat.id, "⏳ در حال تولید گزارش"
@@ -1087,51 +1734,34 @@ class UserFlow:
                 call.id, "خطا در شروع عملیات ایجاد سانس‌ها.", show_alert=True
             )
             return
-        payments = db.query(models.Payment).all()
-        if not payments:
-            self.bot.send_message(call.message.chat.id, "No payment history found.")
+        # Cached workbooks; pandas is only loaded when one has to be built
+        from utils import report_cache
+
+        artifact = report_cache.get_report(db, filters)
+        if not artifact.rows:
+            # Translate: "No payments found for these filters."
+            self.bot.edit_message_text(
+                "پرداختی با این فیلترها یافت نشد.",
+                call.message.chat.id,
+                generating_msg.message_id,
+            )
             return
-        payment_data = []
-        for payment in payments:
-            session = db.query(models.Session).filter_by(id=payment.session_id).first()
-            user_db = db.query(models.User).filter_by(user_id=session.booked_user_id).first()
-            # payment_date = payment.payment_date.strftime("%Y-%m-%d %H:%M")
-            # session_date = (
-            #     session.session_date.strftime("%Y-%m-%d") if session else "N/A"
-            # )
-
-            payment_data.append(
-                {
-                    "شماره پیگیری": payment.shipping_option_id,
-                    "تاریخ پرداخت": f"{Gregorian(payment.payment_date.date()).persian_string()} {payment.payment_date.strftime('%H:%M')}",
-                    "تاریخ سانس": Gregorian(session.session_date).persian_string(),
-                    "زمان سانس": session.time_slot if session else "N/A",
-                    "مبلغ پرداختی": f"{convert_english_numbers(payment.amount)} تومان",
-                    "نام": user_db.name if user_db else "N/A",
-                    "نام خانوادگی": user_db.surname if user_db else "N/A",
-                    "شماره تماس": user_db.phone_number if user_db else "N/A",
-                    "شماره کارت": user_db.card_number if user_db else "N/A",
-                }
-            )
-
-        # Create Excel file in memory
-        output_excel = BytesIO()
-        df = pd.DataFrame(payment_data)
-        df.to_excel(output_excel, index=False)
-        output_excel.seek(0)
+        for index, report_file in enumerate(artifact.files, start=1):
+            # Send the Excel file, by file_id when this exact file was uploaded before
+            media.send_document(
+                self.bot,
+                db,
+                call.message.chat.id,
+                report_file.path,
+                visible_file_name=f"تاریخچه پرداخت_{call.from_user.id}_{index}.xlsx",
+                caption=f"تاریخچه پرداخت ({convert_english_numbers(index)})",
+            )
         final_msg = f"✅ گزارش پرداخت ها با موفقیت ایجاد شد."
         self.bot.edit_message_text(
             final_msg,
             call.message.chat.id,
             generating_msg.message_id,
         )
-        # Send the Excel file
-        self.bot.send_document(
-            call.message.chat.id,
-            output_excel,
-            visible_file_name=f"تاریخچه پرداخت_{call.from_user.id}.xlsx",
-            caption="تاریخچه پرداخت",
-        )
 
         def delete_message():
             try:
@@ -1143,3 +1773,124 @@ class UserFlow:
 
         timer = threading.Timer(7.0, delete_message)  # Increased delay slightly
         timer.start()
+
+    def broadcast_menu(self, call, db):
+        """ADMIN_BROADCAST - choose who receives a broadcast message."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        markup = InlineKeyboardMarkup(row_width=1)
+        # Translate: "All users"
+        markup.add(
+            InlineKeyboardButton("همه کاربران", callback_data="ADMIN_BROADCAST_AUDIENCE:all")
+        )
+        markup.row(
+            *(
+                InlineKeyboardButton(
+                    label,
+                    callback_data=f"ADMIN_BROADCAST_AUDIENCE:type:{account_type.name}",
+                )
+                for account_type, label in ACCOUNT_TYPE.items()
+            )
+        )
+        markup.add(
+            # Translate: "Users booked on a date"
+            InlineKeyboardButton(
+                "رزرو کنندگان یک روز", callback_data="ADMIN_BROADCAST_AUDIENCE:date"
+            ),
+            InlineKeyboardButton("بازگشت به پنل مدیریت", callback_data="ADMIN_START"),
+        )
+        try:
+            self.bot.edit_message_text(
+                # Translate: "Broadcast message - choose the recipients:"
+                "*پیام همگانی*\nگیرندگان را انتخاب کنید:",
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=markup,
+                parse_mode="Markdown",
+            )
+        except Exception as e:
+            print(f"Error editing message for broadcast_menu: {e}")
+
+    def broadcast_audience(self, call, db):
+        """ADMIN_BROADCAST_AUDIENCE:{all|type:<UserType>|date}"""
+        if not self._is_admin_or_warn(call, db):
+            return
+        audience = call.data.split(":", 1)[1]
+        if audience == "date":
+            # Translate: "Enter the date as 1403/01/01"
+            msg = self.bot.send_message(
+                call.message.chat.id, "تاریخ را به صورت ۱۴۰۳/۰۱/۰۱ وارد کنید."
+            )
+            self.bot.register_next_step_handler(msg, self.handle_broadcast_date)
+            return
+        self._ask_broadcast_text(call.message.chat.id, audience)
+
+    def handle_broadcast_date(self, message):
+        match = JALALI_DATE.match(convert_persian_numbers(message.text or "").strip())
+        try:
+            if not match:
+                raise ValueError(message.text)
+            date = Persian(*(int(part) for part in match.groups())).gregorian_datetime()
+        except Exception:
+            # Translate: "Invalid date."
+            msg = self.bot.reply_to(message, "تاریخ نامعتبر است. مثال: ۱۴۰۳/۰۱/۰۱")
+            self.bot.register_next_step_handler(msg, self.handle_broadcast_date)
+            return
+        self._ask_broadcast_text(message.chat.id, f"date:{date.date()}")
+
+    def _ask_broadcast_text(self, chat_id, audience):
+        # Translate: "Send the message text:"
+        msg = self.bot.send_message(chat_id, "متن پیام را ارسال کنید:")
+        self.bot.register_next_step_handler(msg, self.handle_broadcast_text, audience)
+
+    @inject
+    def handle_broadcast_text(
+        self, message, audience, db: Session = Dependency(get_db)
+    ):
+        if not message.text:
+            # Translate: "Only text messages can be broadcast."
+            msg = self.bot.reply_to(message, "فقط پیام متنی قابل ارسال است.")
+            self.bot.register_next_step_handler(
+                msg, self.handle_broadcast_text, audience
+            )
+            return
+        self.broadcast_drafts[message.from_user.id] = (audience, message.text)
+        recipients = broadcasts.audience_size(db, audience)
+        markup = InlineKeyboardMarkup(row_width=1)
+        markup.add(
+            # Translate: "Send"
+            InlineKeyboardButton("📢 ارسال", callback_data="ADMIN_BROADCAST_SEND"),
+            InlineKeyboardButton("انصراف", callback_data="ADMIN_START"),
+        )
+        # Translate: "Send this message to n users?"
+        self.bot.send_message(
+            message.chat.id,
+            f"این پیام برای {convert_english_numbers(recipients)} کاربر ارسال شود؟",
+            reply_markup=markup,
+        )
+
+    def broadcast_send(self, call, db):
+        """ADMIN_BROADCAST_SEND - start sending the drafted broadcast."""
+        if not self._is_admin_or_warn(call, db):
+            return
+        draft = self.broadcast_drafts.pop(call.from_user.id, None)
+        if draft is None:
+            # Translate: "No message to send."
+            self.bot.answer_callback_query(call.id, "پیامی برای ارسال وجود ندارد.")
+            return
+        audience, text = draft
+        # Translate: "Broadcast queued..."
+        self.bot.edit_message_text(
+            "⏳ پیام همگانی در صف ارسال...",
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+        )
+        created = broadcasts.create(
+            db,
+            text,
+            audience,
+            created_by=call.from_user.id,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+        )
+        broadcast.start(self.bot, created.id)
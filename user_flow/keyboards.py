@@ -0,0 +1,92 @@
+"""
+Static keyboards, serialized once.
+
+telebot accepts an already serialized ``reply_markup``, so keyboards that
+never change are built and turned into JSON on first use (or during
+startup warm-up) instead of on every message.
+"""
+
+from functools import lru_cache
+
+from telebot.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+)
+
+from constant import user as CUSER
+
+
+@lru_cache(maxsize=None)
+def main_menu() -> str:
+    """Reply keyboard of a registered user."""
+    keyboard = ReplyKeyboardMarkup(
+        resize_keyboard=True,
+        row_width=3,
+    )
+    buttons = (
+        KeyboardButton(CUSER.Buttons.SHOW_SESSIONS),
+        KeyboardButton(CUSER.Buttons.SHOW_PAYMENT_HISTORY),
+        KeyboardButton(CUSER.Buttons.SHOW_PROFILE),
+        KeyboardButton(CUSER.Buttons.SHOW_SUBSCRIPTIONS),
+    )
+    for button in buttons:
+        keyboard.add(button)
+    return keyboard.to_json()
+
+
+@lru_cache(maxsize=None)
+def account_types() -> str:
+    """Account type choice shown to new users."""
+    markup = InlineKeyboardMarkup()
+    for key in (CUSER.Buttons.EMPLOYEE, CUSER.Buttons.STUDENT, CUSER.Buttons.GENERAL):
+        markup.row(InlineKeyboardButton(key["TEXT"], callback_data=key["CALLBACK_DATA"]))
+    return markup.to_json()
+
+
+@lru_cache(maxsize=None)
+def admin_panel(profiler_enabled: bool) -> str:
+    """Admin start menu; the profiler button label depends on its state."""
+    markup = InlineKeyboardMarkup(row_width=1)
+    markup.add(
+        # Translate: "View Users"
+        InlineKeyboardButton(
+            "مشاهده کاربران", callback_data="ADMIN_VIEW_USERS_PAGE:1"
+        ),  # Start on page 1
+        # Translate: "View Sessions"
+        InlineKeyboardButton("مشاهده سانس‌ها", callback_data="ADMIN_VIEW_SESSIONS"),
+        # Translate: "Generate Excel Report"
+        InlineKeyboardButton(
+            "دریافت گزارش اکسل", callback_data="ADMIN_GENERATE_REPORT"
+        ),
+        # Translate: "Generate Monthly Sessions"
+        InlineKeyboardButton(
+            "ایجاد سانس‌های ماهانه", callback_data="ADMIN_GENERATE_SESSIONS"
+        ),
+        # Translate: "Revenue and occupancy"
+        InlineKeyboardButton(
+            "گزارش درآمد و اشغال", callback_data="ADMIN_ROLLUPS:month"
+        ),
+        # Translate: "Pitches"
+        InlineKeyboardButton("🏟 زمین‌ها", callback_data="ADMIN_VENUES"),
+        # Translate: "Broadcast message"
+        InlineKeyboardButton("📢 پیام همگانی", callback_data="ADMIN_BROADCAST"),
+        # Translate: "Change Session Costs"
+        InlineKeyboardButton(
+            "تغییر هزینه سانس‌ها", callback_data="ADMIN_CHANGE_BASED_COST"
+        ),
+        # Translate: "Slow handler profiler: on/off"
+        InlineKeyboardButton(
+            f"پروفایلر درخواست‌های کند: {'روشن' if profiler_enabled else 'خاموش'}",
+            callback_data="ADMIN_TOGGLE_PROFILER",
+        ),
+    )
+    return markup.to_json()
+
+
+def warm_up() -> None:
+    main_menu()
+    account_types()
+    admin_panel(False)
+    admin_panel(True)
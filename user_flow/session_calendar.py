@@ -0,0 +1,218 @@
+"""
+Paged session calendar.
+
+Week pages and Jalali month grids of the days that have sessions, shared
+by the user and admin session screens. Each page is rendered from one
+``queries.day_availability`` aggregate, so browsing further ahead never
+loads Session rows; the day's sessions are only loaded when it is opened.
+
+Page callbacks are ``{page_prefix}[{venue_id}:]w{n}`` (the n-th week from
+today) and ``{page_prefix}[{venue_id}:]m{year}-{month}`` (a Jalali month);
+day callbacks are ``{day_prefix}[{venue_id}:]{date}``. Without a venue
+the calendar covers all venues.
+"""
+
+import datetime
+from calendar import day_name
+from typing import Optional, Tuple
+
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from constant.general import PERSIAN_DAY_NAMES, PERSIAN_MONTH_NAMES
+from repositories import queries
+from repositories.reference import reference
+from utility import convert_english_numbers, persian_date
+from utils.jalali import Gregorian, Persian
+
+NOOP = "CALENDAR_NOOP"
+# Jalali weeks start on Saturday
+WEEKDAY_LABELS = ["ش", "ی", "د", "س", "چ", "پ", "ج"]
+
+
+def _day_label(day: datetime.date) -> str:
+    name = day_name[day.weekday()]
+    return PERSIAN_DAY_NAMES.get(name, name)
+
+
+def _month_bounds(year: int, month: int) -> Tuple[datetime.date, datetime.date]:
+    next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+    start = Persian(year, month, 1).gregorian_datetime()
+    end = Persian(next_year, next_month, 1).gregorian_datetime()
+    return start, end - datetime.timedelta(days=1)
+
+
+def _shift_month(year: int, month: int, delta: int) -> Tuple[int, int]:
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+class SessionCalendar:
+    def __init__(
+        self,
+        title: str,
+        day_prefix: str,
+        page_prefix: str,
+        admin: bool = False,
+    ):
+        self.title = title
+        self.day_prefix = day_prefix
+        self.page_prefix = page_prefix
+        # Admins can browse past days and see booked counts
+        self.admin = admin
+
+    def page(self, db, payload: str, today: Optional[datetime.date] = None):
+        """(text, markup) of the page named by a page callback payload."""
+        today = today or datetime.date.today()
+        venue, _, view = payload.rpartition(":")
+        venue_id = int(venue) if venue else None
+        if view.startswith("m"):
+            year, month = (int(part) for part in view[1:].split("-"))
+            return self.month(db, year, month, today, venue_id)
+        return self.week(db, int(view[1:] or 0), today, venue_id)
+
+    def _title(self, db, venue_id: Optional[int]) -> str:
+        venue = reference.venue(db, venue_id)
+        return f"*{self.title} - {venue.name}*" if venue else f"*{self.title}*"
+
+    @staticmethod
+    def _scope(venue_id: Optional[int]) -> str:
+        return f"{venue_id}:" if venue_id is not None else ""
+
+    def _day_button(
+        self, item: queries.DayAvailability, venue_id: Optional[int]
+    ) -> InlineKeyboardButton:
+        label = f"{_day_label(item.day)} {persian_date(item.day)}"
+        if self.admin:
+            # Translate: "{day} {date} (booked/sessions)"
+            label += (
+                f" ({convert_english_numbers(item.booked)}/"
+                f"{convert_english_numbers(item.sessions)})"
+            )
+        elif item.available:
+            # Translate: "{day} {date} — n free"
+            label += f" — {convert_english_numbers(item.available)} آزاد"
+        else:
+            # Translate: "{day} {date} — full"
+            label += " — تکمیل"
+        return InlineKeyboardButton(
+            label, callback_data=f"{self.day_prefix}{self._scope(venue_id)}{item.day}"
+        )
+
+    def week(self, db, page: int, today: datetime.date, venue_id: Optional[int] = None):
+        if not self.admin:
+            page = max(page, 0)
+        start = today + datetime.timedelta(days=7 * page)
+        end = start + datetime.timedelta(days=6)
+        summary, has_more = queries.day_availability(db, start, end, venue_id)
+        pages = f"{self.page_prefix}{self._scope(venue_id)}"
+
+        # Translate: "{title}\n{start} to {end}"
+        text = f"{self._title(db, venue_id)}\n{persian_date(start)} تا {persian_date(end)}\n"
+        markup = InlineKeyboardMarkup()
+        for day in sorted(summary):
+            markup.row(self._day_button(summary[day], venue_id))
+        if not summary:
+            # Translate: "No sessions this week."
+            text += "\nسانسی در این هفته وجود ندارد."
+
+        navigation = []
+        if page > 0 or self.admin:
+            # Translate: "Previous week"
+            navigation.append(
+                InlineKeyboardButton(
+                    "◀️ هفته قبل", callback_data=f"{pages}w{page - 1}"
+                )
+            )
+        if has_more:
+            # Translate: "Next week"
+            navigation.append(
+                InlineKeyboardButton(
+                    "هفته بعد ▶️", callback_data=f"{pages}w{page + 1}"
+                )
+            )
+        if navigation:
+            markup.row(*navigation)
+        year, month, _ = Gregorian(start).persian_tuple()
+        # Translate: "Month view"
+        markup.row(
+            InlineKeyboardButton(
+                "🗓 نمای ماهانه", callback_data=f"{pages}m{year}-{month}"
+            )
+        )
+        return text, markup
+
+    def month(
+        self,
+        db,
+        year: int,
+        month: int,
+        today: datetime.date,
+        venue_id: Optional[int] = None,
+    ):
+        this_year, this_month, _ = Gregorian(today).persian_tuple()
+        if not self.admin and (year, month) < (this_year, this_month):
+            year, month = this_year, this_month
+        start, end = _month_bounds(year, month)
+        first = start if self.admin else max(start, today)
+        summary, has_more = queries.day_availability(db, first, end, venue_id)
+        pages = f"{self.page_prefix}{self._scope(venue_id)}"
+
+        # Translate: "{title}\n{month name} {year}\n✅ free  ⛔️ full"
+        text = (
+            f"{self._title(db, venue_id)}\n"
+            f"{PERSIAN_MONTH_NAMES[month - 1]} {convert_english_numbers(year)}\n"
+            "✅ دارای سانس آزاد  ⛔️ تکمیل"
+        )
+        markup = InlineKeyboardMarkup(row_width=7)
+        markup.row(
+            *(InlineKeyboardButton(label, callback_data=NOOP) for label in WEEKDAY_LABELS)
+        )
+        # Column of the 1st: Saturday (weekday() 5) is the first column
+        row = [InlineKeyboardButton(" ", callback_data=NOOP)] * ((start.weekday() + 2) % 7)
+        day = start
+        while day <= end:
+            number = convert_english_numbers(Gregorian(day).persian_tuple()[2])
+            item = summary.get(day)
+            if item is None:
+                button = InlineKeyboardButton(number, callback_data=NOOP)
+            else:
+                mark = "✅" if item.available else "⛔️"
+                button = InlineKeyboardButton(
+                    f"{number}{mark}",
+                    callback_data=f"{self.day_prefix}{self._scope(venue_id)}{day}",
+                )
+            row.append(button)
+            if len(row) == 7:
+                markup.row(*row)
+                row = []
+            day += datetime.timedelta(days=1)
+        if row:
+            row += [InlineKeyboardButton(" ", callback_data=NOOP)] * (7 - len(row))
+            markup.row(*row)
+
+        navigation = []
+        if self.admin or (year, month) > (this_year, this_month):
+            prev_year, prev_month = _shift_month(year, month, -1)
+            # Translate: "Previous month"
+            navigation.append(
+                InlineKeyboardButton(
+                    "◀️ ماه قبل",
+                    callback_data=f"{pages}m{prev_year}-{prev_month}",
+                )
+            )
+        if has_more:
+            next_year, next_month = _shift_month(year, month, 1)
+            # Translate: "Next month"
+            navigation.append(
+                InlineKeyboardButton(
+                    "ماه بعد ▶️",
+                    callback_data=f"{pages}m{next_year}-{next_month}",
+                )
+            )
+        if navigation:
+            markup.row(*navigation)
+        # Translate: "Week view"
+        markup.row(
+            InlineKeyboardButton("📅 نمای هفتگی", callback_data=f"{pages}w0")
+        )
+        return text, markup
@@ -2,10 +2,7 @@ import datetime
 import re
 import threading
 from calendar import day_name
-from io import BytesIO
-from tkinter import E
 
-import pandas as pd
 from sqlalchemy.orm import Session
 from telebot.types import (
     InlineKeyboardButton,
@@ -17,16 +14,15 @@ from telebot.types import (
 
 from constant import user as CUSER
 from constant.general import PERSIAN_DAY_NAMES, TIMESLOTS
-from repositories import models
+from repositories import cancellations, ledger, models, queries, subscriptions, waitlist
+from repositories.reference import reference
 from repositories.utils import get_db
-from utility import (
-    convert_english_numbers,
-    convert_persian_numbers,
-    decode_json,
-    encode_json,
-)
+from user_flow import keyboards
+from user_flow.session_calendar import SessionCalendar
+from utility import convert_english_numbers, normalize_digits, persian_date
+from utils import media, recurring
+from utils.callback import BOOK_SESSION, InvalidCallbackData, callback_data
 from utils.dependency import Dependency, inject
-from utils.jalali import Gregorian
 
 
 class UserFlow:
@@ -36,13 +32,19 @@ class UserFlow:
             self.handle_phone_number, content_types=["contact"]
         )
         self.bot.register_message_handler(
-            self.verify_payment, content_types=["successful_payment"]
+            self.verify_payment,
+            content_types=["successful_payment"],
+            func=lambda message: not cancellations.is_refund_payment(message),
         )
         self.bot.register_pre_checkout_query_handler(
             func=lambda query: True,
             callback=lambda query: self.pre_checkout_query(query),
         )
         self.user_boarding = {}
+        # Translate: "Pitch sessions"
+        self.calendar = SessionCalendar(
+            "سانس های زمین", day_prefix="SESSION_DATE:", page_prefix="SESSIONS_PAGE:"
+        )
 
     def start(self, message, db, admin_start):
         user_id = message.from_user.id
@@ -52,45 +54,19 @@ class UserFlow:
                 admin_start(None, message, first_time=True)
 
             elif user_db.role == models.UserRole.USER:
-                keyboard = ReplyKeyboardMarkup(
-                    resize_keyboard=True,
-                    row_width=3,
-                )
-                buttons = (
-                    KeyboardButton(CUSER.Buttons.SHOW_SESSIONS),
-                    KeyboardButton(CUSER.Buttons.SHOW_PAYMENT_HISTORY),
-                    KeyboardButton(CUSER.Buttons.SHOW_PROFILE),
-                )
-                for button in buttons:
-                    keyboard.add(button)
                 self.bot.send_message(
                     message.from_user.id,
                     CUSER.Messages.WELLCOME_BACK,
-                    reply_markup=keyboard,
+                    reply_markup=keyboards.main_menu(),
                 )
             return
-        markup = InlineKeyboardMarkup()
-        keys = (
-            InlineKeyboardButton(
-                CUSER.Buttons.EMPLOYEE["TEXT"],
-                callback_data=CUSER.Buttons.EMPLOYEE["CALLBACK_DATA"],
-            ),
-            InlineKeyboardButton(
-                CUSER.Buttons.STUDENT["TEXT"],
-                callback_data=CUSER.Buttons.STUDENT["CALLBACK_DATA"],
-            ),
-            InlineKeyboardButton(
-                CUSER.Buttons.GENERAL["TEXT"],
-                callback_data=CUSER.Buttons.GENERAL["CALLBACK_DATA"],
-            ),
-        )
         self.user_boarding[user_id] = {
             "first_message": message.message_id,
         }
-        for key in keys:
-            markup.row(key)
         self.bot.send_message(
-            message.chat.id, CUSER.Messages.SELECT_ACCOUNT_TYPE, reply_markup=markup
+            message.chat.id,
+            CUSER.Messages.SELECT_ACCOUNT_TYPE,
+            reply_markup=keyboards.account_types(),
         )
 
     @inject
@@ -128,10 +104,8 @@ class UserFlow:
     def handle_veryfication_token(self, message, db_user: models.User):
         if db_user.user_id == message.from_user.id:
             try:
-                input_text = message.text.strip()
                 # Convert Persian/Arabic numerals to ASCII digits
-                cleaned = convert_persian_numbers(input_text)
-                cleaned = re.sub(r"\D+", "", cleaned.strip(), flags=re.UNICODE)
+                cleaned = normalize_digits(message.text)
                 if not cleaned:
                     msg = self.bot.reply_to(message, CUSER.Messages.INVALID_NUMBER)
                     self.bot.register_next_step_handler(
@@ -195,8 +169,7 @@ class UserFlow:
     def handle_card_number(self,message, db_user: models.User,db: Session = Dependency(get_db)):
         if db_user.user_id == message.from_user.id:
             try:
-                cleaned = re.sub(r"\D+", "", message.text.strip(),flags=re.UNICODE)
-                cleaned = convert_persian_numbers(cleaned)
+                cleaned = normalize_digits(message.text)
                 if not cleaned or len(cleaned) != 16:
                     msg = self.bot.reply_to(message, CUSER.Messages.INVALID_CARD_NUMBER)
                     self.bot.register_next_step_handler(msg, self.handle_card_number, db_user)
@@ -236,24 +209,13 @@ class UserFlow:
             db.commit()
             db.refresh(user_db)
 
-            keyboard = ReplyKeyboardMarkup(
-                resize_keyboard=True,
-                row_width=3,
-            )
-            buttons = (
-                KeyboardButton(CUSER.Buttons.SHOW_SESSIONS),
-                KeyboardButton(CUSER.Buttons.SHOW_PAYMENT_HISTORY),
-                KeyboardButton(CUSER.Buttons.SHOW_PROFILE),
-            )
-            for button in buttons:
-                keyboard.add(button)
             self.bot.send_message(
                 message.from_user.id, CUSER.Messages.SUCCESSFUL_REGISTRATION
             )
             self.bot.send_message(
                 message.from_user.id,
                 CUSER.Messages.WELLCOME_BACK,
-                reply_markup=keyboard,
+                reply_markup=keyboards.main_menu(),
             )
             first_message_data = self.user_boarding.get(message.from_user.id)
             if first_message_data:
@@ -263,27 +225,44 @@ class UserFlow:
                 self.user_boarding.pop(message.from_user.id, None)
 
     def session_date(self, call, db):
-        date_str = call.data.split(":")[-1]
-        date = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
-        sessions = (
-            db.query(models.Session).filter(models.Session.session_date == date).all()
-        )
-        jalali_date = Gregorian(date).persian_string()
+        """SESSION_DATE:[{venue_id}:]{date} - the day's sessions of a venue."""
+        parts = call.data.split(":")
+        date = datetime.datetime.strptime(parts[-1], "%Y-%m-%d").date()
+        venue = reference.venue(db, int(parts[1])) if len(parts) == 3 else None
+        query = db.query(models.Session).filter(models.Session.session_date == date)
+        if venue:
+            query = query.filter(models.Session.venue_id == venue.id)
+        sessions = query.order_by(models.Session.start_time).all()
+        jalali_date = persian_date(date)
         msg = f"*سانس های زمین برای {jalali_date}*\n"
+        if venue:
+            msg += f"{venue.name}\n"
         keyboard = InlineKeyboardMarkup()
         for s in sessions:
             if s.available:
                 btn_text = f"{s.time_slot} — رزرو کن"
-                callback_data = encode_json({
-                    "session_id": s.id,
-                    "session_date": date_str,
-                })
                 keyboard.add(
                     InlineKeyboardButton(
-                        btn_text, callback_data=f"BOOK:{callback_data}"
+                        btn_text,
+                        callback_data=callback_data(
+                            "BOOK:", BOOK_SESSION, session_id=s.id, session_date=date
+                        ),
                     )
                 )
-        keyboard.add(InlineKeyboardButton("بازگشت", callback_data="SHOW_SESSIONS"))
+            elif s.booked_user_id and s.booked_user_id != call.from_user.id:
+                # Translate: "{time} — join the waitlist"
+                keyboard.add(
+                    InlineKeyboardButton(
+                        f"{s.time_slot} — صف انتظار ⏳",
+                        callback_data=f"WAITLIST_JOIN:{s.id}",
+                    )
+                )
+        keyboard.add(
+            InlineKeyboardButton(
+                "بازگشت",
+                callback_data=f"SESSIONS_PAGE:{venue.id}:w0" if venue else "SHOW_SESSIONS",
+            )
+        )
         self.bot.edit_message_text(
             msg,
             chat_id=call.message.chat.id,
@@ -293,8 +272,15 @@ class UserFlow:
 
     def book_session(self, call, db):
         recive_data = call.data.split(":")[-1]
-        decoded_data = decode_json(recive_data)
-        
+        try:
+            decoded_data = BOOK_SESSION.decode(recive_data)
+        except InvalidCallbackData as e:
+            print(f"Rejected callback payload from {call.from_user.id}: {e}")
+            self.bot.answer_callback_query(
+                call.id, "This session is no longer available.", show_alert=True
+            )
+            return
+
         session = db.query(models.Session).filter_by(id=decoded_data.get("session_id")).first()
         if not session:
             self.bot.answer_callback_query(
@@ -304,27 +290,34 @@ class UserFlow:
         # Show cost and ask for confirmation
         user = db.query(models.User).filter_by(user_id=call.from_user.id).first()
         if user.is_verified == models.VerificationStatus.VERIFIED:
-            cost = int(
-                db.query(models.PaymentCategory)
-                .filter_by(account_type=user.account_type)
-                .first()
-                .session_cost
-            )
+            cost = reference.session_cost(db, user.account_type, session.venue_id)
         else:
             cost = int(session.cost)
+        day_name_en = day_name[session.session_date.weekday()]
+        day_name_fa = PERSIAN_DAY_NAMES.get(day_name_en, day_name_en)
+        # Sessions without a venue use the two-part SESSION_DATE:{date} form
+        venue_part = f"{session.venue_id}:" if session.venue_id is not None else ""
         markup = InlineKeyboardMarkup()
         markup.add(
             InlineKeyboardButton(
                 "تایید و پرداخت", callback_data=f"PAYMENT:{decoded_data.get('session_id')}"
             ),
             InlineKeyboardButton(
-                "بازگشت به پنل سانس ها", callback_data=f"SESSION_DATE:{decoded_data.get('session_date')}"
+                "بازگشت به پنل سانس ها", callback_data=f"SESSION_DATE:{venue_part}{decoded_data.get('session_date')}"
             ),
         )
-        day_name_en = day_name[session.session_date.weekday()]
-        day_name_fa = PERSIAN_DAY_NAMES.get(day_name_en, day_name_en)
+        # Translate: "Book every {weekday} at this time"
+        markup.row(
+            InlineKeyboardButton(
+                f"🔁 رزرو هفتگی (هر {day_name_fa})",
+                callback_data=f"SUBSCRIBE:{session.id}",
+            )
+        )
+        venue = reference.venue(db, session.venue_id)
         self.bot.edit_message_text(
-            f"اطلاعات سانس انتخابی روز {day_name_fa}:\n{Gregorian(session.session_date).persian_string()} {session.time_slot}\nمبلغ: {cost}تومان\nمی‌خواهید این سانس را رزرو کنید؟",
+            f"اطلاعات سانس انتخابی روز {day_name_fa}:\n"
+            + (f"{venue.name}\n" if venue else "")
+            + f"{persian_date(session.session_date)} {session.time_slot}\nمبلغ: {cost}تومان\nمی‌خواهید این سانس را رزرو کنید؟",
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
             reply_markup=markup,
@@ -334,47 +327,187 @@ class UserFlow:
         session_id = int(call.data.split(":")[-1])
         session = db.query(models.Session).filter_by(id=session_id).first()
         if session and session.available:
-            # Check if the user is verified
-            user = db.query(models.User).filter_by(user_id=call.from_user.id).first()
-            if user.is_verified == models.VerificationStatus.VERIFIED:
-                cost = int(
-                    db.query(models.PaymentCategory)
-                    .filter_by(account_type=user.account_type)
-                    .first()
-                    .session_cost
+            self._reserve_and_invoice(call, db, session)
+        else:
+            self.bot.answer_callback_query(
+                call.id, "This session is no longer available.", show_alert=True
+            )
+
+    def _reserve_and_invoice(self, call, db, session):
+        # Check if the user is verified
+        user = db.query(models.User).filter_by(user_id=call.from_user.id).first()
+        if user.is_verified == models.VerificationStatus.VERIFIED:
+            cost = reference.session_cost(db, user.account_type, session.venue_id)
+        else:
+            cost = int(session.cost)
+
+        # Create payment record
+        payment = models.Payment(
+            user_id=call.from_user.id,
+            session_id=session.id,
+            amount=cost,
+            payment_date=datetime.datetime.now(),
+        )
+        db.add(payment)
+        session.available = False
+        session.booked_user_id = call.from_user.id
+        db.commit()
+
+        # Send invoice to the user (this is a placeholder, actual implementation may vary)
+        admin_card_number = reference.admin_card_number(db)
+        self.bot.send_invoice(
+            call.from_user.id,
+            title="پرداخت هزینه سانس",
+            description=f"سانس: {persian_date(session.session_date)} {session.time_slot}",
+            provider_token=admin_card_number,
+            prices=[
+                LabeledPrice(label="هزینه سانس", amount=cost * 10)  # Amount in IRR
+            ],
+            currency="IRR",
+            invoice_payload=str(payment.id),
+        )
+
+    def subscribe(self, call, db):
+        """SUBSCRIBE:{session_id} - book this weekday and time slot every week."""
+        session_id = int(call.data.split(":")[-1])
+        session = db.query(models.Session).filter_by(id=session_id).first()
+        if not session or session.session_date < datetime.date.today():
+            self.bot.answer_callback_query(
+                call.id, "This session is no longer available.", show_alert=True
+            )
+            return
+        subscription, created = subscriptions.subscribe(
+            db,
+            call.from_user.id,
+            session.venue_id,
+            session.session_date.weekday(),
+            session.time_slot,
+            first_day=session.session_date,
+        )
+        if not created:
+            # Translate: "You already have this weekly booking."
+            self.bot.answer_callback_query(
+                call.id, "این رزرو هفتگی را از قبل دارید.", show_alert=True
+            )
+            return
+        # Book this session and the following weeks already generated
+        result = recurring.claim_and_invoice(
+            self.bot, db, subscription_ids=[subscription.id]
+        )
+        # Translate: "Weekly booking saved: n sessions booked, invoices sent; n were already taken."
+        msg = (
+            "✅ رزرو هفتگی ثبت شد.\n"
+            f"{convert_english_numbers(len(result.claims))} سانس برای شما رزرو و صورت‌حساب آن ارسال شد."
+        )
+        if result.conflicts:
+            msg += (
+                f"\n{convert_english_numbers(len(result.conflicts))} سانس قبلاً رزرو شده بود."
+            )
+        self.bot.answer_callback_query(call.id, msg, show_alert=True)
+
+    def subscriptions(self, message, db, call=None):
+        """The user's weekly bookings with their status."""
+        if call:
+            user_id = call.from_user.id
+            chat_id = call.message.chat.id
+        else:
+            user_id = message.from_user.id
+            chat_id = message.chat.id
+        active = subscriptions.for_user(db, user_id)
+        if not active:
+            # Translate: "You have no weekly bookings. Use the weekly button when booking a session."
+            text = (
+                "رزرو هفتگی ندارید. هنگام رزرو سانس، دکمه «رزرو هفتگی» را بزنید."
+            )
+            if call:
+                self.bot.edit_message_text(
+                    text, chat_id=chat_id, message_id=call.message.message_id
                 )
             else:
-                cost = int(session.cost)
-
-            # Create payment record
-            payment = models.Payment(
-                user_id=call.from_user.id,
-                session_id=session_id,
-                amount=cost,
-                payment_date=datetime.datetime.now(),
-            )
-            db.add(payment)
-            session.available = False
-            session.booked_user_id = call.from_user.id
-            db.commit()
+                self.bot.send_message(chat_id, text)
+            return
+        msg = "*رزروهای هفتگی*\n"
+        keyboard = InlineKeyboardMarkup()
+
+        def venue_suffix(venue_id):
+            venue = reference.venue(db, venue_id)
+            return f" - {venue.name}" if venue else ""
 
-            # Send invoice to the user (this is a placeholder, actual implementation may vary)
-            admin_card_number = db.query(models.User).filter_by(role=models.UserRole.ADMIN).first().card_number
-            self.bot.send_invoice(
-                call.from_user.id,
-                title="پرداخت هزینه سانس",
-                description=f"سانس: {Gregorian(session.session_date).persian_string()} {session.time_slot}",
-                provider_token=admin_card_number,
-                prices=[
-                    LabeledPrice(label="هزینه سانس", amount=cost * 10)  # Amount in IRR
-                ],
-                currency="IRR",
-                invoice_payload=str(payment.id),
+        for subscription in active:
+            day_name_en = day_name[subscription.weekday]
+            day_name_fa = PERSIAN_DAY_NAMES.get(day_name_en, day_name_en)
+            # Translate: "every {weekday} {time}: booked n, conflicts n (last on {date})"
+            msg += (
+                f"\n🔁 هر {day_name_fa} {subscription.time_slot}"
+                f"{venue_suffix(subscription.venue_id)}\n"
+                f"رزرو شده: {convert_english_numbers(subscription.booked)}"
+            )
+            if subscription.last_booked_date:
+                msg += f" (آخرین: {persian_date(subscription.last_booked_date)})"
+            msg += f"\nتداخل: {convert_english_numbers(subscription.conflicts)}"
+            if subscription.last_conflict_date:
+                msg += f" (آخرین: {persian_date(subscription.last_conflict_date)})"
+            msg += "\n"
+            # Translate: "Cancel every {weekday} {time}"
+            keyboard.row(
+                InlineKeyboardButton(
+                    f"❌ لغو هر {day_name_fa} {subscription.time_slot}",
+                    callback_data=f"SUBSCRIPTION_CANCEL:{subscription.id}",
+                )
+            )
+        if call:
+            self.bot.edit_message_text(
+                msg,
+                chat_id=chat_id,
+                message_id=call.message.message_id,
+                reply_markup=keyboard,
             )
         else:
+            self.bot.send_message(chat_id, msg, reply_markup=keyboard)
+
+    def cancel_subscription(self, call, db):
+        """SUBSCRIPTION_CANCEL:{id} - stop booking new weeks."""
+        subscription_id = int(call.data.split(":")[-1])
+        if subscriptions.cancel(db, subscription_id, call.from_user.id):
+            # Translate: "Weekly booking cancelled; sessions already booked are kept."
+            self.bot.answer_callback_query(
+                call.id, "رزرو هفتگی لغو شد. سانس‌های رزرو شده باقی می‌مانند."
+            )
+        self.subscriptions(None, db, call)
+
+    def join_waitlist(self, call, db):
+        """WAITLIST_JOIN:{session_id} - queue for a booked session."""
+        session_id = int(call.data.split(":")[-1])
+        session = db.query(models.Session).filter_by(id=session_id).first()
+        if not session or session.session_date < datetime.date.today():
             self.bot.answer_callback_query(
                 call.id, "This session is no longer available.", show_alert=True
             )
+            return
+        if session.booked_user_id == call.from_user.id:
+            # Translate: "You have booked this session."
+            self.bot.answer_callback_query(call.id, "این سانس را خودتان رزرو کرده‌اید.")
+            return
+        position = waitlist.join(db, session_id, call.from_user.id)
+        # Translate: "You are number n on the waitlist; we will message you if it frees up."
+        self.bot.answer_callback_query(
+            call.id,
+            f"شما نفر {convert_english_numbers(position)} صف انتظار این سانس هستید. "
+            "در صورت آزاد شدن به شما اطلاع می‌دهیم.",
+            show_alert=True,
+        )
+
+    def claim_waitlist(self, call, db):
+        """WAITLIST_CLAIM:{entry_id} - take the offered session within its window."""
+        entry_id = int(call.data.split(":")[-1])
+        session = waitlist.claim(db, entry_id, call.from_user.id)
+        if session is None:
+            # Translate: "This offer has expired."
+            self.bot.answer_callback_query(
+                call.id, "مهلت رزرو این سانس به پایان رسیده است.", show_alert=True
+            )
+            return
+        self._reserve_and_invoice(call, db, session)
 
     @inject
     def pre_checkout_query(self, pre_checkout_query, db: Session = Dependency(get_db)):
@@ -382,12 +515,26 @@ class UserFlow:
         # You can add validation logic here if needed
         try:
             # Get payment details from payload
-            payment_id = pre_checkout_query.invoice_payload
+            payload = pre_checkout_query.invoice_payload
+            payment_id = cancellations.payment_id_from_payload(payload)
             payment = db.query(models.Payment).filter_by(id=payment_id).first()
 
-            if payment:
+            if (
+                payment
+                and not payload.startswith(cancellations.REFUND_PAYLOAD)
+                and payment.session.booked_user_id != payment.user_id
+            ):
+                # The unpaid hold expired and the session went to someone else
+                self.bot.answer_pre_checkout_query(
+                    pre_checkout_query.id,
+                    ok=False,
+                    error_message="This session is no longer reserved for you.",
+                )
+            elif payment:
                 # Accept the pre-checkout query
+                old_status = payment.verified
                 payment.verified = models.VerificationStatus.PENDING
+                ledger.record_status_change(db, payment, old_status)
                 db.commit()
                 db.refresh(payment)
                 self.bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
@@ -414,8 +561,10 @@ class UserFlow:
         payment = db.query(models.Payment).filter_by(id=payment_id).first()
         if payment:
             # Update payment status
+            old_status = payment.verified
             payment.verified = models.VerificationStatus.VERIFIED
             payment.shipping_option_id = message.successful_payment.shipping_option_id
+            ledger.record_status_change(db, payment, old_status)
 
             db.commit()
             db.refresh(payment)
@@ -429,46 +578,44 @@ class UserFlow:
                 "⏳ در حال ایجاد سانس‌ها برای ۳۰ روز آینده...",
             )
         # get user all payment and send him pdf version of exel file
-        payments = db.query(models.Payment).filter_by(user_id=call.from_user.id).all()
+        payments = queries.user_payment_report_rows(db, call.from_user.id)
         if not payments:
             self.bot.send_message(call.message.chat.id, "No payment history found.")
             return
-        # Create a DataFrame from payment data
-        payment_data = []
-        for payment in payments:
-            # Get session details for this payment
-            session = db.query(models.Session).filter_by(id=payment.session_id).first()
-
-            # Format date for better readability
-            payment_date = payment.payment_date.date()
-            persian_amount = convert_english_numbers(payment.amount)
-            payment_data.append(
-                {
-                    "شماره پیگیری": payment.shipping_option_id,
-                    "تاریخ پرداخت": Gregorian(payment_date).persian_string(),
-                    "تاریخ سانس": Gregorian(session.session_date).persian_string(),
-                    "زمان سانس": session.time_slot if session else "N/A",
-                    "مبلغ پرداختی": f"{persian_amount}تومان",
-                }
-            )
-
-        # Create Excel file in memory
-        output_excel = BytesIO()
-        df = pd.DataFrame(payment_data)
-        df.to_excel(output_excel, index=False)
-        output_excel.seek(0)
+        # Same payments, same file: built and uploaded only when they change
+        rows_key = repr(
+            [
+                (
+                    p.id,
+                    p.payment_date,
+                    p.amount,
+                    p.shipping_option_id,
+                    (p.session.session_date, p.session.time_slot) if p.session else None,
+                )
+                for p in payments
+            ]
+        )
+
+        def build_report():
+            # pandas is only loaded once a report actually has to be built
+            from utils import reporting
+
+            return reporting.user_payment_report(payments)
 
         # Send the Excel file
-        file_date = Gregorian(datetime.datetime.now().date()).persian_string()
+        file_date = persian_date(datetime.datetime.now().date())
         final_msg = f"✅ گزارش با موفقیت ایجاد شد"
         self.bot.edit_message_text(
             final_msg,
             call.message.chat.id,
             generating_msg.message_id,
         )
-        self.bot.send_document(
+        media.send_document(
+            self.bot,
+            db,
             call.message.chat.id,
-            output_excel,
+            build_report,
+            key=rows_key,
             visible_file_name=f"تاریخچه پرداخت [{file_date}].xlsx",
             caption="تاریخچه پرداخت های شما",
         )
@@ -516,21 +663,21 @@ class UserFlow:
         return
     def payment_details(self,call,db):
         payment_id = call.data.split(":")[-1]
-        payment = db.query(models.Payment).filter_by(id=payment_id).first()
+        payment = queries.payment_with_session(db, payment_id)
         if not payment:
             self.bot.answer_callback_query(
                 call.id, "This payment is no longer available.", show_alert=True
             )
             return
-        session = db.query(models.Session).filter_by(id=payment.session_id).first()
+        session = payment.session
         if not session:
             self.bot.answer_callback_query(
                 call.id, "This session is no longer available.", show_alert=True
             )
             return
         # print(type(payment.payment_date))
-        payment_date =Gregorian(payment.payment_date.date()).persian_string()
-        session_date = Gregorian(session.session_date).persian_string()
+        payment_date =persian_date(payment.payment_date.date())
+        session_date = persian_date(session.session_date)
         amount = convert_english_numbers(payment.amount)
         msg = "جزئیات پرداخت\n"
         msg += f"شماره پیگیری: {payment.shipping_option_id}\n"
@@ -568,51 +715,24 @@ class UserFlow:
                     "برای استفاده از ربات باید ابتدا ثبت نام کنید. برای ثبت نام از دستور /start استفاده کنید.",
                 )
             return
-        today = datetime.date.today()
-        dates = [today + datetime.timedelta(days=i) for i in range(3)]
-        sessions = (
-            db.query(models.Session)
-            .filter(models.Session.session_date.in_(dates))
-            .all()
-        )
-        if not sessions:
-            if call:
-                self.bot.edit_message_text(
-                    "برای سه روز آینده سانسی برای زمین وجود ندارد",
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                )
-            else:
-                self.bot.send_message(
-                    message.chat.id, "برای سه روز آینده سانسی برای زمین وجود ندارد"
-                )
-            return
-        sessions_by_date = {}
-        for s in sessions:
-            date_key = s.session_date
-            if date_key not in sessions_by_date:
-                sessions_by_date[date_key] = []
-            sessions_by_date[date_key].append(s)
-
-        msg = "*سانس های زمین*\n"
-        keyboard = InlineKeyboardMarkup()
-        # Iterate through dates in order
-        for date in sorted(sessions_by_date.keys()):
-            # Get day name in Persian
-            day_name_en = day_name[date.weekday()]
-            day_name_fa = PERSIAN_DAY_NAMES.get(day_name_en, day_name_en)
-
-            # Add day header
-            keyboard.row(
-                InlineKeyboardButton(
-                    f"{day_name_fa}", callback_data=f"SESSION_DATE:{date}"
+        venues = reference.venues(db)
+        if len(venues) > 1:
+            # Translate: "Choose a pitch"
+            msg = "*زمین مورد نظر را انتخاب کنید*"
+            keyboard = InlineKeyboardMarkup()
+            for venue in venues:
+                keyboard.row(
+                    InlineKeyboardButton(
+                        venue.name, callback_data=f"SESSIONS_PAGE:{venue.id}:w0"
+                    )
                 )
+        else:
+            msg, keyboard = self.calendar.week(
+                db,
+                0,
+                datetime.date.today(),
+                venue_id=venues[0].id if venues else None,
             )
-        keyboard.add(
-            InlineKeyboardButton(
-                "🔃 بازنشانی", callback_data="SHOW_SESSIONS"
-            )
-        )
         if call:
             self.bot.edit_message_text(
                 msg,
@@ -624,8 +744,18 @@ class UserFlow:
             self.bot.send_message(message.chat.id, msg, reply_markup=keyboard)
         return
 
+    def sessions_page(self, call, db):
+        """SESSIONS_PAGE:{venue_id}:{w<n>|m<year>-<month>} - browse the session calendar."""
+        msg, keyboard = self.calendar.page(db, call.data.split(":", 1)[1])
+        self.bot.edit_message_text(
+            msg,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=keyboard,
+        )
+
     def show_profile(self, message, db):
-        user_db = db.query(models.User).filter_by(user_id=message.from_user.id).first()
+        user_db, summary = queries.user_with_summary(db, message.from_user.id)
         if not user_db:
             self.bot.send_message(
                 message.chat.id,
@@ -651,9 +781,24 @@ class UserFlow:
             f"وضعیت: {status[user_db.is_verified]}\n"
             # f"تاریخ ثبت نام: {user_db.created_at}\n"
         )
+        if summary:
+            msg += self._payment_summary_text(summary)
         self.bot.send_message(message.chat.id, msg, parse_mode="Markdown")
         return
 
+    @staticmethod
+    def _payment_summary_text(summary):
+        # Translate: "Successful payments / Total paid / Last payment / Pending"
+        msg = (
+            f"تعداد پرداخت‌های موفق: {convert_english_numbers(summary.payment_count)}\n"
+            f"مجموع پرداختی: {convert_english_numbers(summary.total_paid)} تومان\n"
+        )
+        if summary.last_payment_date:
+            msg += f"آخرین پرداخت: {persian_date(summary.last_payment_date.date())}\n"
+        if summary.pending_count:
+            msg += f"در انتظار تایید: {convert_english_numbers(summary.pending_count)}\n"
+        return msg
+
     def payment_history(self, message, db,call=None):
         if call:
             user_id = call.from_user.id
@@ -663,17 +808,19 @@ class UserFlow:
             user_id = message.from_user.id
             message_id = message.message_id
             chat_id = message.chat.id
-        user_db = db.query(models.User).filter_by(user_id=user_id).first()
+        user_db, summary = queries.user_with_summary(db, user_id)
         if not user_db:
             self.bot.send_message(
                 chat_id, "You need to register first. Use /start."
             )
             return
-        payments = db.query(models.Payment).filter_by(user_id=user_id).first()
-        if not payments:
-            self.bot.send_message(chat_id, "تاریخچه پرداختی برای شما وجود ندارد")
-            return
-        msg = "*تاریخچه پرداخت*\n"
+        if not summary:
+            if not ledger.has_payments(db, user_id):
+                self.bot.send_message(chat_id, "تاریخچه پرداختی برای شما وجود ندارد")
+                return
+            # Only unpaid (REJECTED) payments, which have no summary row yet
+            summary = ledger.empty_summary(user_id)
+        msg = "*تاریخچه پرداخت*\n" + self._payment_summary_text(summary)
         keyboard = InlineKeyboardMarkup()
         keyboard.row(
             InlineKeyboardButton(
@@ -1,64 +1,64 @@
-import json
-import zlib
-import base64
+import datetime
+import re
+from functools import lru_cache
+
+from utils.jalali import Gregorian
+
+
+PERSIAN_DIGITS = "۰۱۲۳۴۵۶۷۸۹"
+ARABIC_DIGITS = "٠١٢٣٤٥٦٧٨٩"
+ENGLISH_DIGITS = "0123456789"
+
+# Prebuilt translation tables, one pass over the string instead of one
+# str.replace per digit.
+PERSIAN_TO_ENGLISH = str.maketrans(
+    PERSIAN_DIGITS + ARABIC_DIGITS, ENGLISH_DIGITS * 2
+)
+ENGLISH_TO_PERSIAN = str.maketrans(ENGLISH_DIGITS, PERSIAN_DIGITS)
+
+_NON_DIGITS = re.compile(r"[^0-9]+")
 
 
 def convert_persian_numbers(input_text):
-    persian_to_english = {
-        "۰": "0",
-        "۱": "1",
-        "۲": "2",
-        "۳": "3",
-        "۴": "4",
-        "۵": "5",
-        "۶": "6",
-        "۷": "7",
-        "۸": "8",
-        "۹": "9",
-        "٠": "0",
-        "١": "1",
-        "٢": "2",
-        "٣": "3",
-        "٤": "4",
-        "٥": "5",
-        "٦": "6",
-        "٧": "7",
-        "٨": "8",
-        "٩": "9",
-    }
-
-    cleaned = input_text
-    for persian, english in persian_to_english.items():
-        cleaned = cleaned.replace(persian, english)
-    return cleaned
+    return str(input_text).translate(PERSIAN_TO_ENGLISH)
+
 
 def convert_english_numbers(input_text):
-    english_to_persian = {
-        "0": "۰",
-        "1": "۱",
-        "2": "۲",
-        "3": "۳",
-        "4": "۴",
-        "5": "۵",
-        "6": "۶",
-        "7": "۷",
-        "8": "۸",
-        "9": "۹",
-    }
-    cleaned = str(input_text)
-    for english, persian in english_to_persian.items():
-        cleaned = cleaned.replace(english, persian)
-    return cleaned
-
-# Encode: JSON → string → bytes → compressed → base64
-def encode_json(data):
-    json_str = json.dumps(data)
-    compressed = zlib.compress(json_str.encode('utf-8'))
-    encoded = base64.urlsafe_b64encode(compressed).decode('utf-8')
-    return encoded
-
-# Decode: base64 → compressed → bytes → string → JSON
-def decode_json(encoded_str):
-    compressed = base64.urlsafe_b64decode(encoded_str.encode('utf-8'))
-    json_str = zlib.decompress(compressed).decode('utf-8')
-    return json.loads(json_str)
\ No newline at end of file
+    return str(input_text).translate(ENGLISH_TO_PERSIAN)
+
+
+def _translate_many(values, table):
+    # pandas Series (or Index) expose a vectorized .str accessor once cast
+    if hasattr(values, "dtype") and hasattr(values, "astype"):
+        strings = values.astype(str)
+        if hasattr(strings, "str"):
+            return strings.str.translate(table)
+    return [str(value).translate(table) for value in values]
+
+
+def convert_persian_numbers_many(values):
+    """Bulk variant of convert_persian_numbers for lists or pandas Series."""
+    return _translate_many(values, PERSIAN_TO_ENGLISH)
+
+
+def convert_english_numbers_many(values):
+    """Bulk variant of convert_english_numbers for lists or pandas Series."""
+    return _translate_many(values, ENGLISH_TO_PERSIAN)
+
+
+def normalize_digits(input_text):
+    """Convert Persian/Arabic numerals to ASCII and drop everything else."""
+    return _NON_DIGITS.sub("", str(input_text).translate(PERSIAN_TO_ENGLISH))
+
+
+@lru_cache(maxsize=4096)
+def persian_date(date: datetime.date) -> str:
+    """Cached Gregorian(date).persian_string(); session dates repeat a lot."""
+    return Gregorian(date).persian_string()
+
+
+def warm_persian_dates(days: int = 60) -> None:
+    """Fill the persian_date cache for the booking window around today."""
+    today = datetime.date.today()
+    for offset in range(-days, days + 1):
+        persian_date(today + datetime.timedelta(days=offset))
@@ -0,0 +1,145 @@
+"""
+Broadcast engine.
+
+Sends a ``Broadcast`` to its audience through the rate-limited sender
+without blocking the dispatcher: recipients are paged in from the
+database as the sender drains them, delivery results are written back in
+batches, and the admin's progress message shows the count and the
+throughput. ``resume_unfinished`` restarts broadcasts interrupted by a
+restart; recipients still pending are sent again, so a message that was
+in flight during a crash may be delivered twice.
+"""
+
+import logging
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from repositories import broadcasts, models
+from repositories.database import SessionLocal
+from utility import convert_english_numbers
+from utils.sender import Progress, sender
+
+logger = logging.getLogger("broadcast")
+
+# Results buffered before they are written
+RESULT_BATCH = 200
+
+
+class BroadcastRun:
+    def __init__(self, bot, broadcast_id: int):
+        self.bot = bot
+        self.broadcast_id = broadcast_id
+        self._results: List[Tuple[int, Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def _recipients(self, broadcast: models.Broadcast) -> Iterator[int]:
+        db = SessionLocal()
+        try:
+            broadcast = db.merge(broadcast, load=False)
+            after = 0
+            while True:
+                page = broadcasts.pending_page(db, self.broadcast_id, after)
+                if not page:
+                    if not broadcasts.materialize_page(db, broadcast):
+                        return
+                    continue
+                after = page[-1]
+                yield from page
+        finally:
+            db.close()
+
+    def _jobs(self, broadcast: models.Broadcast):
+        text = broadcast.text
+        for user_id in self._recipients(broadcast):
+            yield user_id, lambda user_id=user_id: self.bot.send_message(user_id, text)
+
+    def _flush(self) -> None:
+        with self._lock:
+            results, self._results = self._results, []
+        if not results:
+            return
+        db = SessionLocal()
+        try:
+            broadcasts.record_results(db, self.broadcast_id, results)
+        except Exception as e:
+            db.rollback()
+            print(f"Error recording broadcast {self.broadcast_id} results: {e}")
+        finally:
+            db.close()
+
+    def _on_result(self, user_id, result, error) -> None:
+        with self._lock:
+            self._results.append((user_id, None if error is None else str(error)))
+            full = len(self._results) >= RESULT_BATCH
+        if full:
+            self._flush()
+
+    def _report(self, broadcast: models.Broadcast, progress: Progress) -> None:
+        if progress.done:
+            self._flush()
+            db = SessionLocal()
+            try:
+                finished = broadcasts.finish(db, self.broadcast_id)
+                sent, failed, total = finished.sent, finished.failed, finished.total
+            finally:
+                db.close()
+            logger.info(
+                "broadcast %s done: %s sent, %s failed, %.1f msg/s",
+                self.broadcast_id,
+                sent,
+                failed,
+                progress.per_second,
+            )
+        else:
+            # Counts recorded before a resume plus this run's
+            sent = broadcast.sent + progress.sent
+            failed = broadcast.failed + progress.failed
+            total = broadcast.total
+        if not broadcast.progress_chat_id:
+            return
+        # Translate: "Broadcast: sent/total, failed: n, speed: x msg/s"
+        text = (
+            f"{'✅' if progress.done else '⏳'} پیام همگانی: "
+            f"{convert_english_numbers(sent)}/{convert_english_numbers(total or 0)}"
+            f" | ناموفق: {convert_english_numbers(failed)}"
+            f" | سرعت: {convert_english_numbers(round(progress.per_second, 1))} پیام در ثانیه"
+        )
+        self.bot.edit_message_text(
+            text,
+            chat_id=broadcast.progress_chat_id,
+            message_id=broadcast.progress_message_id,
+        )
+
+    def start(self) -> Optional[Progress]:
+        db = SessionLocal()
+        try:
+            broadcast = db.get(models.Broadcast, self.broadcast_id)
+            if broadcast is None or broadcast.status == models.BroadcastStatus.DONE:
+                return None
+            db.expunge(broadcast)
+        finally:
+            db.close()
+        return sender.send_all(
+            self._jobs(broadcast),
+            total=broadcast.total,
+            on_result=self._on_result,
+            on_progress=lambda progress: self._report(broadcast, progress),
+            progress_interval=5.0,
+        )
+
+
+def start(bot, broadcast_id: int) -> Optional[Progress]:
+    return BroadcastRun(bot, broadcast_id).start()
+
+
+def resume_unfinished(bot) -> int:
+    """Restart the broadcasts still running when the bot stopped."""
+    db = SessionLocal()
+    try:
+        broadcast_ids = broadcasts.unfinished(db)
+    finally:
+        db.close()
+    for broadcast_id in broadcast_ids:
+        logger.info("resuming broadcast %s", broadcast_id)
+        start(bot, broadcast_id)
+    return len(broadcast_ids)
@@ -0,0 +1,212 @@
+"""
+Compact, signed callback_data payloads.
+
+Telegram limits ``callback_data`` to 64 bytes. Payloads are packed with a
+fixed schema (``struct``), prefixed with a version and schema id and tagged
+with a truncated HMAC so users cannot forge values such as ``user_id``:
+
+    base64url( version | schema_id | packed fields | hmac[:TAG_SIZE] )
+"""
+
+import base64
+import datetime
+import hashlib
+import hmac
+import os
+import struct
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+CALLBACK_DATA_LIMIT = 64
+VERSION = 1
+TAG_SIZE = 8
+
+_HEADER = struct.Struct(">BB")
+_EPOCH = datetime.date(2000, 1, 1)
+_EPOCH_DATETIME = datetime.datetime(2000, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# field kind -> (struct code, to wire, from wire)
+_KINDS = {
+    "u8": ("B", int, int),
+    "u16": ("H", int, int),
+    "u32": ("I", int, int),
+    "i64": ("q", int, int),
+    "datetime": (
+        "q",
+        lambda value: (value - _EPOCH_DATETIME) // _MICROSECOND,
+        lambda value: _EPOCH_DATETIME + value * _MICROSECOND,
+    ),
+    "uuid": (
+        "16s",
+        lambda value: uuid.UUID(str(value)).bytes,
+        lambda value: str(uuid.UUID(bytes=value)),
+    ),
+    "date": (
+        "H",
+        lambda value: (_as_date(value) - _EPOCH).days,
+        lambda value: _EPOCH + datetime.timedelta(days=value),
+    ),
+}
+
+_mac: Optional["hmac.HMAC"] = None
+
+
+class InvalidCallbackData(ValueError):
+    """Raised when a payload is malformed, of an unknown version or forged."""
+
+
+class CallbackDataTooLong(ValueError):
+    """Raised when an encoded payload does not fit in callback_data."""
+
+
+def _as_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def signing_key() -> bytes:
+    """
+    The HMAC key: CALLBACK_SECRET, else BOT_TOKEN.
+
+    A key generated per process would invalidate every button already sent
+    on each restart and differ between workers, so a missing secret is an
+    error. Called at startup to fail early.
+    """
+    configured = os.getenv("CALLBACK_SECRET") or os.getenv("BOT_TOKEN")
+    if not configured:
+        raise RuntimeError(
+            "CALLBACK_SECRET (or BOT_TOKEN) must be set to sign callback_data"
+        )
+    return configured.encode()
+
+
+def _sign(body: bytes) -> bytes:
+    # The key is resolved lazily: .env is loaded after the flows are imported.
+    global _mac
+    if _mac is None:
+        _mac = hmac.new(signing_key(), digestmod=hashlib.sha256)
+    mac = _mac.copy()
+    mac.update(body)
+    return mac.digest()[:TAG_SIZE]
+
+
+class Schema:
+    """A fixed layout of named fields for one kind of callback payload."""
+
+    def __init__(self, schema_id: int, *fields: Tuple[str, str]):
+        self.schema_id = schema_id
+        self.fields = fields
+        self._struct = struct.Struct(
+            ">" + "".join(_KINDS[kind][0] for _, kind in fields)
+        )
+
+    def encode(self, **values: Any) -> str:
+        packed = self._struct.pack(
+            *(_KINDS[kind][1](values[name]) for name, kind in self.fields)
+        )
+        body = _HEADER.pack(VERSION, self.schema_id) + packed
+        return base64.urlsafe_b64encode(body + _sign(body)).rstrip(b"=").decode()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError) as e:
+            raise InvalidCallbackData(f"Malformed callback payload: {e}")
+        body, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+        if len(body) != _HEADER.size + self._struct.size:
+            raise InvalidCallbackData("Unexpected callback payload length")
+        version, schema_id = _HEADER.unpack_from(body)
+        if version != VERSION or schema_id != self.schema_id:
+            raise InvalidCallbackData(
+                f"Unexpected payload version/schema {version}/{schema_id}"
+            )
+        if not hmac.compare_digest(tag, _sign(body)):
+            raise InvalidCallbackData("Callback payload signature mismatch")
+        values = self._struct.unpack_from(body, _HEADER.size)
+        return {
+            name: _KINDS[kind][2](value)
+            for (name, kind), value in zip(self.fields, values)
+        }
+
+    @property
+    def encoded_size(self) -> int:
+        """Length of every token produced by this schema."""
+        raw = _HEADER.size + self._struct.size + TAG_SIZE
+        return (raw * 4 + 2) // 3
+
+
+def callback_data(prefix: str, schema: Schema, **values: Any) -> str:
+    """Build ``prefix + token`` and guarantee it fits Telegram's limit."""
+    data = prefix + schema.encode(**values)
+    if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+        raise CallbackDataTooLong(
+            f"callback_data for {prefix!r} is {len(data)} bytes "
+            f"(limit {CALLBACK_DATA_LIMIT})"
+        )
+    return data
+
+
+# Payload schemas used by the flows. Ids must never be reused.
+BOOK_SESSION = Schema(1, ("session_id", "u32"), ("session_date", "date"))
+# page_start is the keyset cursor of the users page the admin came from.
+USERS_PAGE = Schema(4, ("page", "u16"), ("user_id", "i64"), ("direction", "u8"))
+ADMIN_USER = Schema(5, ("page", "u16"), ("page_start", "i64"), ("user_id", "i64"))
+ADMIN_USER_LIST = Schema(
+    6,
+    ("from_page", "u16"),
+    ("page_start", "i64"),
+    ("user_id", "i64"),
+    ("page", "u16"),
+)
+# Schema 7 (payments page with a datetime + UUID cursor) is retired: it
+# never fit in callback_data. The first page carries the user; later pages
+# only the boundary payment, whose date and user are looked up with it.
+ADMIN_USER_PAYMENTS_FIRST = Schema(
+    11, ("from_page", "u16"), ("page_start", "i64"), ("user_id", "i64")
+)
+ADMIN_USER_PAYMENTS = Schema(
+    12,
+    ("from_page", "u16"),
+    ("page_start", "i64"),
+    ("page", "u16"),
+    ("direction", "u8"),
+    ("payment_id", "uuid"),
+)
+ADMIN_USER_BOOKINGS = Schema(
+    8,
+    ("from_page", "u16"),
+    ("page_start", "i64"),
+    ("user_id", "i64"),
+    ("page", "u16"),
+    ("direction", "u8"),
+    ("session_date", "date"),
+    ("session_id", "u32"),
+)
+# Whole days to close; both ends inclusive. The confirmation has its own id
+# so a token from the day list cannot be replayed as the confirmation.
+CANCEL_DAYS = Schema(9, ("start", "date"), ("end", "date"))
+CANCEL_CONFIRM = Schema(10, ("start", "date"), ("end", "date"))
+
+# Prefixes whose payloads always fit in callback_data.
+ROUTES = {
+    "BOOK:": BOOK_SESSION,
+    "ADMIN_VIEW_USERS_PAGE:": USERS_PAGE,
+    "ADMIN_VIEW_USER:": ADMIN_USER,
+    "ADMIN_USER_VERIFY:": ADMIN_USER_LIST,
+    "ADMIN_BOOKED:": ADMIN_USER_BOOKINGS,
+    "ADMIN_VIEW_USER_PAYMENTS:": ADMIN_USER_PAYMENTS_FIRST,
+    "ADMIN_PAID:": ADMIN_USER_PAYMENTS,
+    "ADMIN_CANCEL_DAYS:": CANCEL_DAYS,
+    "ADMIN_CANCEL_CONFIRM:": CANCEL_CONFIRM,
+}
+
+for _prefix, _schema in ROUTES.items():
+    if len(_prefix) + _schema.encoded_size > CALLBACK_DATA_LIMIT:
+        raise CallbackDataTooLong(
+            f"callback_data for {_prefix!r} is {len(_prefix) + _schema.encoded_size}"
+            f" bytes (limit {CALLBACK_DATA_LIMIT})"
+        )
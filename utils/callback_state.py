@@ -0,0 +1,146 @@
+"""
+Server-side storage for callback contexts.
+
+Instead of carrying a navigation context in ``callback_data`` the flow can
+store it here and put a short random token on the button. Tokens start with
+``STATE_MARK`` which never appears in base64url output, so both kinds of
+payload can share a route.
+
+Token mode is enabled with ``CALLBACK_STATE_MODE=token``; otherwise the
+store is only used for contexts that do not fit in ``callback_data``.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.callback import (
+    CallbackDataTooLong,
+    InvalidCallbackData,
+    Schema,
+    callback_data,
+)
+
+STATE_MARK = "~"
+
+
+class CallbackStateStore:
+    """A thread-safe LRU of callback contexts with a per-entry TTL."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: int = 50_000,
+        purge_every: int = 1000,
+    ):
+        # None: CALLBACK_STATE_TTL (default 3600), read on first use
+        self._ttl = ttl
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._puts = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @property
+    def ttl(self) -> float:
+        # Resolved lazily: .env is loaded after the flows are imported.
+        if self._ttl is None:
+            self._ttl = float(os.getenv("CALLBACK_STATE_TTL", 3600))
+        return self._ttl
+
+    @ttl.setter
+    def ttl(self, value: float) -> None:
+        self._ttl = value
+
+    def put(self, schema_id: int, context: Dict[str, Any]) -> str:
+        token = secrets.token_urlsafe(9)
+        with self._lock:
+            self._entries[token] = (
+                time.monotonic() + self.ttl,
+                schema_id,
+                dict(context),
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            self._puts += 1
+            purge = self._puts % self.purge_every == 0
+        if purge:
+            # Bulk expiry, amortized over writes.
+            self.purge_expired()
+        return token
+
+    def get(self, schema_id: int, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] != schema_id:
+                self.misses += 1
+                return None
+            expires_at, _, context = entry
+            if expires_at < time.monotonic():
+                del self._entries[token]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return dict(context)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                token
+                for token, (expires_at, _, _) in self._entries.items()
+                if expires_at < now
+            ]
+            for token in stale:
+                del self._entries[token]
+            self.expired += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+store = CallbackStateStore()
+
+
+def token_mode() -> bool:
+    return os.getenv("CALLBACK_STATE_MODE", "").lower() == "token"
+
+
+def pack_callback(prefix: str, schema: Schema, **values: Any) -> str:
+    """Build callback_data, storing the context server-side when needed."""
+    if not token_mode():
+        try:
+            return callback_data(prefix, schema, **values)
+        except CallbackDataTooLong:
+            pass
+    return prefix + STATE_MARK + store.put(schema.schema_id, values)
+
+
+def unpack_callback(schema: Schema, payload: str) -> Dict[str, Any]:
+    """Inverse of pack_callback; raises InvalidCallbackData on a bad token."""
+    if payload.startswith(STATE_MARK):
+        context = store.get(schema.schema_id, payload[len(STATE_MARK):])
+        if context is None:
+            raise InvalidCallbackData("Unknown or expired callback state token")
+        return context
+    return schema.decode(payload)
@@ -0,0 +1,137 @@
+"""
+Send documents by reference once Telegram has them.
+
+Every uploaded document is remembered in ``media_files`` as
+content hash -> Bot API ``file_id``; sending the same content again (a
+cached report, a static asset such as a rules PDF or price list) passes
+the ``file_id`` instead of uploading the bytes. The hash covers the
+visible file name too, since a file sent by ``file_id`` keeps the name it
+was uploaded with.
+
+``send_document`` accepts bytes, a file-like object, a path, or a
+callable returning one of these. With a callable and a ``key`` describing
+the content (e.g. the report rows), the file is only built on a miss.
+"""
+
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Union
+
+from sqlalchemy.exc import IntegrityError
+from telebot.apihelper import ApiTelegramException
+
+from repositories import models
+
+Document = Union[bytes, str, "os.PathLike", object]
+
+# Hashes already looked up in this process, so repeated sends skip the DB
+_file_ids: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _digest(name: Optional[str], chunks) -> str:
+    digest = hashlib.sha256((name or "").encode("utf-8") + b"\0")
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=256)
+def _path_hash(path: str, name: Optional[str], mtime_ns: int, size: int) -> str:
+    # Keyed on mtime and size, so static assets are hashed once per change
+    with open(path, "rb") as source:
+        return _digest(name, iter(lambda: source.read(1 << 20), b""))
+
+
+def _read(document) -> bytes:
+    if isinstance(document, bytes):
+        return document
+    if hasattr(document, "getvalue"):
+        return document.getvalue()
+    if hasattr(document, "read"):
+        document.seek(0)
+        return document.read()
+    with open(document, "rb") as source:
+        return source.read()
+
+
+def content_hash(document, name: Optional[str] = None, key: Optional[str] = None) -> str:
+    if key is not None:
+        return _digest(name, [b"key:", key.encode("utf-8")])
+    if isinstance(document, (str, os.PathLike)):
+        path = os.fspath(document)
+        stat = os.stat(path)
+        return _path_hash(path, name, stat.st_mtime_ns, stat.st_size)
+    return _digest(name, [_read(document)])
+
+
+def get_file_id(db, digest: str) -> Optional[str]:
+    file_id = _file_ids.get(digest)
+    if file_id is None:
+        media = db.get(models.MediaFile, digest)
+        if media is not None:
+            file_id = media.file_id
+            with _lock:
+                _file_ids[digest] = file_id
+    return file_id
+
+
+def remember(db, digest: str, file_id: str, name: Optional[str], size: Optional[int]) -> None:
+    with _lock:
+        _file_ids[digest] = file_id
+    db.add(
+        models.MediaFile(content_hash=digest, file_id=file_id, file_name=name, size=size)
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Uploaded concurrently by another handler; either file_id works
+        db.rollback()
+
+
+def forget(db, digest: str) -> None:
+    with _lock:
+        _file_ids.pop(digest, None)
+    db.query(models.MediaFile).filter(models.MediaFile.content_hash == digest).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def send_document(
+    bot,
+    db,
+    chat_id,
+    document: Union[Document, Callable[[], Document]],
+    key: Optional[str] = None,
+    **kwargs,
+):
+    """``bot.send_document`` that uploads each distinct file only once."""
+    name = kwargs.get("visible_file_name")
+    if key is None and callable(document):
+        document = document()
+    digest = content_hash(document, name, key)
+
+    file_id = get_file_id(db, digest)
+    if file_id is not None:
+        try:
+            return bot.send_document(chat_id, file_id, **kwargs)
+        except ApiTelegramException as e:
+            # The file_id is no longer accepted; upload the file again
+            print(f"Error sending cached document {digest}: {e}")
+            forget(db, digest)
+
+    if callable(document):
+        document = document()
+    if isinstance(document, (str, os.PathLike)):
+        with open(document, "rb") as source:
+            data = source.read()
+    else:
+        data = _read(document)
+    sent = bot.send_document(chat_id, data, **kwargs)
+    uploaded = getattr(sent, "document", None)
+    if uploaded is not None and uploaded.file_id:
+        remember(db, digest, uploaded.file_id, name, len(data))
+    return sent
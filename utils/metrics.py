@@ -0,0 +1,331 @@
+"""
+Hot-path instrumentation.
+
+Collects per-route handler latency, SQL statement counts and time (through
+SQLAlchemy engine events), Bot API call counts and time and the hit and
+miss counts of the callback state store, and exports them in the
+Prometheus text format on a local HTTP endpoint and as a periodic
+structured log line.
+"""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from utils.callback_state import store as callback_state
+
+logger = logging.getLogger("metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NO_ROUTE = "-"
+
+_context = threading.local()
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra="") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def total(self, *label_values: str) -> float:
+        series = self._series.get(label_values)
+        return series[-1] if series else 0.0
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation."""
+        series = self._series.get(label_values)
+        if not series:
+            return None
+        target = q * sum(series[:-1])
+        seen = 0
+        for bound, bucket in zip(self.buckets + (float("inf"),), series[:-1]):
+            seen += bucket
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def series(self):
+        with self._lock:
+            return list(self._series)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-1]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class StatsCollector:
+    """Exports a component's ``stats()`` dict; ``counters`` are monotonic."""
+
+    def __init__(
+        self,
+        prefix: str,
+        help_text: str,
+        stats: Callable[[], Dict[str, float]],
+        counters: Sequence[str] = (),
+    ):
+        self.prefix = prefix
+        self.help_text = help_text
+        self.stats = stats
+        self.counters = frozenset(counters)
+
+    def render(self):
+        for key, value in self.stats().items():
+            if key in self.counters:
+                name, kind = f"{self.prefix}_{key}_total", "counter"
+            else:
+                name, kind = f"{self.prefix}_{key}", "gauge"
+            yield f"# HELP {name} {self.help_text}: {key.replace('_', ' ')}."
+            yield f"# TYPE {name} {kind}"
+            yield f"{name} {value}"
+
+
+handler_duration = Histogram(
+    "bot_handler_duration_seconds", "Time spent handling an update.", ("route",)
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Handlers that raised an exception.", ("route",)
+)
+sql_statements = Counter(
+    "bot_sql_statements_total", "SQL statements executed.", ("route",)
+)
+sql_duration = Counter(
+    "bot_sql_duration_seconds_total", "Time spent executing SQL.", ("route",)
+)
+api_duration = Histogram(
+    "bot_api_request_duration_seconds", "Bot API request latency.", ("method",)
+)
+api_errors = Counter(
+    "bot_api_errors_total", "Bot API requests that failed.", ("method",)
+)
+callback_state_stats = StatsCollector(
+    "bot_callback_state",
+    "Server-side callback state store",
+    callback_state.stats,
+    counters=("hits", "misses", "expired", "evicted"),
+)
+
+METRICS = [
+    handler_duration,
+    handler_errors,
+    sql_statements,
+    sql_duration,
+    api_duration,
+    api_errors,
+    callback_state_stats,
+]
+
+
+def current_route() -> str:
+    return getattr(_context, "route", NO_ROUTE)
+
+
+@contextmanager
+def track(route: str):
+    """Attribute the enclosed handler's latency, SQL and errors to ``route``."""
+    previous = current_route()
+    _context.route = route
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        handler_errors.inc(route)
+        raise
+    finally:
+        handler_duration.observe(route, value=time.perf_counter() - started)
+        _context.route = previous
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every statement executed on ``engine``."""
+
+    # The start time lives on the statement's execution context, so a
+    # statement that raises leaves nothing behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        started = context._query_started
+        route = current_route()
+        sql_statements.inc(route)
+        sql_duration.inc(route, amount=time.perf_counter() - started)
+
+
+def instrument_bot_api() -> None:
+    """Time every Bot API request made through telebot.apihelper."""
+    from telebot import apihelper
+
+    make_request = apihelper._make_request
+    if getattr(make_request, "_instrumented", False):
+        return
+
+    def timed_make_request(token, method_name, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return make_request(token, method_name, *args, **kwargs)
+        except Exception:
+            api_errors.inc(method_name)
+            raise
+        finally:
+            api_duration.observe(method_name, value=time.perf_counter() - started)
+
+    timed_make_request._instrumented = True
+    apihelper._make_request = timed_make_request
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, dict]:
+    """Per-route summary used for the periodic log line."""
+    routes = {}
+    for (route,) in handler_duration.series():
+        count = handler_duration.count(route)
+        routes[route] = {
+            "count": count,
+            "errors": handler_errors.value(route),
+            "avg_ms": round(handler_duration.total(route) / count * 1000, 2),
+            "p95_ms": handler_duration.quantile(0.95, route) * 1000,
+            "sql": sql_statements.value(route),
+            "sql_ms": round(sql_duration.value(route) * 1000, 2),
+        }
+    api = {
+        method: {
+            "count": api_duration.count(method),
+            "ms": round(api_duration.total(method) * 1000, 2),
+        }
+        for (method,) in api_duration.series()
+    }
+    state = callback_state.stats()
+    state["hit_rate"] = round(state["hit_rate"], 3)
+    return {"routes": routes, "bot_api": api, "callback_state": state}
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/ready":
+            ready = self.server.is_ready()
+            body = b"ready\n" if ready else b"starting\n"
+            self.send_response(200 if ready else 503)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(
+    port: int,
+    host: str = "127.0.0.1",
+    is_ready: Callable[[], bool] = lambda: True,
+) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` and a ``/ready`` probe from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.is_ready = is_ready
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_log_reporter(interval: float) -> threading.Event:
+    """Log a JSON snapshot every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def report():
+        while not stopped.wait(interval):
+            logger.info(json.dumps(snapshot(), ensure_ascii=False))
+
+    threading.Thread(target=report, daemon=True).start()
+    return stopped
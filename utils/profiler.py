@@ -0,0 +1,147 @@
+"""
+Opt-in sampling profiler for slow handlers.
+
+When enabled, sampled handler runs are profiled with cProfile and the SQL
+they issue is captured. Runs slower than the threshold are written as one
+JSON record (route, duration, statements with bound-parameter shapes and
+the hottest functions) to a rotating log file. The sampler can be toggled
+at runtime from the admin panel.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+TOP_FUNCTIONS = 15
+
+_context = threading.local()
+
+
+def _shape(parameters: Any) -> Any:
+    """Replace bound values by their type names."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowHandlerSampler:
+    def __init__(
+        self,
+        enabled: bool = False,
+        threshold_ms: float = 500,
+        sample_rate: float = 1.0,
+        log_path: str = os.path.join("logs", "slow_handlers.log"),
+    ):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self._logger: Optional[logging.Logger] = None
+        # cProfile can only be active once per interpreter
+        self._profiler_lock = threading.Lock()
+
+    def configure_from_env(self) -> None:
+        """Read PROFILER_* settings; called once .env has been loaded."""
+        self.enabled = os.getenv("PROFILER_ENABLED", "").lower() in ("1", "true", "yes")
+        self.threshold_ms = float(os.getenv("PROFILER_THRESHOLD_MS", self.threshold_ms))
+        self.sample_rate = float(os.getenv("PROFILER_SAMPLE_RATE", self.sample_rate))
+        self.log_path = os.getenv("PROFILER_LOG", self.log_path)
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def _get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            logger = logging.getLogger("slow_handlers")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                self.log_path, maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8"
+            )
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def instrument_engine(self, engine) -> None:
+        """Capture statements of sampled handler runs."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+            if getattr(_context, "statements", None) is not None:
+                context._sample_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+            statements = getattr(_context, "statements", None)
+            started = getattr(context, "_sample_started", None)
+            if statements is None or started is None:
+                return
+            if many and parameters:
+                shape = {"executemany": len(parameters), "row": _shape(parameters[0])}
+            else:
+                shape = _shape(parameters)
+            statements.append(
+                {
+                    "statement": statement,
+                    "parameters": shape,
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+    @contextmanager
+    def sample(self, route: str):
+        if not self.enabled or random.random() > self.sample_rate:
+            yield
+            return
+        statements: List[Dict[str, Any]] = []
+        _context.statements = statements
+        profiler = cProfile.Profile() if self._profiler_lock.acquire(False) else None
+        started = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if profiler:
+                profiler.disable()
+                self._profiler_lock.release()
+            _context.statements = None
+            if elapsed_ms >= self.threshold_ms:
+                self._write(route, elapsed_ms, statements, profiler)
+
+    def _write(self, route, elapsed_ms, statements, profiler) -> None:
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "route": route,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "sql_count": len(statements),
+            "sql": statements,
+        }
+        if profiler:
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            record["profile"] = stream.getvalue().splitlines()
+        try:
+            self._get_logger().info(json.dumps(record, ensure_ascii=False))
+        except Exception as e:
+            print(f"Error writing slow handler sample: {e}")
+
+
+sampler = SlowHandlerSampler()
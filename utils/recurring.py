@@ -0,0 +1,105 @@
+"""
+Weekly subscription engine.
+
+``claim_and_invoice`` books the sessions due to subscribers
+(repositories.subscriptions) and queues their invoices and conflict
+notices on the rate-limited sender, which paces them out in batches.
+``start_scheduler`` runs one timer thread that extends the rolling
+session window (repositories.schedule) and then claims the new sessions.
+"""
+
+import datetime
+import logging
+import threading
+from typing import Iterable, Optional
+
+from telebot.types import LabeledPrice
+
+from repositories import schedule, subscriptions
+from repositories.database import SessionLocal
+from repositories.reference import reference
+from utility import persian_date
+from utils.sender import sender
+
+logger = logging.getLogger("recurring")
+
+
+def conflict_text(conflict: subscriptions.Conflict) -> str:
+    # Translate: "Your weekly session on {date} at {time} was already taken and could not be booked."
+    return (
+        f"⚠️ سانس {persian_date(conflict.session_date)} ساعت {conflict.time_slot} "
+        "از رزرو هفتگی شما قبلاً رزرو شده بود و برای شما رزرو نشد."
+    )
+
+
+def claim_and_invoice(
+    bot,
+    db,
+    through: Optional[datetime.date] = None,
+    subscription_ids: Optional[Iterable[int]] = None,
+) -> subscriptions.ClaimResult:
+    """Book the sessions due to subscribers and queue their invoices."""
+    result = subscriptions.claim_sessions(
+        db, through or schedule.horizon(), subscription_ids=subscription_ids
+    )
+    if not result.claims and not result.conflicts:
+        return result
+    provider_token = reference.admin_card_number(db)
+    logger.info(
+        "subscriptions: %d sessions booked, %d conflicts",
+        len(result.claims),
+        len(result.conflicts),
+    )
+
+    def invoice(claim):
+        bot.send_invoice(
+            claim.user_id,
+            title="پرداخت هزینه سانس",
+            # Translate: "Weekly booking"
+            description=f"رزرو هفتگی - سانس: {persian_date(claim.session_date)} {claim.time_slot}",
+            provider_token=provider_token,
+            prices=[
+                LabeledPrice(label="هزینه سانس", amount=claim.amount * 10)  # Amount in IRR
+            ],
+            currency="IRR",
+            invoice_payload=claim.payment_id,
+        )
+
+    def jobs():
+        for claim in result.claims:
+            yield claim.user_id, lambda claim=claim: invoice(claim)
+        for conflict in result.conflicts:
+            yield conflict.user_id, lambda conflict=conflict: bot.send_message(
+                conflict.user_id, conflict_text(conflict)
+            )
+
+    sender.send_all(jobs(), total=len(result.claims) + len(result.conflicts))
+    return result
+
+
+def run_once(bot) -> subscriptions.ClaimResult:
+    """Extend the session window, then book it for subscribers."""
+    db = SessionLocal()
+    try:
+        today = datetime.date.today()
+        schedule.generate_sessions(
+            db, today + datetime.timedelta(days=1), schedule.horizon(today)
+        )
+        return claim_and_invoice(bot, db)
+    finally:
+        db.close()
+
+
+def start_scheduler(bot, interval: float) -> threading.Event:
+    """Run the generator every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                run_once(bot)
+            except Exception as e:
+                print(f"Error booking weekly subscriptions: {e}")
+
+    threading.Thread(target=run, name="recurring", daemon=True).start()
+    return stopped
@@ -0,0 +1,60 @@
+"""
+Booking reminder scheduler.
+
+One timer thread wakes up every ``interval`` seconds, finds the bookings
+starting within the lead time (repositories.reminders), marks them and
+queues the reminders on the rate-limited sender; there are no per-booking
+timers to keep or to lose on restart.
+"""
+
+import datetime
+import threading
+
+from repositories import reminders
+from repositories.database import SessionLocal
+from utility import persian_date
+from utils.sender import sender
+
+
+def reminder_text(booking: reminders.DueBooking) -> str:
+    # Translate: "Reminder: your session on {date} at {time} starts soon."
+    return (
+        "⏰ یادآوری: سانس شما در تاریخ "
+        f"{persian_date(booking.session_date)} ساعت {booking.time_slot} برگزار می‌شود."
+    )
+
+
+def tick(bot, lead: datetime.timedelta, now: datetime.datetime = None) -> int:
+    """Queue the reminders that are due; returns how many were queued."""
+    db = SessionLocal()
+    try:
+        due = reminders.due_bookings(db, now or datetime.datetime.now(), lead)
+        claimed = reminders.claim(db, due)
+    finally:
+        db.close()
+    if claimed:
+        sender.send_all(
+            (
+                booking.user_id,
+                lambda booking=booking: bot.send_message(
+                    booking.user_id, reminder_text(booking)
+                ),
+            )
+            for booking in claimed
+        )
+    return len(claimed)
+
+
+def start_scheduler(bot, interval: float, lead: datetime.timedelta) -> threading.Event:
+    """Check for due reminders every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                tick(bot, lead)
+            except Exception as e:
+                print(f"Error sending booking reminders: {e}")
+
+    threading.Thread(target=run, name="reminders", daemon=True).start()
+    return stopped
@@ -0,0 +1,227 @@
+"""
+On-disk cache of admin payment report workbooks.
+
+An artifact is keyed by the report filters and remembers the payments
+watermark (latest ``Payment.updated_at``) and users watermark (latest
+``User.updated_at``, as rows show payer details) it was built at and the
+key of its last row:
+
+* watermarks unchanged: the files are re-sent as they are (utils.media
+  sends them by file_id);
+* only payments after the last row changed (append-only, e.g. the current
+  month): just those rows are appended to the existing workbooks;
+* anything else, including any user edit: the artifact is rebuilt.
+
+Only imported from the report handlers, like utils.reporting.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from repositories import queries
+
+CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join("cache", "reports"))
+# Artifacts kept on disk; the least recently used are removed first
+MAX_ARTIFACTS = 50
+FETCH_SIZE = 2000
+
+_lock = threading.Lock()
+
+
+@dataclass
+class ReportFile:
+    path: str
+
+
+@dataclass
+class Artifact:
+    key: str
+    watermark: Optional[str] = None
+    users_watermark: Optional[str] = None
+    rows: int = 0
+    last_key: Optional[List[str]] = None
+    files: List[ReportFile] = field(default_factory=list)
+    # How the artifact was obtained: "hit", "append" or "build"
+    status: str = "build"
+
+
+def filters_key(filters: queries.ReportFilters) -> str:
+    description = json.dumps(
+        {
+            "start": filters.start.isoformat() if filters.start else None,
+            "end": filters.end.isoformat() if filters.end else None,
+            "statuses": sorted(status.name for status in filters.statuses),
+            "account_types": sorted(t.name for t in filters.account_types),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()[:32]
+
+
+def _meta_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _file_path(key: str, index: int) -> str:
+    return os.path.join(CACHE_DIR, f"{key}_{index + 1}.xlsx")
+
+
+def _load(key: str) -> Optional[Artifact]:
+    try:
+        with open(_meta_path(key), encoding="utf-8") as meta:
+            data = json.load(meta)
+    except (OSError, ValueError):
+        return None
+    artifact = Artifact(
+        key=key,
+        watermark=data.get("watermark"),
+        users_watermark=data.get("users_watermark"),
+        rows=data.get("rows", 0),
+        last_key=data.get("last_key"),
+        files=[ReportFile(item["path"]) for item in data.get("files", [])],
+    )
+    if not all(os.path.exists(item.path) for item in artifact.files):
+        return None
+    return artifact
+
+
+def save(artifact: Artifact) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data = {
+        "watermark": artifact.watermark,
+        "users_watermark": artifact.users_watermark,
+        "rows": artifact.rows,
+        "last_key": artifact.last_key,
+        "files": [{"path": item.path} for item in artifact.files],
+    }
+    temporary = _meta_path(artifact.key) + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as meta:
+        json.dump(data, meta)
+    os.replace(temporary, _meta_path(artifact.key))
+
+
+def _prune() -> None:
+    metas = [
+        os.path.join(CACHE_DIR, name)
+        for name in os.listdir(CACHE_DIR)
+        if name.endswith(".json")
+    ]
+    metas.sort(key=os.path.getmtime, reverse=True)
+    for meta in metas[MAX_ARTIFACTS:]:
+        key = os.path.basename(meta)[: -len(".json")]
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(key):
+                os.remove(os.path.join(CACHE_DIR, name))
+
+
+class _Tracker:
+    """Counts rows and remembers the key of the last one while streaming."""
+
+    def __init__(self, payments):
+        self.payments = payments
+        self.rows = 0
+        self.last = None
+
+    def __iter__(self):
+        for payment in self.payments:
+            self.rows += 1
+            self.last = payment
+            yield payment
+
+    def last_key(self):
+        if self.last is None:
+            return None
+        return [self.last.payment_date.isoformat(), self.last.id]
+
+
+def _build(db, artifact: Artifact, filters: queries.ReportFilters) -> None:
+    from utils import reporting
+
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith(artifact.key) and name.endswith(".xlsx"):
+            os.remove(os.path.join(CACHE_DIR, name))
+    tracker = _Tracker(
+        queries.payment_report_stream(db, filters, fetch_size=FETCH_SIZE)
+    )
+    artifact.files = []
+    for index, output_excel in enumerate(reporting.payment_report_files(tracker)):
+        path = _file_path(artifact.key, index)
+        with open(path, "wb") as report:
+            report.write(output_excel.getbuffer())
+        artifact.files.append(ReportFile(path))
+    artifact.rows = tracker.rows
+    artifact.last_key = tracker.last_key()
+    artifact.status = "build"
+
+
+def _append(db, artifact: Artifact, filters: queries.ReportFilters) -> None:
+    from utils import reporting
+
+    last_key = (
+        datetime.datetime.fromisoformat(artifact.last_key[0]),
+        artifact.last_key[1],
+    )
+    tracker = _Tracker(
+        queries.payment_report_stream(db, filters, after=last_key, fetch_size=FETCH_SIZE)
+    )
+    paths = reporting.append_payment_rows(
+        [item.path for item in artifact.files],
+        tracker,
+        lambda index: _file_path(artifact.key, index),
+    )
+    if tracker.rows:
+        artifact.files = [ReportFile(path) for path in paths]
+        artifact.rows += tracker.rows
+        artifact.last_key = tracker.last_key()
+    artifact.status = "append"
+
+
+def get_report(db, filters: queries.ReportFilters) -> Artifact:
+    """The up-to-date report for ``filters``, built or updated as needed."""
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        key = filters_key(filters)
+        watermark, users_watermark = (
+            value.isoformat() if value else None
+            for value in queries.report_watermarks(db)
+        )
+        artifact = _load(key)
+
+        if (
+            artifact
+            and artifact.watermark == watermark
+            and artifact.users_watermark == users_watermark
+        ):
+            artifact.status = "hit"
+            os.utime(_meta_path(key))
+            return artifact
+        if artifact is None:
+            artifact = Artifact(key=key)
+            _build(db, artifact, filters)
+        elif (
+            artifact.users_watermark == users_watermark
+            and artifact.last_key
+            and artifact.watermark
+            and not queries.payment_report_changed_before(
+                db,
+                filters,
+                datetime.datetime.fromisoformat(artifact.watermark),
+                (
+                    datetime.datetime.fromisoformat(artifact.last_key[0]),
+                    artifact.last_key[1],
+                ),
+            )
+        ):
+            _append(db, artifact, filters)
+        else:
+            _build(db, artifact, filters)
+        artifact.watermark = watermark
+        artifact.users_watermark = users_watermark
+        save(artifact)
+        _prune()
+        return artifact
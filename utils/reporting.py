@@ -0,0 +1,181 @@
+"""
+Excel report builders.
+
+pandas and openpyxl are heavy to import, so this module is only imported
+from inside the report handlers; nothing on the bot's startup path may
+import it.
+"""
+
+import itertools
+from io import BytesIO
+from typing import Callable, Dict, Iterable, Iterator, List
+
+import pandas as pd
+
+from constant.general import ACCOUNT_TYPE, STATUS
+from utility import convert_english_numbers, convert_english_numbers_many, persian_date
+
+AMOUNT_COLUMN = "مبلغ پرداختی"
+# Excel caps a sheet at 1,048,576 rows; smaller sheets open much faster
+ROWS_PER_SHEET = 50_000
+SHEETS_PER_FILE = 4
+
+
+def to_excel(rows: List[Dict], amount_suffix: str = " تومان") -> BytesIO:
+    """Write ``rows`` to an in-memory .xlsx with Persian-digit amounts."""
+    output_excel = BytesIO()
+    _frame(rows, amount_suffix).to_excel(output_excel, index=False)
+    output_excel.seek(0)
+    return output_excel
+
+
+def user_payment_report(payments) -> BytesIO:
+    """A user's own payment history (user report_all_payment)."""
+    payment_data = []
+    for payment in payments:
+        session = payment.session
+
+        # Format date for better readability
+        payment_date = payment.payment_date.date()
+        payment_data.append(
+            {
+                "شماره پیگیری": payment.shipping_option_id,
+                "تاریخ پرداخت": persian_date(payment_date),
+                "تاریخ سانس": persian_date(session.session_date),
+                "زمان سانس": session.time_slot if session else "N/A",
+                AMOUNT_COLUMN: payment.amount,
+            }
+        )
+    return to_excel(payment_data, amount_suffix="تومان")
+
+
+def _payment_row(payment) -> Dict:
+    session = payment.session
+    user_db = payment.user
+    return {
+        "شماره پیگیری": payment.shipping_option_id,
+        "تاریخ پرداخت": f"{persian_date(payment.payment_date.date())} {payment.payment_date.strftime('%H:%M')}",
+        "تاریخ سانس": persian_date(session.session_date) if session else "N/A",
+        "زمان سانس": session.time_slot if session else "N/A",
+        AMOUNT_COLUMN: payment.amount,
+        "وضعیت": STATUS.get(payment.verified, payment.verified.value),
+        "نوع حساب": ACCOUNT_TYPE.get(user_db.account_type, "N/A") if user_db else "N/A",
+        "نام": user_db.name if user_db else "N/A",
+        "نام خانوادگی": user_db.surname if user_db else "N/A",
+        "شماره تماس": user_db.phone_number if user_db else "N/A",
+        "شماره کارت": user_db.card_number if user_db else "N/A",
+    }
+
+
+def _frame(rows: List[Dict], amount_suffix: str = " تومان"):
+    df = pd.DataFrame(rows)
+    if AMOUNT_COLUMN in df:
+        df[AMOUNT_COLUMN] = convert_english_numbers_many(df[AMOUNT_COLUMN]) + amount_suffix
+    return df
+
+
+def payment_report_files(
+    payments: Iterable,
+    rows_per_sheet: int = ROWS_PER_SHEET,
+    sheets_per_file: int = SHEETS_PER_FILE,
+) -> Iterator[BytesIO]:
+    """
+    Every payment with the payer's details (admin generate_report).
+
+    ``payments`` is consumed lazily; rows are written ``rows_per_sheet`` to
+    a sheet and a new workbook is started every ``sheets_per_file`` sheets,
+    so memory stays bounded by one file whatever the selected range.
+    """
+    output_excel = writer = None
+    sheet = 0
+    rows: List[Dict] = []
+
+    def flush_sheet():
+        nonlocal output_excel, writer, sheet
+        if writer is None:
+            output_excel = BytesIO()
+            writer = pd.ExcelWriter(output_excel, engine="openpyxl")
+        sheet += 1
+        _frame(rows).to_excel(writer, sheet_name=f"پرداخت‌ها {sheet}", index=False)
+        rows.clear()
+
+    for payment in payments:
+        rows.append(_payment_row(payment))
+        if len(rows) >= rows_per_sheet:
+            flush_sheet()
+            if sheet % sheets_per_file == 0:
+                writer.close()
+                output_excel.seek(0)
+                yield output_excel
+                writer = None
+    if rows or (writer is None and sheet == 0):
+        flush_sheet()
+    if writer is not None:
+        writer.close()
+        output_excel.seek(0)
+        yield output_excel
+
+
+def append_payment_rows(
+    paths: List[str],
+    payments: Iterable,
+    new_path: Callable[[int], str],
+    rows_per_sheet: int = ROWS_PER_SHEET,
+    sheets_per_file: int = SHEETS_PER_FILE,
+) -> List[str]:
+    """
+    Append ``payments`` to workbooks written by ``payment_report_files``.
+
+    Rows go to the last sheet of the last file, then to new sheets and new
+    files (named by ``new_path(file_index)``) under the same limits.
+    Returns the paths of all files.
+    """
+    from openpyxl import Workbook, load_workbook
+
+    paths = list(paths)
+    payments = iter(payments)
+    first = next(payments, None)
+    if first is None:
+        return paths
+    workbook = load_workbook(paths[-1])
+    sheet = workbook.worksheets[-1]
+    header = [cell.value for cell in sheet[1]]
+    sheets = (len(paths) - 1) * sheets_per_file + len(workbook.worksheets)
+    for payment in itertools.chain((first,), payments):
+        if sheet.max_row - 1 >= rows_per_sheet:
+            if len(workbook.worksheets) >= sheets_per_file:
+                workbook.save(paths[-1])
+                workbook = Workbook()
+                workbook.remove(workbook.active)
+                paths.append(new_path(len(paths)))
+            sheets += 1
+            sheet = workbook.create_sheet(f"پرداخت‌ها {sheets}")
+            sheet.append(header)
+        row = _payment_row(payment)
+        row[AMOUNT_COLUMN] = convert_english_numbers(row[AMOUNT_COLUMN]) + " تومان"
+        sheet.append([row.get(column) for column in header])
+    workbook.save(paths[-1])
+    return paths
+
+
+def rollup_report(rows) -> BytesIO:
+    """Daily revenue and occupancy from the rollup tables (admin rollups)."""
+    from repositories.models import UserType
+
+    report_rows = []
+    for row in rows:
+        revenue = row["revenue"]
+        report_rows.append(
+            {
+                "تاریخ": persian_date(row["day"]),
+                "درآمد کارمندی": revenue.get(UserType.EMPLOYEE, 0),
+                "درآمد دانشجویی": revenue.get(UserType.STUDENT, 0),
+                "درآمد عمومی": revenue.get(UserType.GENERAL, 0),
+                "درآمد کل": sum(revenue.values()),
+                "استرداد": row["refunds"],
+                "سانس رزرو شده": row["booked"],
+                "سانس آزاد": row["available"],
+                "سانس غیرفعال": row["inactive"],
+            }
+        )
+    return to_excel(report_rows)
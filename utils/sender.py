@@ -0,0 +1,203 @@
+"""
+Rate-limited outgoing message queue.
+
+Bulk operations (refunds for a cancelled day, broadcasts) push their Bot
+API calls through ``sender`` instead of calling the bot inline. A few
+worker threads send concurrently while staying under Telegram's limits:
+a global messages-per-second budget and a minimum interval per chat.
+``429 Too Many Requests`` answers are retried after the ``retry_after``
+Telegram asks for. Each ``send_all`` runs in its own thread and reports
+progress through a callback, so handlers return immediately.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from telebot.apihelper import ApiTelegramException
+
+# (chat_id, send) pairs; ``send`` performs one Bot API call
+Job = Tuple[Any, Callable[[], Any]]
+
+
+class RateLimiter:
+    """Global token bucket plus a minimum interval between sends to one chat."""
+
+    def __init__(self, rate: float, per_chat_interval: float):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._chat_next: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+
+    def _wait_time(self, chat_id, now: float) -> float:
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        chat_wait = self._chat_next.get(chat_id, 0) - now
+        token_wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+        return max(chat_wait, token_wait)
+
+    def acquire(self, chat_id) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(chat_id, now)
+                if wait <= 0:
+                    self._tokens -= 1
+                    self._chat_next[chat_id] = now + self.per_chat_interval
+                    if len(self._chat_next) > 10_000:
+                        self._chat_next = {
+                            chat: at for chat, at in self._chat_next.items() if at > now
+                        }
+                    return
+            time.sleep(wait)
+
+    def defer(self, chat_id, seconds: float) -> None:
+        """Hold a chat back after Telegram answered 429."""
+        with self._lock:
+            self._chat_next[chat_id] = time.monotonic() + seconds
+
+
+@dataclass
+class Progress:
+    total: Optional[int] = None
+    sent: int = 0
+    failed: int = 0
+    done: bool = False
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    _finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def per_second(self) -> float:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+def _retry_after(error: ApiTelegramException) -> Optional[float]:
+    if error.error_code != 429:
+        return None
+    parameters = (error.result_json or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class Sender:
+    def __init__(
+        self,
+        rate: float = 25,
+        per_chat_interval: float = 1.0,
+        workers: int = 4,
+        max_retries: int = 3,
+    ):
+        self.limiter = RateLimiter(rate, per_chat_interval)
+        self.workers = workers
+        self.max_retries = max_retries
+
+    def configure_from_env(self) -> None:
+        """Read SENDER_* settings; called once .env has been loaded."""
+        self.limiter.rate = float(os.getenv("SENDER_RATE", self.limiter.rate))
+        self.limiter.per_chat_interval = float(
+            os.getenv("SENDER_PER_CHAT_INTERVAL", self.limiter.per_chat_interval)
+        )
+        self.workers = int(os.getenv("SENDER_WORKERS", self.workers))
+
+    def send(self, chat_id, send: Callable[[], Any]) -> Any:
+        """Perform one call within the limits, retrying on 429."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(chat_id)
+            try:
+                return send()
+            except ApiTelegramException as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                self.limiter.defer(chat_id, retry_after)
+
+    def send_all(
+        self,
+        jobs: Iterable[Job],
+        total: Optional[int] = None,
+        on_result: Optional[Callable[[Any, Any, Optional[Exception]], None]] = None,
+        on_progress: Optional[Callable[[Progress], None]] = None,
+        progress_interval: float = 2.0,
+    ) -> Progress:
+        """
+        Send ``jobs`` in the background and return their live ``Progress``.
+
+        ``jobs`` is consumed lazily (at most a few per worker are queued),
+        so it can page through recipients from the database.
+        ``on_result(chat_id, result, error)`` runs after each job and
+        ``on_progress`` at most every ``progress_interval`` seconds and once
+        at the end.
+        """
+        progress = Progress(total=total)
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        lock = threading.Lock()
+        reported = [0.0]
+
+        def report(force=False):
+            if on_progress is None:
+                return
+            now = time.monotonic()
+            with lock:
+                if not force and now - reported[0] < progress_interval:
+                    return
+                reported[0] = now
+            try:
+                on_progress(progress)
+            except Exception as e:
+                print(f"Error reporting send progress: {e}")
+
+        def run_job(chat_id, send):
+            result, error = None, None
+            try:
+                result = self.send(chat_id, send)
+            except Exception as e:
+                error = e
+                print(f"Error sending to {chat_id}: {e}")
+            finally:
+                in_flight.release()
+            with lock:
+                if error is None:
+                    progress.sent += 1
+                else:
+                    progress.failed += 1
+            if on_result is not None:
+                try:
+                    on_result(chat_id, result, error)
+                except Exception as e:
+                    print(f"Error recording send result for {chat_id}: {e}")
+            report()
+
+        def run():
+            try:
+                with ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="sender"
+                ) as executor:
+                    for chat_id, send in jobs:
+                        in_flight.acquire()
+                        executor.submit(run_job, chat_id, send)
+            except Exception as e:
+                print(f"Error queueing messages: {e}")
+            finally:
+                progress.done = True
+                progress.finished = time.monotonic()
+                report(force=True)
+                progress._finished.set()
+
+        threading.Thread(target=run, name="send-all", daemon=True).start()
+        return progress
+
+
+sender = Sender()
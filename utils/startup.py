@@ -0,0 +1,83 @@
+"""
+Startup pipeline.
+
+Times each startup phase, runs the warm-up phases (DB pool, reference
+caches, Jalali dates, keyboards) in parallel and exposes a readiness flag
+that is set once the bot can serve its first users at full speed.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+logger = logging.getLogger("startup")
+
+
+class Startup:
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.timings[name] = round(elapsed_ms, 1)
+            logger.info("startup phase %s took %.1f ms", name, elapsed_ms)
+
+    def _run(self, name: str, warm: Callable[[], None]) -> None:
+        try:
+            with self.phase(name):
+                warm()
+        except Exception as e:
+            # Warm-up is an optimisation; a failed phase falls back to lazy loading
+            print(f"Error warming up {name}: {e}")
+
+    def warm_up(self, phases: Dict[str, Callable[[], None]], workers: int = 4) -> None:
+        """Run independent warm-up phases concurrently and wait for all."""
+        with self.phase("warm_up"):
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="warm-up"
+            ) as executor:
+                for name, warm in phases.items():
+                    executor.submit(self._run, name, warm)
+
+    def mark_ready(self) -> None:
+        self.timings["total"] = round((time.perf_counter() - self._started) * 1000, 1)
+        self._ready.set()
+        logger.info("bot ready in %.1f ms %s", self.timings["total"], self.timings)
+
+
+def warm_pool(engine, connections: int = None) -> None:
+    """Open (and return to the pool) as many connections as the pool keeps."""
+    from sqlalchemy import text
+
+    if connections is None:
+        size = getattr(engine.pool, "size", None)
+        connections = size() if callable(size) else 1
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+startup = Startup()
@@ -0,0 +1,69 @@
+"""
+Waitlist offers and their expiry loop.
+
+``notify`` sends each offer with a claim button through the rate-limited
+sender; ``start_scheduler`` runs one timer thread that expires unclaimed
+offers and unpaid holds (repositories.waitlist.expire) and notifies the
+next users in line.
+"""
+
+import threading
+from typing import Iterable
+
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from repositories import waitlist
+from repositories.database import SessionLocal
+from utility import convert_english_numbers, persian_date
+from utils.sender import sender
+
+
+def offer_message(offer: waitlist.Offer):
+    markup = InlineKeyboardMarkup()
+    # Translate: "Book it"
+    markup.add(
+        InlineKeyboardButton(
+            "✅ رزرو و پرداخت", callback_data=f"WAITLIST_CLAIM:{offer.entry_id}"
+        )
+    )
+    # Translate: "The session you waited for is free. Claim it before {time}."
+    text = (
+        f"🎉 سانس {persian_date(offer.session_date)} ساعت {offer.time_slot} "
+        "که در صف انتظار آن بودید آزاد شد.\n"
+        f"تا ساعت {convert_english_numbers(offer.expires_at.strftime('%H:%M'))} "
+        "فرصت رزرو دارید."
+    )
+    return text, markup
+
+
+def notify(bot, offers: Iterable[waitlist.Offer]) -> None:
+    def jobs():
+        for offer in offers:
+            text, markup = offer_message(offer)
+            yield offer.user_id, lambda offer=offer, text=text, markup=markup: bot.send_message(
+                offer.user_id, text, reply_markup=markup
+            )
+
+    sender.send_all(jobs())
+
+
+def start_scheduler(bot, interval: float) -> threading.Event:
+    """Expire offers and holds every ``interval`` seconds; set the event to stop."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            db = SessionLocal()
+            try:
+                offers = waitlist.expire(db)
+            except Exception as e:
+                db.rollback()
+                offers = []
+                print(f"Error expiring waitlist offers: {e}")
+            finally:
+                db.close()
+            if offers:
+                notify(bot, offers)
+
+    threading.Thread(target=run, name="waitlist", daemon=True).start()
+    return stopped